@@ -0,0 +1,83 @@
+"""
+Microbenchmark of the EPSG majority vote done by `util.geo_util.epsg_from_polygon` on every DEM staging call,
+comparing the vectorized implementation against the previous per-point `Point.within` / `point2epsg` loop.
+
+Run with `python -m benchmark.micro.epsg_from_polygon_benchmark [--num-polygons 20]`
+"""
+import argparse
+import random
+import timeit
+
+import numpy as np
+from shapely import affinity
+from shapely.geometry import Point, Polygon, box
+
+from util.geo_util import check_dateline, epsg_from_polygon, point2epsg, polygon_from_bounding_box
+
+
+def _epsg_from_polygon_baseline(polys):
+    epsgs = []
+    for p in polys:
+        x_min, y_min, x_max, y_max = p.bounds
+        xx, yy = np.meshgrid(np.linspace(x_min, x_max, 250),
+                             np.linspace(y_min, y_max, 250))
+        x = xx.flatten()
+        y = yy.flatten()
+
+        zones = []
+        for lx, ly in zip(x, y):
+            pp = Point(lx, ly)
+            if pp.within(p):
+                zones.append(point2epsg(lx, ly))
+
+        vals, counts = np.unique(zones, return_counts=True)
+        epsgs.append(vals[np.argmax(counts)])
+    return epsgs
+
+
+def generate_polygons(num_polygons: int) -> list[list[Polygon]]:
+    """Returns bbox polygons with a margin (as staged for DSWx), including dateline crossings, and rotated polygons."""
+    rng = random.Random(0)
+    polygons = []
+    for i in range(num_polygons):
+        lon, lat = rng.uniform(-180, 179), rng.uniform(-85, 84)
+        bbox = [lon, lat, lon + 1, lat + 1]
+        if i % 2:
+            polygons.append(check_dateline(polygon_from_bounding_box(bbox, 50)))
+        else:
+            polygons.append([affinity.rotate(box(*bbox), rng.uniform(0, 90))])
+    # rectangles straddling UTM zone and polar boundaries
+    polygons.append([box(-3.5, 40, 3.5, 46)])
+    polygons.append([box(10, 70, 20, 80)])
+    polygons.append(check_dateline(box(179, 50, 181, 51)))
+    return polygons
+
+
+def run_baseline(polygons):
+    return [_epsg_from_polygon_baseline(polys) for polys in polygons]
+
+
+def run_vectorized(polygons):
+    return [epsg_from_polygon(polys) for polys in polygons]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-polygons", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    polygons = generate_polygons(args.num_polygons)
+    assert run_baseline(polygons) == run_vectorized(polygons)
+
+    baseline_secs = min(timeit.repeat(lambda: run_baseline(polygons), number=1, repeat=args.repeat))
+    vectorized_secs = min(timeit.repeat(lambda: run_vectorized(polygons), number=1, repeat=args.repeat))
+
+    print(f"{len(polygons):,} polygon sets")
+    print(f"baseline:         {baseline_secs:.3f}s ({baseline_secs / len(polygons) * 1000:.1f}ms per call)")
+    print(f"vectorized:       {vectorized_secs:.3f}s ({vectorized_secs / len(polygons) * 1000:.1f}ms per call)")
+    print(f"speedup:          {baseline_secs / vectorized_secs:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
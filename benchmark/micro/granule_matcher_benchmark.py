@@ -0,0 +1,88 @@
+"""
+Microbenchmark of the granule identifier and URL filtering done by `data_subscriber.query.query_cmr`, comparing the
+precompiled `GranuleMatcher` against the previous per-pattern, per-band implementation.
+
+Run with `python -m benchmark.micro.granule_matcher_benchmark [--num-granules 100000]`
+"""
+import argparse
+import random
+import re
+import timeit
+
+from data_subscriber.query import GranuleMatcher, COLLECTION_BAND_MAP
+
+SHORTNAME_FILTERS = ["S2A", "S2B"]
+
+
+def _match_identifier_baseline(shortname_filters, identifier) -> bool:
+    for filter in shortname_filters:
+        if re.match(filter, identifier):
+            return True
+    return False
+
+
+def _filter_urls_baseline(collection, urls):
+    filter_extension = "DEFAULT"
+    for key in COLLECTION_BAND_MAP:
+        if key in collection:
+            filter_extension = key
+            break
+
+    return [f
+            for f in urls
+            for extension in COLLECTION_BAND_MAP.get(filter_extension)
+            if extension in f]
+
+
+def generate_granules(num_granules: int) -> list[dict]:
+    rng = random.Random(0)
+    bands = ["B01", "B02", "B03", "B04", "B05", "B06", "B07", "B08", "B8A", "B09", "B10", "B11", "B12", "Fmask", "SAA",
+             "SZA", "VAA", "VZA"]
+    granules = []
+    for i in range(num_granules):
+        granule_id = f"HLS.S30.T{rng.randrange(100000):05d}.2023{rng.randrange(1, 366):03d}T000000.v2.0"
+        granules.append({
+            "identifier": f"{rng.choice(['S2A', 'S2B', 'S2C', 'S1A'])}_MSIL1C_20230101T000000_N0509_R000_T00AAA_{i}",
+            "related_urls": [f"https://data.lpdaac.earthdatacloud.nasa.gov/lp-prod-protected/HLSS30.020/{granule_id}/"
+                             f"{granule_id}.{band}.tif" for band in bands]
+                            + [f"s3://lp-prod-protected/HLSS30.020/{granule_id}/{granule_id}.{band}.tif"
+                               for band in bands]
+                            + [f"https://data.lpdaac.earthdatacloud.nasa.gov/lp-prod-public/HLSS30.020/{granule_id}/"
+                               f"{granule_id}.jpg"]
+        })
+    return granules
+
+
+def run_baseline(granules):
+    return [_filter_urls_baseline("HLSS30", granule["related_urls"])
+            for granule in granules
+            if _match_identifier_baseline(SHORTNAME_FILTERS, granule["identifier"])]
+
+
+def run_matcher(granules):
+    matcher = GranuleMatcher("HLSS30", SHORTNAME_FILTERS)
+    return [matcher.filter_urls(granule["related_urls"])
+            for granule in granules
+            if matcher.match_identifier(granule["identifier"])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-granules", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    granules = generate_granules(args.num_granules)
+    assert run_baseline(granules) == run_matcher(granules)
+
+    baseline_secs = min(timeit.repeat(lambda: run_baseline(granules), number=1, repeat=args.repeat))
+    matcher_secs = min(timeit.repeat(lambda: run_matcher(granules), number=1, repeat=args.repeat))
+
+    print(f"{args.num_granules:,} granules")
+    print(f"baseline:         {baseline_secs:.3f}s")
+    print(f"GranuleMatcher:   {matcher_secs:.3f}s")
+    print(f"speedup:          {baseline_secs / matcher_secs:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -569,12 +569,14 @@ resource "aws_instance" "mozart" {
           python ~/mozart/ops/opera-pcm/data_subscriber/hls_spatial/delete_hls_spatial_catalog.py
           python ~/mozart/ops/opera-pcm/data_subscriber/slc/delete_slc_catalog.py
           python ~/mozart/ops/opera-pcm/data_subscriber/slc_spatial/delete_slc_spatial_catalog.py
+          python ~/mozart/ops/opera-pcm/data_subscriber/query_watermark/delete_query_watermark_catalog.py
 
       fi
       python ~/mozart/ops/opera-pcm/data_subscriber/hls/create_hls_catalog.py
       python ~/mozart/ops/opera-pcm/data_subscriber/hls_spatial/create_hls_spatial_catalog.py
       python ~/mozart/ops/opera-pcm/data_subscriber/slc/create_slc_catalog.py
       python ~/mozart/ops/opera-pcm/data_subscriber/slc_spatial/create_slc_spatial_catalog.py
+      python ~/mozart/ops/opera-pcm/data_subscriber/query_watermark/create_query_watermark_catalog.py
 
       echo create accountability Elasticsearch index
       if [ "${local.delete_old_job_catalog}" = true ]; then
@@ -1,9 +1,10 @@
 import logging
 from datetime import datetime
 
-import requests
 from requests.auth import HTTPBasicAuth
 
+from util.http_util import get_session
+
 
 def supply_token(edl: str, username: str, password: str) -> str:
     """
@@ -26,7 +27,7 @@ def supply_token(edl: str, username: str, password: str) -> str:
 def _get_tokens(edl: str, username: str, password: str) -> list[dict]:
     token_list_url = f"https://{edl}/api/users/tokens"
 
-    list_response = requests.get(token_list_url, auth=HTTPBasicAuth(username, password))
+    list_response = get_session().get(token_list_url, auth=HTTPBasicAuth(username, password))
     list_response.raise_for_status()
 
     return list_response.json()
@@ -45,7 +46,7 @@ def _revoke_expired_tokens(token_list: list[dict], edl: str, username: str, pass
 def _create_token(edl: str, username: str, password: str) -> str:
     token_create_url = f"https://{edl}/api/users/token"
 
-    create_response = requests.post(token_create_url, auth=HTTPBasicAuth(username, password))
+    create_response = get_session().post(token_create_url, auth=HTTPBasicAuth(username, password))
     create_response.raise_for_status()
 
     response_content = create_response.json()
@@ -61,7 +62,7 @@ def _create_token(edl: str, username: str, password: str) -> str:
 def _delete_token(edl: str, username: str, password: str, token: str) -> None:
     url = f"https://{edl}/api/users/revoke_token"
     try:
-        resp = requests.post(url, auth=HTTPBasicAuth(username, password),
+        resp = get_session().post(url, auth=HTTPBasicAuth(username, password),
                              params={"token": token})
         resp.raise_for_status()
     except Exception as e:
@@ -13,9 +13,10 @@ from urllib.parse import urlparse
 
 from smart_open import open
 
-from data_subscriber.download import run_download
+from data_subscriber.download import run_download, DEFAULT_MAX_CONCURRENT_DOWNLOADS
 from data_subscriber.hls.hls_catalog_connection import get_hls_catalog_connection
-from data_subscriber.query import update_url_index, run_query
+from data_subscriber.query import update_url_index, run_query, DEFAULT_MAX_QUERY_CONCURRENCY, \
+    DEFAULT_WATERMARK_OVERLAP_MINUTES
 from data_subscriber.survey import run_survey
 from data_subscriber.slc.slc_catalog_connection import get_slc_catalog_connection
 from data_subscriber.aws_token import supply_token
@@ -26,7 +27,6 @@ PRODUCT_PROVIDER_MAP = {"HLSL30": "LPCLOUD",
                         "SENTINEL-1A_SLC": "ASF",
                         "SENTINEL-1B_SLC": "ASF"}
 
-
 async def run(argv: list[str]):
     parser = create_parser()
     args = parser.parse_args(argv[1:])
@@ -41,16 +41,23 @@ async def run(argv: list[str]):
     netloc = urlparse(f"https://{edl}").netloc
     provider = PRODUCT_PROVIDER_MAP[args.collection] if hasattr(args, "collection") else args.provider
 
+    # journal download marks, which are buffered, so that they survive a failed flush and are sent by the next run.
+    # The journal directory must outlive the job's work directory
+    bulk_journal_dir = settings.get("CATALOG_BULK_JOURNAL_DIR") if args.subparser_name in ("download", "full") else None
     if provider == "LPCLOUD":
-        es_conn = get_hls_catalog_connection(logging.getLogger(__name__))
+        es_conn = get_hls_catalog_connection(logging.getLogger(__name__), bulk_journal_dir=bulk_journal_dir)
     elif provider == "ASF":
-        es_conn = get_slc_catalog_connection(logging.getLogger(__name__))
+        es_conn = get_slc_catalog_connection(logging.getLogger(__name__), bulk_journal_dir=bulk_journal_dir)
     else:
         raise Exception("Unreachable")
 
     if args.file:
         with open(args.file, "r") as f:
-            update_url_index(es_conn, f.readlines(), None, None, None)
+            catalog_failures = update_url_index(es_conn, f.readlines(), None, None, None, None, None)
+        catalog_failures += es_conn.flush_bulk()
+        if catalog_failures:
+            logging.error(f"Failed to catalog {len(catalog_failures)} document(s). {catalog_failures=}")
+            exit(1)
         exit(0)
 
     loglevel = "DEBUG" if args.verbose else "INFO"
@@ -223,30 +230,73 @@ def create_parser():
                           "default": "auto",
                           "help": "The protocol used for retrieving data, HTTPS or S3 or AUTO, default of auto"}}
 
+    max_query_concurrency = {"positionals": ["--max-query-concurrency"],
+                             "kwargs": {"dest": "max_query_concurrency",
+                                        "type": int,
+                                        "default": DEFAULT_MAX_QUERY_CONCURRENCY,
+                                        "help": "The maximum number of concurrent CMR requests. The query time range is "
+                                                "split into this many sub-windows, which are paged through in "
+                                                "parallel. CMR recommends 2-5 concurrent clients "
+                                                f"(default: {DEFAULT_MAX_QUERY_CONCURRENCY})."}}
+
+    use_watermark = {"positionals": ["--use-watermark"],
+                     "kwargs": {"dest": "use_watermark",
+                                "action": "store_true",
+                                "help": "Toggle for resuming the query from the revision date up to which the previous "
+                                        "successful query processed this collection, rather than looking back "
+                                        "--minutes. Falls back to --minutes when there is no watermark yet. "
+                                        "Ignored if --start-date, --end-date, --native-id, --use-temporal, or --smoke-run is given."}}
+
+    watermark_overlap_minutes = {"positionals": ["--watermark-overlap-minutes"],
+                                 "kwargs": {"dest": "watermark_overlap_minutes",
+                                            "type": int,
+                                            "default": DEFAULT_WATERMARK_OVERLAP_MINUTES,
+                                            "help": "How far before the watermark, in minutes, the query should start, "
+                                                    "to allow for CMR ingest latency "
+                                                    f"(default: {DEFAULT_WATERMARK_OVERLAP_MINUTES} minutes)."}}
+
+    cache_dir = {"positionals": ["--cache-dir"],
+                 "kwargs": {"dest": "cache_dir",
+                            "default": None,
+                            "help": "Directory in which to cache CMR search results, so that reruns over the same time "
+                                    "ranges are served from disk. Cached results expire after a week. Caching is "
+                                    "disabled if omitted."}}
+
+    max_concurrent_downloads = {"positionals": ["--max-concurrent-downloads"],
+                                "kwargs": {"dest": "max_concurrent_downloads",
+                                           "type": int,
+                                           "default": None,
+                                           "help": "The maximum number of products to download concurrently. "
+                                                   "Defaults to a per-provider limit "
+                                                   f"({DEFAULT_MAX_CONCURRENT_DOWNLOADS})."}}
 
     parser_arg_list = [verbose, file]
     _add_arguments(parser, parser_arg_list)
 
     survey_parser = subparsers.add_parser("survey")
     survey_parser_arg_list = [verbose, endpoint, provider, collection, start_date, end_date, bbox, minutes,
-                              smoke_run, native_id, use_temporal, temporal_start_date, step_hours, out_csv]
+                              smoke_run, native_id, use_temporal, temporal_start_date, step_hours, out_csv,
+                              max_query_concurrency, cache_dir]
     _add_arguments(survey_parser, survey_parser_arg_list)
 
     full_parser = subparsers.add_parser("full")
     full_parser_arg_list = [verbose, endpoint, collection, start_date, end_date, bbox, minutes,
                             dry_run, smoke_run, no_schedule_download, release_version, job_queue, chunk_size,
-                            batch_ids, use_temporal, temporal_start_date, native_id, transfer_protocol, proc_mode]
+                            batch_ids, use_temporal, temporal_start_date, native_id, transfer_protocol, proc_mode,
+                            max_query_concurrency, use_watermark, watermark_overlap_minutes, max_concurrent_downloads]
     _add_arguments(full_parser, full_parser_arg_list)
 
     query_parser = subparsers.add_parser("query")
     query_parser_arg_list = [verbose, endpoint, collection, start_date, end_date, bbox, minutes,
                              dry_run, smoke_run, no_schedule_download, release_version, job_queue, chunk_size,
-                             native_id, use_temporal, temporal_start_date, transfer_protocol, proc_mode]
+                             native_id, use_temporal, temporal_start_date, transfer_protocol, proc_mode,
+                             max_query_concurrency, use_watermark, watermark_overlap_minutes]
     _add_arguments(query_parser, query_parser_arg_list)
 
     download_parser = subparsers.add_parser("download")
     download_parser_arg_list = [verbose, file, endpoint, dry_run, smoke_run, provider, batch_ids,
-                                start_date, end_date, use_temporal, temporal_start_date, transfer_protocol]
+                                start_date, end_date, use_temporal, temporal_start_date, transfer_protocol,
+                                max_concurrent_downloads]
     _add_arguments(download_parser, download_parser_arg_list)
 
     return parser
@@ -270,6 +320,15 @@ def validate(args):
     if hasattr(args, "minutes") and args.minutes:
         _validate_minutes(args.minutes)
 
+    if hasattr(args, "max_query_concurrency") and args.max_query_concurrency is not None:
+        _validate_max_query_concurrency(args.max_query_concurrency)
+
+    if hasattr(args, "watermark_overlap_minutes") and args.watermark_overlap_minutes is not None:
+        _validate_watermark_overlap_minutes(args.watermark_overlap_minutes)
+
+    if hasattr(args, "max_concurrent_downloads") and args.max_concurrent_downloads is not None:
+        _validate_max_concurrent_downloads(args.max_concurrent_downloads)
+
 
 def _validate_bounds(bbox):
     bounds = bbox.split(",")
@@ -301,5 +360,22 @@ def _validate_minutes(minutes):
         raise ValueError(f"Error parsing minutes: {minutes}. Number must be an integer.")
 
 
+def _validate_max_query_concurrency(max_query_concurrency):
+    if max_query_concurrency < 1:
+        raise ValueError(f"Error parsing max query concurrency: {max_query_concurrency}. Number must be at least 1.")
+
+
+def _validate_watermark_overlap_minutes(watermark_overlap_minutes):
+    if watermark_overlap_minutes < 0:
+        raise ValueError(f"Error parsing watermark overlap minutes: {watermark_overlap_minutes}. "
+                         f"Number must not be negative.")
+
+
+def _validate_max_concurrent_downloads(max_concurrent_downloads):
+    if max_concurrent_downloads < 1:
+        raise ValueError(f"Error parsing max concurrent downloads: {max_concurrent_downloads}. "
+                         f"Number must be at least 1.")
+
+
 if __name__ == "__main__":
     asyncio.run(run(sys.argv))
@@ -1,29 +1,42 @@
+import fcntl
+import hashlib
 import itertools
 import json
 import logging
+import math
+import os
 import shutil
-from collections import defaultdict, namedtuple
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from functools import cache, lru_cache
 from pathlib import PurePath, Path
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable, Iterator, Optional
 
 import boto3
+import botocore.config
 import dateutil.parser
 import requests
 import requests.utils
 import validators
+from boto3.s3.transfer import TransferConfig
 from cachetools.func import ttl_cache
 from smart_open import open
 
 import extractor.extract
 import product2dataset.product2dataset
 from data_subscriber import ionosphere_download
-from data_subscriber.url import _to_granule_id, _to_orbit_number, _has_url, _to_url, _to_https_url
+from data_subscriber.url import _to_granule_id, _hls_url_to_granule_id, _to_orbit_number, _has_url, _to_url, _to_https_url
 from product2dataset import product2dataset
 from tools import stage_orbit_file
 from tools.stage_ionosphere_file import IonosphereFileNotFoundException
 from tools.stage_orbit_file import NoQueryResultsException
 from util.conf_util import SettingsConf
+from util.http_util import get_session, mount_pooled_adapters
+from util.orbit_cache_util import OrbitFileCache
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +46,41 @@ PRODUCT_PROVIDER_MAP = {"HLSL30": "LPCLOUD",
                         "SENTINEL-1A_SLC": "ASF",
                         "SENTINEL-1B_SLC": "ASF"}
 
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 ** 2  # bounds the memory used per download, regardless of product size
+
+DOWNLOAD_MAX_RESUMES = 3
+"""Number of times an interrupted HTTPS download is resumed before giving up"""
+
+PARTIAL_DOWNLOAD_MAX_AGE_SECONDS = 24 * 60 * 60
+"""Number of seconds after its last write that an abandoned partial download is deleted from the partial download dir"""
+
+DEFAULT_MAX_CONCURRENT_DOWNLOADS = {"LPCLOUD": 8, "ASF": 2}
+"""
+Default number of concurrent product downloads per provider. HLS granules are made up of many small band files,
+whereas SLC products are single, multi-GB files that are also staged (and later processed) one at a time.
+"""
+
+DEFAULT_DOWNLOAD_CLAIM_SIZE = {"LPCLOUD": 100, "ASF": 4}
+"""
+Default number of pending products claimed at a time per provider. Claims should be processed well within their
+lease (see `es_claim_util.DEFAULT_LEASE_SECONDS`), so only a few multi-GB SLC products are claimed at a time.
+"""
+
+ANCILLARY_STAGING_QUEUE_SIZE = 2
+"""Number of extracted SLC products that may be waiting on (or undergoing) orbit and ionosphere file staging"""
+
+S3_TRANSFER_MAX_CONCURRENCY = 16
+"""Maximum number of parallel ranged GETs per S3 download"""
+
+S3_MULTIPART_THRESHOLD = 64 * 1024 ** 2
+"""Objects at least this size are downloaded in parts. Smaller objects (e.g. HLS bands) are fetched with a single GET."""
+
+S3_MIN_MULTIPART_CHUNKSIZE = 16 * 1024 ** 2
+S3_MAX_MULTIPART_CHUNKSIZE = 128 * 1024 ** 2
+
+S3_MAX_POOL_CONNECTIONS = 2 * S3_TRANSFER_MAX_CONCURRENCY
+"""Connection pool size of each S3 client, which is shared by concurrent downloads"""
+
 
 class SessionWithHeaderRedirection(requests.Session):
     """
@@ -43,6 +91,7 @@ class SessionWithHeaderRedirection(requests.Session):
         super().__init__()
         self.auth = (username, password)
         self.auth_host = auth_host
+        mount_pooled_adapters(self)
 
     # Overrides from the library to keep headers when redirected to or from
     # the NASA auth host.
@@ -62,24 +111,31 @@ class SessionWithHeaderRedirection(requests.Session):
 def run_download(args, token, es_conn, netloc, username, password, job_id):
     provider = PRODUCT_PROVIDER_MAP[args.collection] if hasattr(args, "collection") else args.provider
     download_timerange = get_download_timerange(args)
-    all_pending_downloads: Iterable[dict] = es_conn.get_all_between(
-        dateutil.parser.isoparse(download_timerange.start_date),
-        dateutil.parser.isoparse(download_timerange.end_date),
-        args.use_temporal
-    )
-    logger.info(f"{len(list(all_pending_downloads))=}")
 
-    downloads = all_pending_downloads
+    predicate = None
     if args.batch_ids:
         logger.info(f"Filtering pending downloads by {args.batch_ids=}")
         id_func = _to_granule_id if provider == "LPCLOUD" else _to_orbit_number
-        downloads = list(filter(lambda d: id_func(d) in args.batch_ids, all_pending_downloads))
-        logger.info(f"{len(downloads)=}")
-        logger.debug(f"{downloads=}")
+        batch_ids = set(args.batch_ids)
+        predicate = lambda d: id_func(d) in batch_ids
 
-    if not downloads:
+    # pending downloads are paged in from the catalog and claimed for this job as they're consumed, so that concurrent
+    # download jobs over overlapping time ranges don't download the same products. HLS granules are claimed whole.
+    downloads: Iterator[dict] = iter(es_conn.claim_all_between(
+        dateutil.parser.isoparse(download_timerange.start_date),
+        dateutil.parser.isoparse(download_timerange.end_date),
+        args.use_temporal,
+        job_id,
+        predicate=predicate,
+        group_key=_to_granule_id if provider == "LPCLOUD" else None,
+        claim_size=DEFAULT_DOWNLOAD_CLAIM_SIZE[provider]
+    ))
+
+    first_download = next(downloads, None)
+    if first_download is None:
         logger.info(f"No undownloaded files found in index.")
         return
+    downloads = itertools.chain([first_download], downloads)
 
     if args.smoke_run:
         logger.info(f"{args.smoke_run=}. Restricting to 1 tile(s).")
@@ -87,15 +143,17 @@ def run_download(args, token, es_conn, netloc, username, password, job_id):
 
     session = SessionWithHeaderRedirection(username, password, netloc)
 
-    if provider == "ASF":
-        download_from_asf(session=session, es_conn=es_conn, downloads=downloads, args=args, token=token, job_id=job_id)
-    else:
-        download_urls = [_to_url(download) for download in downloads if _has_url(download)]
-        logger.debug(f"{download_urls=}")
-
-        granule_id_to_download_urls_map = group_download_urls_by_granule_id(download_urls)
+    try:
+        if provider == "ASF":
+            download_from_asf(session=session, es_conn=es_conn, downloads=downloads, args=args, token=token, job_id=job_id)
+        else:
+            download_urls = (_to_url(download) for download in downloads if _has_url(download))
+            granule_id_to_download_urls = group_consecutive_download_urls_by_granule_id(download_urls)
 
-        download_granules(session, es_conn, granule_id_to_download_urls_map, args, token, job_id)
+            download_granules(session, es_conn, granule_id_to_download_urls, args, token, job_id)
+    finally:
+        # don't lose the buffered download marks of the products processed before a failure
+        es_conn.flush_bulk()
 
 
 def get_download_timerange(args):
@@ -110,7 +168,7 @@ def get_download_timerange(args):
 def download_from_asf(
         session: requests.Session,
         es_conn,
-        downloads: list[dict],
+        downloads: Iterable[dict],
         args,
         token,
         job_id
@@ -122,109 +180,274 @@ def download_from_asf(
     # house all file downloads
     downloads_dir = Path("downloads")
     downloads_dir.mkdir(exist_ok=True)
+    partial_download_dir = _get_partial_download_dir(settings_cfg)
 
     if args.dry_run:
         logger.info(f"{args.dry_run=}. Skipping downloads.")
 
-    for download in downloads:
-        if not _has_url(download):
-            continue
+    def to_download_product_urls(downloads):
+        for download in downloads:
+            if not _has_url(download):
+                continue
 
-        if args.transfer_protocol == "https":
-            product_url = _to_https_url(download)
-        else:
-            product_url = _to_url(download)
+            if args.transfer_protocol == "https":
+                product_url = _to_https_url(download)
+            else:
+                product_url = _to_url(download)
+
+            if args.dry_run:
+                logger.info(f"{args.dry_run=}. Skipping download. {product_url=}")
+                continue
 
-        logger.info(f"Processing {product_url=}")
+            yield download, product_url
+    download_product_urls = to_download_product_urls(downloads)
+
+    def download_asf_product_to_dir(download_product_url):
+        download, product_url = download_product_url
+        logger.info(f"Downloading {product_url=}")
         product_id = PurePath(product_url).name
 
         product_download_dir = downloads_dir / product_id
         product_download_dir.mkdir(exist_ok=True)
 
-        # download product
-        if args.dry_run:
-            logger.debug(f"{args.dry_run=}. Skipping download.")
-            continue
+        # ancillary files only depend on the product's filename, so they're resolved while the product downloads
+        ancillary_future = ancillary_executor.submit(
+            _download_ancillary_files, product_id, product_download_dir / "ancillary",
+            _to_additional_metadata(download, provider), settings_cfg
+        )
 
-        if product_url.startswith("s3"):
-            product = product_filepath = download_product_using_s3(
-                product_url,
-                token,
-                target_dirpath=product_download_dir.resolve(),
-                args=args
-            )
-        else:
-            product = product_filepath = download_asf_product(
-                product_url, token, product_download_dir
-            )
+        try:
+            if product_url.startswith("s3"):
+                product_filepath = download_product_using_s3(
+                    product_url,
+                    token,
+                    target_dirpath=product_download_dir.resolve(),
+                    args=args
+                )
+            else:
+                product_filepath = download_asf_product(
+                    product_url, token, product_download_dir, partial_download_dir=partial_download_dir
+                )
+        except Exception:
+            ancillary_future.cancel()
+            raise
+
+        return product_filepath, ancillary_future
+
+    # products flow through a pipeline of bounded stages, so that while one product has its ancillary files staged, the
+    # next is extracted and the ones after it are downloaded. Products are processed (and marked as downloaded) in order.
+    # Each product is deleted once extracted, so at most (max_concurrent_downloads + 1) products are held on local disk.
+    failed_product_urls = {}
+    mark_failures = []
+    max_concurrent_downloads = _get_max_concurrent_downloads(args, provider)
+    with ThreadPoolExecutor(max_workers=max_concurrent_downloads, thread_name_prefix="download_ancillary") as ancillary_executor, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="stage_ancillary") as staging_executor:
+        staging_futures = deque()
+        for (download, product_url), downloaded, e in _download_concurrently(
+                download_product_urls, download_asf_product_to_dir, max_concurrent_downloads):
+            logger.info(f"Processing {product_url=}")
+            if e is not None:
+                logger.error(f"Failed to download product. Skipping. {product_url=}, {e=}")
+                failed_product_urls[product_url] = e
+                continue
+
+            product_filepath, ancillary_future = downloaded
+            logger.info(f"{product_filepath=}")
+
+            logger.info(f"Marking as downloaded. {product_url=}")
+            mark_failures += es_conn.bulk_mark_product_as_downloaded(product_url, job_id)
+
+            logger.info(f"product_url_downloaded={product_url}")
+
+            dataset_dir = extract_one_to_one(product_filepath, settings_cfg, working_dir=Path.cwd(),
+                                             extra_metadata=_to_additional_metadata(download, provider))
+
+            # the dataset holds a copy of the product
+            logger.info(f"Removing {product_filepath}")
+            product_filepath.unlink(missing_ok=True)
+
+            if len(staging_futures) >= ANCILLARY_STAGING_QUEUE_SIZE:
+                staging_futures.popleft().result()
+            staging_futures.append(staging_executor.submit(_stage_ancillary_files, dataset_dir, ancillary_future))
+
+        for staging_future in staging_futures:
+            staging_future.result()
+
+    mark_failures += es_conn.flush_bulk()
 
-        logger.info(f"{product_filepath=}")
+    logger.info(f"Removing directory tree. {downloads_dir}")
+    shutil.rmtree(downloads_dir)
 
-        logger.info(f"Marking as downloaded. {product_url=}")
-        es_conn.mark_product_as_downloaded(product_url, job_id)
+    _raise_for_failures(failed_product_urls, mark_failures)
 
-        logger.info(f"product_url_downloaded={product_url}")
 
-        additional_metadata = {}
-        try:
-            additional_metadata['processing_mode'] = download['processing_mode']
-        except:
-            logger.warning("processing_mode not found in the slc_catalog ES index")
+def _to_additional_metadata(download: dict, provider) -> dict:
+    additional_metadata = {}
+    try:
+        additional_metadata['processing_mode'] = download['processing_mode']
+    except:
+        logger.warning("processing_mode not found in the slc_catalog ES index")
 
-        if provider == "ASF":
-            if download.get("intersects_north_america"):
-                logger.info("adding additional dataset metadata (intersects_north_america)")
-                additional_metadata["intersects_north_america"] = True
+    if provider == "ASF":
+        if download.get("intersects_north_america"):
+            logger.info("adding additional dataset metadata (intersects_north_america)")
+            additional_metadata["intersects_north_america"] = True
 
-        dataset_dir = extract_one_to_one(product, settings_cfg, working_dir=Path.cwd(),
-                                         extra_metadata=additional_metadata)
+    return additional_metadata
 
-        logger.info("Downloading associated orbit file")
 
-        try:
-            logger.info(f"Querying for Precise Ephemeris Orbit (POEORB) file")
-            stage_orbit_file_args = stage_orbit_file.get_parser().parse_args(
-                [
-                    f"--output-directory={str(dataset_dir)}",
-                    "--orbit-type=POEORB",
-                    f"--query-time-range={settings_cfg.get('POE_ORBIT_TIME_RANGE', stage_orbit_file.DEFAULT_POE_TIME_RANGE)}",
-                    str(product_filepath)
-                ]
-            )
-            stage_orbit_file.main(stage_orbit_file_args)
-        except NoQueryResultsException:
-            logger.warning("POEORB file could not be found, querying for Restituted Orbit (ROEORB) file")
-            stage_orbit_file_args = stage_orbit_file.get_parser().parse_args(
-                [
-                    f"--output-directory={str(dataset_dir)}",
-                    "--orbit-type=RESORB",
-                    f"--query-time-range={settings_cfg.get('RES_ORBIT_TIME_RANGE', stage_orbit_file.DEFAULT_RES_TIME_RANGE)}",
-                    str(product_filepath)
-                ]
-            )
-            stage_orbit_file.main(stage_orbit_file_args)
+def _download_ancillary_files(product_filename: str, output_dir: Path, additional_metadata: dict, settings_cfg: dict):
+    """
+    Downloads the orbit file, and, if applicable, the ionosphere correction file, of an SLC product to the given
+    directory. Only the product's filename is needed, so this can run while the product itself is downloading.
 
-        logger.info("Added orbit file to dataset")
+    :return: a tuple of the orbit file path, the ionosphere file path, and the ionosphere file URL. The latter two are
+             None if no ionosphere correction file applies to (or could be found for) the product.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
 
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        ionosphere_future = None
         if additional_metadata.get("intersects_north_america", False) \
                 and additional_metadata['processing_mode'] in ("historical", "reprocessing"):
             logger.info(f"Processing mode is {additional_metadata['processing_mode']}. Attempting to download ionosphere correction file.")
-            try:
-                output_ionosphere_filepath = ionosphere_download.download_ionosphere_correction_file(dataset_dir=dataset_dir, product_filepath=product_filepath)
-                ionosphere_url = ionosphere_download.get_ionosphere_correction_file_url(dataset_dir=dataset_dir, product_filepath=product_filepath)
+            ionosphere_future = executor.submit(_download_ionosphere_file, product_filename, output_dir, settings_cfg)
 
-                # add ionosphere metadata to the dataset about to be ingested
-                ionosphere_metadata = ionosphere_download.generate_ionosphere_metadata(output_ionosphere_filepath, ionosphere_url=ionosphere_url, s3_bucket="...", s3_key="...")
-                update_pending_dataset_metadata_with_ionosphere_metadata(dataset_dir, ionosphere_metadata)
-            except IonosphereFileNotFoundException:
-                logger.warning("Ionosphere file not found remotely. Allowing job to continue.")
-                pass
+        orbit_filepath = _download_orbit_file(product_filename, output_dir, settings_cfg)
 
-        logger.info(f"Removing {product_filepath}")
-        product_filepath.unlink(missing_ok=True)
+        ionosphere_filepath, ionosphere_url = ionosphere_future.result() if ionosphere_future else (None, None)
+
+    return orbit_filepath, ionosphere_filepath, ionosphere_url
+
+
+_orbit_file_lock = threading.Lock()
+"""Serializes orbit file resolution, so that products covered by the same orbit file only query and download it once"""
+
+
+def _download_orbit_file(product_filename: str, output_dir: Path, settings_cfg: dict) -> Path:
+    """
+    Downloads the orbit file of an SLC product. The Precise Ephemeris Orbit (POEORB) file is preferred over the
+    Restituted Orbit (RESORB) file.
+
+    If an ORBIT_CACHE_DIR is configured, orbit files are cached (see `OrbitFileCache`), and the orbit file service is
+    only queried if no cached orbit file covers the product.
+    """
+    logger.info("Downloading associated orbit file")
+
+    orbit_file_cache = _get_orbit_file_cache(settings_cfg.get("ORBIT_CACHE_DIR"), settings_cfg.get("ORBIT_CACHE_S3_URL"))
+    if not orbit_file_cache:
+        return _query_and_download_orbit_file(product_filename, output_dir, settings_cfg)
+
+    mission_id, safe_start_time, safe_stop_time = stage_orbit_file.parse_orbit_time_range_from_safe(product_filename)
+    safe_start_datetime = datetime.strptime(safe_start_time, "%Y%m%dT%H%M%S")
+    safe_stop_datetime = datetime.strptime(safe_stop_time, "%Y%m%dT%H%M%S")
+
+    with _orbit_file_lock:
+        cached_orbit_filepath = orbit_file_cache.get(
+            mission_id, stage_orbit_file.ORBIT_TYPE_POE, safe_start_datetime, safe_stop_datetime
+        )
+        if not cached_orbit_filepath:
+            cached_resorb_filepath = orbit_file_cache.get(
+                mission_id, stage_orbit_file.ORBIT_TYPE_RES, safe_start_datetime, safe_stop_datetime
+            )
+            orbit_filepath = _query_and_download_orbit_file(
+                product_filename, output_dir, settings_cfg, cached_resorb_filepath
+            )
+            if orbit_filepath != cached_resorb_filepath:
+                orbit_file_cache.put(orbit_filepath)
+                return orbit_filepath
+            cached_orbit_filepath = cached_resorb_filepath
+
+        # the orbit file is moved into the dataset, so the cached copy is copied
+        orbit_filepath = Path(shutil.copy(cached_orbit_filepath, output_dir))
+    logger.info(f"{orbit_filepath=}")
+    return orbit_filepath
+
+
+def _query_and_download_orbit_file(product_filename: str, output_dir: Path, settings_cfg: dict,
+                                   cached_resorb_filepath: Optional[Path] = None) -> Path:
+    """
+    Queries for and downloads the orbit file of an SLC product. The POEORB and RESORB files are queried for
+    concurrently, and the POEORB file is preferred. The RESORB file is not queried for if a cached one is given, which is
+    returned as-is if there is no POEORB file.
+    """
+    orbit_catalog_args = [f"--catalog={settings_cfg['ORBIT_CATALOG_PATH']}"] if settings_cfg.get("ORBIT_CATALOG_PATH") else []
+
+    def query_orbit_file(orbit_type, query_time_range):
+        stage_orbit_file_args = stage_orbit_file.get_parser().parse_args(
+            [
+                f"--output-directory={str(output_dir)}",
+                f"--orbit-type={orbit_type}",
+                f"--query-time-range={query_time_range}",
+                *orbit_catalog_args,
+                product_filename
+            ]
+        )
+        return stage_orbit_file_args, stage_orbit_file.query_orbit_file(stage_orbit_file_args)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        logger.info(f"Querying for Precise Ephemeris Orbit (POEORB) and Restituted Orbit (RESORB) files")
+        poeorb_future = executor.submit(
+            query_orbit_file, "POEORB",
+            settings_cfg.get('POE_ORBIT_TIME_RANGE', stage_orbit_file.DEFAULT_POE_TIME_RANGE)
+        )
+        resorb_future = None
+        if not cached_resorb_filepath:
+            resorb_future = executor.submit(
+                query_orbit_file, "RESORB",
+                settings_cfg.get('RES_ORBIT_TIME_RANGE', stage_orbit_file.DEFAULT_RES_TIME_RANGE)
+            )
+
+        try:
+            stage_orbit_file_args, (orbit_file_name, request_url) = poeorb_future.result()
+        except NoQueryResultsException:
+            if cached_resorb_filepath:
+                logger.warning("POEORB file could not be found, using cached Restituted Orbit (RESORB) file")
+                return cached_resorb_filepath
+            logger.warning("POEORB file could not be found, using Restituted Orbit (RESORB) file")
+            stage_orbit_file_args, (orbit_file_name, request_url) = resorb_future.result()
+
+    orbit_filepath = stage_orbit_file.download_orbit_file(
+        request_url, stage_orbit_file_args.output_directory, orbit_file_name,
+        stage_orbit_file_args.username, stage_orbit_file_args.password
+    )
+    logger.info(f"{orbit_filepath=}")
+    return Path(orbit_filepath)
+
+
+@cache
+def _get_orbit_file_cache(cache_dir: Optional[str], s3_url: Optional[str]) -> Optional[OrbitFileCache]:
+    return OrbitFileCache(cache_dir, s3_url) if cache_dir else None
+
+
+def _download_ionosphere_file(product_filename: str, output_dir: Path, settings_cfg: dict):
+    try:
+        output_ionosphere_filepath = ionosphere_download.download_ionosphere_correction_file(
+            dataset_dir=output_dir, product_filepath=product_filename,
+            ionosphere_file_cache=ionosphere_download.get_ionosphere_file_cache(settings_cfg)
+        )
+        ionosphere_url = ionosphere_download.get_ionosphere_correction_file_url(dataset_dir=output_dir, product_filepath=product_filename)
+        return Path(output_ionosphere_filepath), ionosphere_url
+    except IonosphereFileNotFoundException:
+        logger.warning("Ionosphere file not found remotely. Allowing job to continue.")
+        return None, None
 
-    logger.info(f"Removing directory tree. {downloads_dir}")
-    shutil.rmtree(downloads_dir)
+
+def _stage_ancillary_files(dataset_dir: PurePath, ancillary_future: Future):
+    """Moves the downloaded ancillary files of an SLC product into its dataset, adding any ionosphere metadata."""
+    orbit_filepath, ionosphere_filepath, ionosphere_url = ancillary_future.result()
+
+    shutil.move(orbit_filepath, str(dataset_dir))
+    logger.info("Added orbit file to dataset")
+
+    if ionosphere_filepath:
+        output_ionosphere_filepath = Path(dataset_dir, ionosphere_filepath.name)
+        shutil.move(ionosphere_filepath, output_ionosphere_filepath)
+
+        # add ionosphere metadata to the dataset about to be ingested
+        ionosphere_metadata = ionosphere_download.generate_ionosphere_metadata(output_ionosphere_filepath, ionosphere_url=ionosphere_url, s3_bucket="...", s3_key="...")
+        update_pending_dataset_metadata_with_ionosphere_metadata(dataset_dir, ionosphere_metadata)
+        logger.info("Added ionosphere correction file to dataset")
 
 
 def update_pending_dataset_metadata_with_ionosphere_metadata(dataset_dir: PurePath, ionosphere_metadata: dict):
@@ -242,7 +465,7 @@ def update_pending_dataset_metadata_with_ionosphere_metadata(dataset_dir: PurePa
 def download_granules(
         session: requests.Session,
         es_conn,
-        granule_id_to_product_urls_map: dict[str, list[str]],
+        granule_id_to_product_urls: Iterable[tuple[str, list[str]]],
         args,
         token,
         job_id
@@ -252,14 +475,18 @@ def download_granules(
     # house all file downloads
     downloads_dir = Path("downloads")
     downloads_dir.mkdir(exist_ok=True)
+    partial_download_dir = _get_partial_download_dir(cfg)
 
     if args.dry_run:
         logger.info(f"{args.dry_run=}. Skipping downloads.")
 
     if args.smoke_run:
-        granule_id_to_product_urls_map = dict(itertools.islice(granule_id_to_product_urls_map.items(), 1))
+        granule_id_to_product_urls = itertools.islice(granule_id_to_product_urls, 1)
 
-    for granule_id, product_urls in granule_id_to_product_urls_map.items():
+    failed_product_urls = {}
+    mark_failures = []
+    max_concurrent_downloads = _get_max_concurrent_downloads(args, "LPCLOUD")
+    for granule_id, product_urls in granule_id_to_product_urls:
         logger.info(f"Processing {granule_id=}")
 
         granule_download_dir = downloads_dir / granule_id
@@ -268,18 +495,33 @@ def download_granules(
         # download products in granule
         products = []
         product_urls_downloaded = []
-        for product_url in product_urls:
-            if args.dry_run:
-                logger.debug(f"{args.dry_run=}. Skipping download.")
-                break
-            product_filepath = download_product(product_url, session, token, args, granule_download_dir)
+        granule_failed_product_urls = {}
+        if args.dry_run:
+            logger.debug(f"{args.dry_run=}. Skipping download.")
+            product_urls = []
+        for product_url, product_filepath, e in _download_concurrently(
+                product_urls,
+                lambda product_url: download_product(product_url, session, token, args, granule_download_dir,
+                                                     partial_download_dir=partial_download_dir),
+                max_concurrent_downloads):
+            if e is not None:
+                logger.error(f"Failed to download product. {product_url=}, {e=}")
+                granule_failed_product_urls[product_url] = e
+                continue
             products.append(product_filepath)
             product_urls_downloaded.append(product_url)
         logger.info(f"{products=}")
 
+        if granule_failed_product_urls:
+            # leave the granule's products pending, so that a later download job retries the whole granule
+            logger.error(f"Failed to download {len(granule_failed_product_urls)} product(s). Skipping. {granule_id=}")
+            failed_product_urls.update(granule_failed_product_urls)
+            shutil.rmtree(granule_download_dir)
+            continue
+
         logger.info(f"Marking as downloaded. {granule_id=}")
         for product_url in product_urls_downloaded:
-            es_conn.mark_product_as_downloaded(product_url, job_id)
+            mark_failures += es_conn.bulk_mark_product_as_downloaded(product_url, job_id)
 
         logger.info(f"{len(product_urls_downloaded)=}, {product_urls_downloaded=}")
 
@@ -288,17 +530,69 @@ def download_granules(
         logger.info(f"Removing directory {granule_download_dir}")
         shutil.rmtree(granule_download_dir)
 
+    mark_failures += es_conn.flush_bulk()
+
     logger.info(f"Removing directory tree. {downloads_dir}")
     shutil.rmtree(downloads_dir)
 
+    _raise_for_failures(failed_product_urls, mark_failures)
+
+
+def _raise_for_failures(failed_product_urls: dict, mark_failures: list[dict]):
+    if failed_product_urls:
+        raise Exception(f"Failed to download {len(failed_product_urls)} product(s). {failed_product_urls=}")
+    if mark_failures:
+        raise Exception(f"Failed to mark {len(mark_failures)} product(s) as downloaded. {mark_failures=}")
+
+
+def _get_max_concurrent_downloads(args, provider) -> int:
+    return getattr(args, "max_concurrent_downloads", None) or DEFAULT_MAX_CONCURRENT_DOWNLOADS[provider]
+
+
+def _download_concurrently(
+        items: Iterable,
+        download_func: Callable[[Any], Any],
+        max_concurrent_downloads: int
+) -> Iterator[tuple[Any, Any, Optional[Exception]]]:
+    """
+    Calls `download_func` for each of the given items on a pool of threads, yielding (item, result, exception) tuples
+    in the order of the items. Exactly one of result and exception is None.
+
+    At most `max_concurrent_downloads` downloads are scheduled ahead of the consumer, so that a slow consumer (e.g.
+    dataset extraction) also bounds the number of downloaded products waiting on disk.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_concurrent_downloads, thread_name_prefix="download") as executor:
+        scheduled = deque(
+            (item, executor.submit(download_func, item))
+            for item in itertools.islice(items, max_concurrent_downloads)
+        )
+        try:
+            while scheduled:
+                item, future = scheduled.popleft()
+                try:
+                    result, exception = future.result(), None
+                except Exception as e:
+                    result, exception = None, e
 
-def download_product(product_url, session: requests.Session, token: str, args, target_dirpath: Path):
+                for next_item in itertools.islice(items, 1):
+                    scheduled.append((next_item, executor.submit(download_func, next_item)))
+
+                yield item, result, exception
+        finally:
+            for _, future in scheduled:
+                future.cancel()
+
+
+def download_product(product_url, session: requests.Session, token: str, args, target_dirpath: Path,
+                     partial_download_dir: Optional[Path] = None):
     if args.transfer_protocol.lower() == "https":
         product_filepath = download_product_using_https(
             product_url,
             session,
             token,
-            target_dirpath=target_dirpath.resolve()
+            target_dirpath=target_dirpath.resolve(),
+            partial_download_dir=partial_download_dir
         )
     elif args.transfer_protocol.lower() == "s3":
         product_filepath = download_product_using_s3(
@@ -320,22 +614,23 @@ def download_product(product_url, session: requests.Session, token: str, args, t
                 product_url,
                 session,
                 token,
-                target_dirpath=target_dirpath.resolve()
+                target_dirpath=target_dirpath.resolve(),
+                partial_download_dir=partial_download_dir
             )
 
     return product_filepath
 
 
-def download_asf_product(product_url, token: str, target_dirpath: Path):
+def download_asf_product(product_url, token: str, target_dirpath: Path, partial_download_dir: Optional[Path] = None):
     logger.info(f"Requesting from {product_url}")
 
-    asf_response = _handle_url_redirect(product_url, token)
-    asf_response.raise_for_status()
-
     product_filename = PurePath(product_url).name
     product_download_path = target_dirpath / product_filename
-    with open(product_download_path, "wb") as file:
-        file.write(asf_response.content)
+    _download_resumable(
+        lambda headers: _handle_url_redirect(product_url, token, stream=True, headers=headers),
+        product_download_path,
+        partial_path=_to_partial_download_path(product_url, partial_download_dir)
+    )
     return product_download_path.resolve()
 
 
@@ -424,75 +719,218 @@ def extract_one_to_one(product: Path, settings_cfg: dict, working_dir: Path, ext
     return PurePath(dataset_dir)
 
 
-def download_product_using_https(url, session: requests.Session, token, target_dirpath: Path, chunk_size=25600) -> Path:
-    headers = {"Echo-Token": token}
-    with session.get(url, headers=headers) as r:
-        r.raise_for_status()
+def download_product_using_https(url, session: requests.Session, token, target_dirpath: Path,
+                                 chunk_size=DOWNLOAD_CHUNK_SIZE, partial_download_dir: Optional[Path] = None) -> Path:
+    file_name = PurePath(url).name
+    product_download_path = target_dirpath / file_name
+    _download_resumable(
+        lambda headers: session.get(url, headers={"Echo-Token": token, **headers}, stream=True),
+        product_download_path,
+        chunk_size,
+        partial_path=_to_partial_download_path(url, partial_download_dir)
+    )
+    return product_download_path.resolve()
 
-        file_name = PurePath(url).name
-        product_download_path = target_dirpath / file_name
-        with open(product_download_path, "wb") as output_file:
-            output_file.write(r.content)
-        return product_download_path.resolve()
+
+def _get_partial_download_dir(settings_cfg: dict) -> Optional[Path]:
+    """
+    Returns the node-persistent directory of partial downloads, which outlives the job's work directory, so that the
+    next job on the node resumes the downloads of a job that was interrupted (e.g. a terminated spot instance).
+    Partial downloads abandoned for longer than `PARTIAL_DOWNLOAD_MAX_AGE_SECONDS` are deleted.
+    """
+    if not settings_cfg.get("PARTIAL_DOWNLOAD_DIR"):
+        return None
+
+    partial_download_dir = Path(settings_cfg["PARTIAL_DOWNLOAD_DIR"])
+    partial_download_dir.mkdir(parents=True, exist_ok=True)
+
+    for entry in os.scandir(partial_download_dir):
+        if entry.is_file() and time.time() - entry.stat().st_mtime > PARTIAL_DOWNLOAD_MAX_AGE_SECONDS:
+            logger.info(f"Removing abandoned partial download. {entry.path=}")
+            Path(entry.path).unlink(missing_ok=True)
+
+    return partial_download_dir
+
+
+def _to_partial_download_path(url: str, partial_download_dir: Optional[Path]) -> Optional[Path]:
+    """Returns the path (sans suffix) of the partial download files of a URL, or None to keep them next to the target."""
+    if not partial_download_dir:
+        return None
+    return partial_download_dir / hashlib.sha256(url.encode()).hexdigest()
+
+
+def _download_resumable(request: Callable[[dict], requests.Response], path: Path, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                        max_resumes=DOWNLOAD_MAX_RESUMES, partial_path: Optional[Path] = None):
+    """
+    Downloads the body of a streamed response to the given path, one chunk at a time, resuming interrupted transfers.
+
+    The body is written to a partial (.part) file, alongside a checkpoint (.part.json) of the expected size and a
+    validator (strong ETag or Last-Modified) of the remote file. When the connection drops mid-transfer, or a previous
+    run left a partial file behind, only the missing bytes are requested, using a `Range` request. The `If-Range`
+    validator makes the server send the whole file instead if it has changed since.
+
+    :param request: sends the GET request with the given additional headers, returning the (streamed) response.
+    :param partial_path: the path (sans suffix) of the partial files, e.g. in a directory that outlives the job. The
+                         partial files are kept next to the given path by default.
+    """
+    partial_path = partial_path or path
+    part_path = partial_path.with_name(f"{partial_path.name}.part")
+    checkpoint_path = partial_path.with_name(f"{partial_path.name}.part.json")
+
+    # concurrent jobs on a node must not write to the same partial file
+    with _lock_partial_download(partial_path.with_name(f"{partial_path.name}.lock")):
+        for attempt in itertools.count():
+            checkpoint = _read_download_checkpoint(checkpoint_path)
+            offset = part_path.stat().st_size if checkpoint and part_path.exists() else 0
+
+            if offset and offset >= checkpoint["size"]:
+                if offset == checkpoint["size"]:
+                    # the body was fully written by a run that stopped before moving it into place
+                    logger.info(f"Download already complete. {path=!s}")
+                    break
+                offset = 0
+
+            headers = {}
+            if offset:
+                logger.info(f"Resuming download. {path=!s}, {offset=}, size={checkpoint['size']}")
+                headers = {"Range": f"bytes={offset}-", "If-Range": checkpoint["validator"]}
+
+            try:
+                with request(headers) as response:
+                    if offset and response.status_code == 416:
+                        # the checkpointed range no longer exists on the server. Start over
+                        logger.warning(f"Range not satisfiable. Restarting download. {path=!s}, {offset=}")
+                        part_path.unlink(missing_ok=True)
+                        checkpoint_path.unlink(missing_ok=True)
+                        continue
+                    response.raise_for_status()
+
+                    if offset and _is_expected_range(response, offset, checkpoint["size"]):
+                        mode = "ab"
+                    else:
+                        mode = "wb"
+                        checkpoint = _to_download_checkpoint(response)
+                        if checkpoint:
+                            checkpoint_path.write_text(json.dumps(checkpoint))
+                        else:
+                            checkpoint_path.unlink(missing_ok=True)
+
+                    with open(part_path, mode) as output_file:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            output_file.write(chunk)
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt >= max_resumes:
+                    raise
+                logger.warning(f"Download interrupted. {path=!s}, {e=}")
+
+        if checkpoint and part_path.stat().st_size != checkpoint["size"]:
+            raise Exception(f"Downloaded file size doesn't match. {path=!s}, expected_size={checkpoint['size']}, "
+                            f"actual_size={part_path.stat().st_size}")
+
+        shutil.move(part_path, path)  # a rename, unless the partial files are kept on another filesystem
+        checkpoint_path.unlink(missing_ok=True)
+
+
+@contextmanager
+def _lock_partial_download(lock_path: Path):
+    # lock files are left in place, as removing them would race with jobs waiting on them
+    with open(lock_path, "w") as lock_fp:
+        fcntl.flock(lock_fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+
+def _to_download_checkpoint(response: requests.Response) -> Optional[dict]:
+    """Returns the checkpoint of a full (200) response, or None if the transfer can't be resumed."""
+    etag = response.headers.get("ETag")
+    validator = etag if etag and not etag.startswith("W/") else response.headers.get("Last-Modified")
+    size = response.headers.get("Content-Length")
+
+    # byte ranges refer to the encoded body, whereas the decoded body is written to disk
+    if not validator or not size or response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    return {"validator": validator, "size": int(size)}
+
+
+def _read_download_checkpoint(checkpoint_path: Path) -> Optional[dict]:
+    try:
+        return json.loads(checkpoint_path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _is_expected_range(response: requests.Response, offset: int, size: int) -> bool:
+    """Returns True if the response is a partial (206) response of the checkpointed file, starting at the offset."""
+    if response.status_code != 206:
+        return False
+    content_range = response.headers.get("Content-Range", "")  # e.g. "bytes 100-999/1000"
+    return content_range == f"bytes {offset}-{size - 1}/{size}"
 
 
 def download_product_using_s3(url, token, target_dirpath: Path, args) -> Path:
     provider = PRODUCT_PROVIDER_MAP[args.collection] if hasattr(args, "collection") else args.provider
+    s3 = _get_s3_client(token, provider)
+    product_download_path = _s3_download(url, s3, str(target_dirpath))
+    return product_download_path.resolve()
+
+
+def _get_s3_client(token, provider):
+    """
+    Returns an S3 client for the given provider's temporary credentials. Clients are reused until `_get_aws_creds`
+    rotates the credentials. Clients are thread-safe, so a single client is shared by concurrent downloads.
+    """
     aws_creds = _get_aws_creds(token, provider)
     logger.debug(f"{_get_aws_creds.cache_info()=}")
 
-    s3 = boto3.Session(aws_access_key_id=aws_creds['accessKeyId'],
-                       aws_secret_access_key=aws_creds['secretAccessKey'],
-                       aws_session_token=aws_creds['sessionToken'],
-                       region_name='us-west-2').client("s3")
-    product_download_path = _s3_download(url, s3, str(target_dirpath))
-    return product_download_path.resolve()
+    s3 = _create_s3_client(provider, aws_creds['accessKeyId'], aws_creds['secretAccessKey'], aws_creds['sessionToken'])
+    logger.debug(f"{_create_s3_client.cache_info()=}")
+    return s3
 
 
-def _https_transfer(url, bucket_name, token, staging_area=""):
-    file_name = PurePath(url).name
-    bucket = bucket_name[len("s3://"):] if bucket_name.startswith("s3://") else bucket_name
-    key = Path(staging_area, file_name).name
+@lru_cache(maxsize=4)  # a couple of providers, plus the clients of credentials that were just rotated
+def _create_s3_client(provider, aws_access_key_id, aws_secret_access_key, aws_session_token):
+    logger.info(f"Creating S3 client. {provider=}")
 
-    upload_start_time = datetime.utcnow()
+    return boto3.Session(aws_access_key_id=aws_access_key_id,
+                         aws_secret_access_key=aws_secret_access_key,
+                         aws_session_token=aws_session_token,
+                         region_name='us-west-2').client(
+        "s3",
+        config=botocore.config.Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+    )
 
-    try:
-        logger.info(f"Requesting from {url}")
-        r = _handle_url_redirect(url, token)
-        if r.status_code != 200:
-            r.raise_for_status()
-
-        with open("https.tmp", "wb") as file:
-            file.write(r.content)
-
-        logger.info(f"Uploading {file_name} to {bucket=}, {key=}")
-        with open("https.tmp", "rb") as file:
-            s3 = boto3.client("s3")
-            s3.upload_fileobj(file, bucket, key)
-
-        upload_end_time = datetime.utcnow()
-        upload_duration = upload_end_time - upload_start_time
-        upload_stats = {"file_name": file_name,
-                        "file_size (in bytes)": r.headers.get("Content-Length"),
-                        "upload_duration (in seconds)": upload_duration.total_seconds(),
-                        "upload_start_time": _convert_datetime(upload_start_time),
-                        "upload_end_time": _convert_datetime(upload_end_time)}
-        logger.debug(f"{upload_stats=}")
-
-        return upload_stats
-    except (Exception, ConnectionResetError, requests.exceptions.HTTPError) as e:
-        logger.error(e)
-        return {"failed_download": e}
+
+def _get_transfer_config(object_size: int) -> TransferConfig:
+    """
+    Returns the transfer configuration for an S3 object of the given size.
+
+    Small objects are fetched with a single GET. Large objects (e.g. SLC SAFE files) are split into parts of
+    between `S3_MIN_MULTIPART_CHUNKSIZE` and `S3_MAX_MULTIPART_CHUNKSIZE`, about 4 per thread, which are fetched
+    with up to `S3_TRANSFER_MAX_CONCURRENCY` parallel ranged GETs.
+    """
+    chunksize = math.ceil(object_size / (4 * S3_TRANSFER_MAX_CONCURRENCY))
+    chunksize = min(max(chunksize, S3_MIN_MULTIPART_CHUNKSIZE), S3_MAX_MULTIPART_CHUNKSIZE)
+    max_concurrency = min(max(math.ceil(object_size / chunksize), 1), S3_TRANSFER_MAX_CONCURRENCY)
+
+    return TransferConfig(
+        multipart_threshold=S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=chunksize,
+        max_concurrency=max_concurrency
+    )
 
 
-def _handle_url_redirect(url, token):
+def _handle_url_redirect(url, token, stream=False, headers=None):
     if not validators.url(url):
         raise Exception(f"Malformed URL: {url}")
 
-    r = requests.get(url, allow_redirects=False)
+    session = get_session()
+    r = session.get(url, allow_redirects=False)
 
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-    return requests.get(r.headers["Location"], headers=headers, allow_redirects=True)
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json", **(headers or {})}
+    return session.get(r.headers["Location"], headers=headers, allow_redirects=True, stream=stream)
 
 
 def _convert_datetime(datetime_obj, strformat="%Y-%m-%dT%H:%M:%S.%fZ"):
@@ -521,8 +959,8 @@ def _get_aws_creds(token, provider):
 def _get_lp_aws_creds(token):
     logger.info("entry")
 
-    with requests.get("https://data.lpdaac.earthdatacloud.nasa.gov/s3credentials",
-                      headers={'Authorization': f'Bearer {token}'}) as r:
+    with get_session().get("https://data.lpdaac.earthdatacloud.nasa.gov/s3credentials",
+                           headers={'Authorization': f'Bearer {token}'}) as r:
         r.raise_for_status()
 
         return r.json()
@@ -531,8 +969,8 @@ def _get_lp_aws_creds(token):
 def _get_asf_aws_creds(token):
     logger.info("entry")
 
-    with requests.get("https://sentinel1.asf.alaska.edu/s3credentials",
-                     headers={'Authorization': f'Bearer {token}'}) as r:
+    with get_session().get("https://sentinel1.asf.alaska.edu/s3credentials",
+                           headers={'Authorization': f'Bearer {token}'}) as r:
         r.raise_for_status()
 
         return r.json()
@@ -556,7 +994,11 @@ def _s3_download(url, s3, tmp_dir, staging_area=""):
     source_bucket = source[0]
     source_key = source[2]
 
-    s3.download_file(source_bucket, source_key, f"{tmp_dir}/{target_key}")
+    object_size = s3.head_object(Bucket=source_bucket, Key=source_key)["ContentLength"]
+    transfer_config = _get_transfer_config(object_size)
+    logger.debug(f"{object_size=}, {transfer_config.multipart_chunksize=}, {transfer_config.max_concurrency=}")
+
+    s3.download_file(source_bucket, source_key, f"{tmp_dir}/{target_key}", Config=transfer_config)
 
     return Path(f"{tmp_dir}/{target_key}")
 
@@ -579,3 +1021,12 @@ def group_download_urls_by_granule_id(download_urls):
         granule_id = PurePath(download_url).with_suffix("").with_suffix("").name
         granule_id_to_download_urls_map[granule_id].append(download_url)
     return granule_id_to_download_urls_map
+
+
+def group_consecutive_download_urls_by_granule_id(download_urls: Iterable[str]) -> Iterator[tuple[str, list[str]]]:
+    """
+    Lazily groups the download URLs of each granule, which must be consecutive. Claimed granules are, as grouped claims
+    are ordered by granule ID (see `HLSProductCatalog.claim_all_between`).
+    """
+    for granule_id, granule_download_urls in itertools.groupby(download_urls, key=_hls_url_to_granule_id):
+        yield granule_id, list(granule_download_urls)
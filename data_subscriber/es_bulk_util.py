@@ -0,0 +1,152 @@
+import fcntl
+import json
+import os
+import time
+import uuid
+from datetime import date
+from pathlib import Path
+from uuid import UUID
+
+from elasticsearch.helpers import bulk
+
+DEFAULT_MAX_ACTIONS = 2000
+"""Default number of buffered actions that triggers a flush"""
+
+DEFAULT_MAX_INTERVAL_SECONDS = 30
+"""Default number of seconds between flushes while actions are being buffered"""
+
+DEFAULT_MAX_RETRIES = 3
+"""Default number of times actions rejected with 429 (Too Many Requests) are retried, with exponential backoff"""
+
+
+class BulkActionBuffer:
+    """
+    Buffers Elasticsearch bulk actions and sends them through the `_bulk` endpoint.
+
+    The buffer is flushed automatically once it holds `max_actions` actions, or when an action is added more than
+    `max_interval_seconds` after the previous flush. Callers must call `flush()` once they are done adding actions.
+
+    Per-document failures are returned from each flush and are also accumulated in `failures`.
+
+    If a `journal_dir` is given, each batch of actions is appended to a journal file in that directory (with a single
+    fsync) before it is sent, and the journal is truncated once the batch has been sent, so that batches survive a
+    failed flush (e.g. Elasticsearch being unavailable) or the process crashing mid-flush. Actions added since the last
+    flush are not journaled. The journal directory must persist across jobs (e.g. be node-local rather than in a job's
+    work directory), and may be shared by concurrent jobs: each buffer holds a lock on its own journal file, and adopts
+    the journal files left behind by buffers whose process has exited, loading their actions.
+    """
+
+    def __init__(self, es, /, logger=None, max_actions=DEFAULT_MAX_ACTIONS,
+                 max_interval_seconds=DEFAULT_MAX_INTERVAL_SECONDS, max_retries=DEFAULT_MAX_RETRIES,
+                 journal_dir=None):
+        """
+        :param es: the low-level `elasticsearch.Elasticsearch` client.
+        :param logger: optional logger.
+        :param max_actions: the number of buffered actions that triggers a flush.
+        :param max_interval_seconds: the number of seconds since the last flush that triggers a flush.
+        :param max_retries: the number of times actions rejected with 429 (Too Many Requests) are retried.
+        :param journal_dir: optional directory of the journal files of unsent batches.
+        """
+        self.es = es
+        self.logger = logger
+        self.max_actions = max_actions
+        self.max_interval_seconds = max_interval_seconds
+        self.max_retries = max_retries
+        self.journal_dir = Path(journal_dir) if journal_dir else None
+
+        self.actions: list[dict] = []
+        self.failures: list[dict] = []
+        self._last_flush_time = time.monotonic()
+        self._journal_fp = None
+        self._adopted_journal_fps = []
+        self._num_journaled = 0  # the number of leading actions already written to a journal
+
+        if self.journal_dir:
+            self._open_journal()
+
+    def add(self, action: dict) -> list[dict]:
+        """Buffers a bulk action, flushing the buffer if it is full or stale. Returns any per-document failures."""
+        self.actions.append(action)
+
+        if len(self.actions) >= self.max_actions \
+                or time.monotonic() - self._last_flush_time >= self.max_interval_seconds:
+            return self.flush()
+        return []
+
+    def flush(self) -> list[dict]:
+        """Sends all buffered actions in a single `_bulk` request. Returns any per-document failures."""
+        self._last_flush_time = time.monotonic()
+        if not self.actions:
+            return []
+
+        if self.journal_dir:
+            self._append_to_journal(self.actions[self._num_journaled:])
+            self._num_journaled = len(self.actions)
+
+        actions, self.actions = self.actions, []
+        try:
+            num_succeeded, errors = bulk(self.es, actions, stats_only=False, raise_on_error=False,
+                                         raise_on_exception=True, max_retries=self.max_retries)
+        except Exception:
+            # keep the actions (and the journal) for a later flush
+            self.actions = actions + self.actions
+            raise
+
+        if self.journal_dir:
+            self._clear_journals()
+
+        if self.logger:
+            self.logger.info(f"Bulk request complete. {num_succeeded=}, num_failed={len(errors)}")
+            for error in errors:
+                self.logger.error(f"Bulk action failed: {error}")
+
+        self.failures.extend(errors)
+        return errors
+
+    def _open_journal(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+
+        # adopt the journals of exited processes, whose locks were released
+        for journal_path in sorted(self.journal_dir.glob("*.jsonl")):
+            fp = journal_path.open("r+")
+            try:
+                fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fp.close()  # the journal of a running process
+                continue
+            actions = [json.loads(line) for line in fp if line.endswith("\n")]  # skip a torn last line
+            self.actions.extend(actions)
+            self._adopted_journal_fps.append(fp)
+            if actions and self.logger:
+                self.logger.warning(f"Loaded {len(actions)} unflushed bulk action(s) from journal. {journal_path=!s}")
+        self._num_journaled = len(self.actions)
+
+        # the journal is locked before it is given its name, so that it is never adopted by another process
+        journal_name = str(uuid.uuid4())
+        self._journal_fp = (self.journal_dir / f".{journal_name}.tmp").open("a+")
+        fcntl.flock(self._journal_fp, fcntl.LOCK_EX)
+        os.replace(self._journal_fp.name, self.journal_dir / f"{journal_name}.jsonl")
+
+    def _append_to_journal(self, actions: list[dict]):
+        if not actions:
+            return
+        self._journal_fp.write("".join(json.dumps(action, default=_to_json_default) + "\n" for action in actions))
+        self._journal_fp.flush()
+        os.fsync(self._journal_fp.fileno())
+
+    def _clear_journals(self):
+        self._journal_fp.truncate(0)
+        self._num_journaled = 0
+
+        for fp in self._adopted_journal_fps:
+            Path(fp.name).unlink(missing_ok=True)
+            fp.close()
+        self._adopted_journal_fps = []
+
+
+def _to_json_default(o):
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, UUID):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
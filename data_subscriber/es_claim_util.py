@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from elasticsearch.helpers import bulk
+
+CLAIM_JOB_ID_FIELD = "download_claim_job_id"
+CLAIM_EXPIRY_FIELD = "download_claim_expiry_datetime"
+
+DEFAULT_CLAIM_SIZE = 100
+"""Default number of hits claimed at a time"""
+
+DEFAULT_LEASE_SECONDS = 2 * 60 * 60
+"""Default number of seconds a claim is held for, after which the claimed documents may be claimed by another job"""
+
+
+def to_claimable_query(now: datetime) -> dict:
+    """Returns a query matching documents that aren't claimed, or whose claim has expired."""
+    return {"bool": {"should": [{"bool": {"must_not": [{"exists": {"field": CLAIM_EXPIRY_FIELD}}]}},
+                                {"range": {CLAIM_EXPIRY_FIELD: {"lt": now.isoformat()}}}],
+                     "minimum_should_match": 1}}
+
+
+def claim_all(es, hits: Iterable[dict], job_id: str, /, logger=None, claim_size=DEFAULT_CLAIM_SIZE,
+              lease_seconds=DEFAULT_LEASE_SECONDS, group_key: Optional[Callable[[dict], Any]] = None) -> Iterator[dict]:
+    """
+    Lazily claims the given search hits for a job, one slice of `claim_size` hits at a time, yielding the hits that
+    were claimed. The next slice is only claimed once the previous one has been consumed, so concurrent jobs share the
+    pending documents between them, rather than the first job claiming all of them.
+
+    Each slice is claimed through the `_bulk` endpoint, with one conditional (`if_seq_no` / `if_primary_term`) update
+    per document, recording the job ID and the lease expiry. The update of a document that was changed since it was
+    searched (e.g. claimed by another job) fails with a version conflict, and its hit is skipped. Expired claims may be
+    claimed again by matching `to_claimable_query`.
+
+    :param es: the low-level `elasticsearch.Elasticsearch` client.
+    :param hits: search hits, including their `_seq_no` and `_primary_term` (i.e. searched with `seq_no_primary_term`).
+    :param job_id: the ID of the claiming job.
+    :param logger: optional logger.
+    :param claim_size: the number of hits claimed at a time.
+    :param lease_seconds: the number of seconds the claim is held for.
+    :param group_key: optional function of a hit, returning the key of its group. Hits of a group are claimed all or
+                      nothing, and are yielded consecutively. Slices are only split between groups, so the hits must be
+                      ordered by group (e.g. sorted by the group key), otherwise a group is claimed in pieces.
+    """
+    group_key = group_key or (lambda hit: hit["_id"])
+
+    claim_slice = []
+    for hit in hits:
+        if len(claim_slice) >= claim_size and group_key(hit) != group_key(claim_slice[-1]):
+            yield from _claim_slice(es, claim_slice, job_id, logger, lease_seconds, group_key)
+            claim_slice = []
+        claim_slice.append(hit)
+    yield from _claim_slice(es, claim_slice, job_id, logger, lease_seconds, group_key)
+
+
+def _claim_slice(es, hits: list[dict], job_id, logger, lease_seconds, group_key) -> list[dict]:
+    if not hits:
+        return []
+
+    claim_doc = {CLAIM_JOB_ID_FIELD: job_id,
+                 CLAIM_EXPIRY_FIELD: (datetime.now() + timedelta(seconds=lease_seconds)).isoformat()}
+    _, errors = bulk(es, [{"_op_type": "update", "_index": hit["_index"], "_id": hit["_id"],
+                           "if_seq_no": hit["_seq_no"], "if_primary_term": hit["_primary_term"],
+                           "doc": claim_doc}
+                          for hit in hits],
+                     stats_only=False, raise_on_error=False, raise_on_exception=True)
+
+    unclaimed_ids = {error["update"]["_id"] for error in errors}
+    for error in errors:
+        if error["update"]["status"] != 409 and logger:
+            logger.warning(f"Failed to claim document. {error=}")
+
+    claimed_hits, released_hits = [], []
+    for _, group in groupby(sorted(hits, key=_first_seen_order(hits, group_key)), key=group_key):
+        group = list(group)
+        if any(hit["_id"] in unclaimed_ids for hit in group):
+            # another job holds part of the group. Release the rest of it, rather than processing a partial group
+            released_hits += [hit for hit in group if hit["_id"] not in unclaimed_ids]
+        else:
+            claimed_hits += group
+
+    if released_hits:
+        _release(es, released_hits)
+
+    if logger:
+        logger.info(f"Claimed documents. {job_id=}, {len(hits)=}, {len(claimed_hits)=}, {len(released_hits)=}")
+    return claimed_hits
+
+
+def _release(es, hits: list[dict]):
+    # the claims were just made by this job, so no other job may have changed the documents since
+    bulk(es, [{"_op_type": "update", "_index": hit["_index"], "_id": hit["_id"],
+               "doc": {CLAIM_JOB_ID_FIELD: None, CLAIM_EXPIRY_FIELD: None}}
+              for hit in hits],
+         raise_on_error=False, raise_on_exception=True)
+
+
+def _first_seen_order(hits: list[dict], group_key) -> Callable[[dict], int]:
+    """Returns a sort key that brings the hits of a group together, in the order the groups were first seen."""
+    group_orders = {}
+    for hit in hits:
+        group_orders.setdefault(group_key(hit), len(group_orders))
+    return lambda hit: group_orders[group_key(hit)]
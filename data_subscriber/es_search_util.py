@@ -0,0 +1,79 @@
+from typing import Iterator
+
+from elasticsearch import NotFoundError
+
+DEFAULT_PAGE_SIZE = 1000
+"""Default number of hits requested per page"""
+
+DEFAULT_KEEP_ALIVE = "5m"
+"""Default time to keep the point in time open between page requests"""
+
+
+def search_all(es, index, body: dict, /, logger=None, page_size=DEFAULT_PAGE_SIZE,
+               keep_alive=DEFAULT_KEEP_ALIVE) -> Iterator[dict]:
+    """
+    Lazily yields every hit of a search, requesting one page at a time.
+
+    Pages are retrieved using `search_after` against a point in time (PIT), so paging is unaffected by the caller
+    updating the documents it has been given (e.g. marking them as downloaded). Memory usage is bounded by the page
+    size, regardless of the total number of hits.
+
+    Callers may take longer than `keep_alive` to process a page (e.g. a page of multi-GB downloads). If the PIT has
+    expired by the time the next page is requested, a new PIT is opened and the search resumes from the sort values of
+    the last hit, skipping hits that were already yielded.
+
+    :param es: the low-level `elasticsearch.Elasticsearch` client.
+    :param index: the index (or indices) to search.
+    :param body: the search request body. Must include a `sort`, to which the PIT adds a unique tiebreaker.
+    :param logger: optional logger.
+    :param page_size: the number of hits to request per page.
+    :param keep_alive: the time to keep the point in time open between page requests.
+    """
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+    try:
+        search_after = None
+        last_sort_prefix, last_sort_prefix_ids = None, set()  # hits sharing the sort values of the last hit
+        while True:
+            page_body = {**body, "size": page_size, "track_total_hits": False,
+                         "pit": {"id": pit_id, "keep_alive": keep_alive}}
+            if search_after:
+                page_body["search_after"] = search_after
+
+            try:
+                response = es.search(body=page_body)
+            except NotFoundError:
+                if not search_after:
+                    raise
+                if logger:
+                    logger.info(f"Point in time expired. Resuming search with a new point in time. {index=}")
+                pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+                # the tiebreaker values of the expired PIT are meaningless, so resume before the first hit with the
+                # same sort values as the last hit
+                search_after = [*last_sort_prefix, -1]
+                continue
+
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            if logger:
+                logger.debug(f"Retrieved page of search results. {index=}, {len(hits)=}")
+
+            for hit in hits:
+                sort_prefix = hit["sort"][:-1]
+                if sort_prefix != last_sort_prefix:
+                    last_sort_prefix, last_sort_prefix_ids = sort_prefix, set()
+                elif hit["_id"] in last_sort_prefix_ids:
+                    continue
+                last_sort_prefix_ids.add(hit["_id"])
+
+                yield hit
+
+            if len(hits) < page_size:
+                return
+            search_after = hits[-1]["sort"]
+    finally:
+        try:
+            es.close_point_in_time(body={"id": pit_id})
+        except Exception as e:
+            # the PIT expires by itself after keep_alive
+            if logger:
+                logger.warning(f"Failed to close point in time. {e}")
@@ -1,5 +1,5 @@
 from data_subscriber.hls.hls_catalog import HLSProductCatalog
 
 
-def get_hls_catalog_connection(logger):
-    return HLSProductCatalog(logger=logger)
+def get_hls_catalog_connection(logger, bulk_journal_dir=None):
+    return HLSProductCatalog(logger=logger, bulk_journal_dir=bulk_journal_dir)
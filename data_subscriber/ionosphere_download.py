@@ -4,8 +4,9 @@ import logging
 import shutil
 import sys
 from collections import namedtuple, defaultdict
-from functools import partial
+from functools import cache, partial
 from pathlib import Path, PurePath
+from typing import Optional
 
 import backoff
 import boto3
@@ -18,8 +19,10 @@ from mypy_boto3_s3 import S3Client
 from tools import stage_ionosphere_file
 from tools.stage_ionosphere_file import IonosphereFileNotFoundException
 from util import grq_client as grq_client, job_util
+from util.conf_util import SettingsConf
 from util.exec_util import exec_wrapper
 from util.grq_client import try_update_slc_dataset_with_ionosphere_metadata
+from util.ionosphere_cache_util import IonosphereFileCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -80,6 +83,9 @@ async def run(argv: list[str]):
     downloads_dir = Path("downloads")  # house all file downloads
     downloads_dir.mkdir(exist_ok=True)
 
+    ionosphere_file_cache = get_ionosphere_file_cache(SettingsConf().cfg)
+    ionosphere_files_by_date = {}
+
     for i, slc_dataset in enumerate(slc_datasets, start=1):
         product_id = slc_dataset["_id"]
         logger.info(f"Processing {product_id=}. {i} of {len(slc_datasets)} products")
@@ -101,11 +107,12 @@ async def run(argv: list[str]):
 
                 logger.info("Downloading ionosphere correction file")
                 try:
-                    output_ionosphere_filepath = download_ionosphere_correction_file(dataset_dir, product_id)
+                    output_ionosphere_filepath, ionosphere_url = _download_ionosphere_correction_file_once_per_date(
+                        ionosphere_files_by_date, downloads_dir, product_id, ionosphere_file_cache
+                    )
                 except IonosphereFileNotFoundException:
                     logger.info("Couldn't find an ionosphere correction file. Skipping to next SLC dataset.")
                     continue
-                ionosphere_url = get_ionosphere_correction_file_url(dataset_dir, product_id)
                 logger.info(f"{output_ionosphere_filepath=}")
                 logger.info(f"{ionosphere_url=}")
 
@@ -152,6 +159,36 @@ async def run(argv: list[str]):
     return results
 
 
+def _download_ionosphere_correction_file_once_per_date(ionosphere_files_by_date: dict, downloads_dir: Path,
+                                                      product_id: str, ionosphere_file_cache=None):
+    """
+    Downloads the ionosphere correction file of an SLC product, unless it was already downloaded for another product
+    acquired on the same date. The correction file only depends on the date, so each date's file is downloaded once.
+
+    :param ionosphere_files_by_date: the (path, URL) of the file downloaded for each date so far, or None if none could
+                                     be found. Updated in place.
+    :return: the path and URL of the ionosphere correction file.
+    """
+    safe_start_date = stage_ionosphere_file.parse_start_date_from_safe(product_id)
+    if safe_start_date not in ionosphere_files_by_date:
+        date_dir = downloads_dir / "ionosphere" / safe_start_date
+        date_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            ionosphere_files_by_date[safe_start_date] = (
+                Path(download_ionosphere_correction_file(date_dir, product_id, ionosphere_file_cache)),
+                get_ionosphere_correction_file_url(date_dir, product_id)
+            )
+        except IonosphereFileNotFoundException:
+            ionosphere_files_by_date[safe_start_date] = None
+            raise
+    elif ionosphere_files_by_date[safe_start_date] is None:
+        raise IonosphereFileNotFoundException(f"No ionosphere correction file was found for {safe_start_date=}")
+    else:
+        logger.info(f"Using ionosphere correction file already downloaded for {safe_start_date=}")
+
+    return ionosphere_files_by_date[safe_start_date]
+
+
 def generate_ionosphere_metadata(output_ionosphere_filepath, ionosphere_url, s3_bucket, s3_key):
     ionosphere_metadata = {
         "ionosphere": {
@@ -306,8 +343,19 @@ def get_arg_timerange(args):
     return download_timerange
 
 
+def get_ionosphere_file_cache(settings_cfg: dict) -> Optional[IonosphereFileCache]:
+    """Returns the ionosphere file cache configured by IONOSPHERE_CACHE_DIR (and IONOSPHERE_CACHE_S3_URL), if any."""
+    return _get_ionosphere_file_cache(settings_cfg.get("IONOSPHERE_CACHE_DIR"),
+                                      settings_cfg.get("IONOSPHERE_CACHE_S3_URL"))
+
+
+@cache
+def _get_ionosphere_file_cache(cache_dir: Optional[str], s3_url: Optional[str]) -> Optional[IonosphereFileCache]:
+    return IonosphereFileCache(cache_dir, s3_url) if cache_dir else None
+
+
 @backoff.on_exception(backoff.expo, exception=Exception, max_tries=3, jitter=None, giveup=lambda e: isinstance(e, IonosphereFileNotFoundException))
-def download_ionosphere_correction_file(dataset_dir, product_filepath):
+def download_ionosphere_correction_file(dataset_dir, product_filepath, ionosphere_file_cache: IonosphereFileCache = None):
     logger.info("Downloading associated Ionosphere Correction file")
     try:
         stage_ionosphere_file_args = stage_ionosphere_file.get_parser().parse_args(
@@ -317,7 +365,7 @@ def download_ionosphere_correction_file(dataset_dir, product_filepath):
                 str(product_filepath)
             ]
         )
-        output_ionosphere_file_path = stage_ionosphere_file.main(stage_ionosphere_file_args)
+        output_ionosphere_file_path = _stage_ionosphere_file(stage_ionosphere_file_args, ionosphere_file_cache)
         logger.info("Added JPLG Ionosphere correction file to dataset")
     except IonosphereFileNotFoundException:
         logger.warning("JPLG file type could not be found, querying for JPRG file type")
@@ -329,7 +377,7 @@ def download_ionosphere_correction_file(dataset_dir, product_filepath):
                     str(product_filepath)
                 ]
             )
-            output_ionosphere_file_path = stage_ionosphere_file.main(stage_ionosphere_file_args)
+            output_ionosphere_file_path = _stage_ionosphere_file(stage_ionosphere_file_args, ionosphere_file_cache)
             logger.info("Added JPRG Ionosphere correction file to dataset")
         except IonosphereFileNotFoundException:
             logger.warning(f"Could not find any Ionosphere Correction file for product {product_filepath}")
@@ -338,6 +386,20 @@ def download_ionosphere_correction_file(dataset_dir, product_filepath):
     return PurePath(output_ionosphere_file_path)
 
 
+def _stage_ionosphere_file(stage_ionosphere_file_args, ionosphere_file_cache: IonosphereFileCache = None) -> str:
+    if not ionosphere_file_cache:
+        return stage_ionosphere_file.main(stage_ionosphere_file_args)
+
+    def fill(output_dir: Path):
+        return stage_ionosphere_file.main(
+            argparse.Namespace(**{**vars(stage_ionosphere_file_args), "output_directory": str(output_dir)})
+        )
+
+    archive_name, _ = stage_ionosphere_file.get_ionosphere_archive_url(stage_ionosphere_file_args)
+    cached_ionosphere_file_path = ionosphere_file_cache.get_or_fill(PurePath(archive_name).stem, fill)
+    return shutil.copy(cached_ionosphere_file_path, stage_ionosphere_file_args.output_directory)
+
+
 @backoff.on_exception(backoff.expo, exception=Exception, max_tries=3, jitter=None, giveup=lambda e: isinstance(e, IonosphereFileNotFoundException))
 def get_ionosphere_correction_file_url(dataset_dir, product_filepath):
     logger.info("Downloading associated Ionosphere Correction file")
@@ -1,20 +1,26 @@
 import asyncio
+import itertools
 import logging
 import re
 import uuid
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import closing
 from datetime import datetime, timedelta
-from functools import partial
+from functools import partial, cache
+from typing import Iterable, Iterator
 
 import dateutil.parser
-import requests
 from hysds_commons.job_utils import submit_mozart_job
 from more_itertools import map_reduce, chunked
 
 from data_subscriber.hls_spatial.hls_spatial_catalog_connection import get_hls_spatial_catalog_connection
+from data_subscriber.query_watermark.query_watermark_catalog_connection import get_query_watermark_catalog_connection
 from data_subscriber.slc_spatial.slc_spatial_catalog_connection import get_slc_spatial_catalog_connection
 from data_subscriber.url import _hls_url_to_granule_id, _slc_url_to_chunk_id
-from geo.geo_util import does_bbox_intersect_north_america
+from geo.geo_util import do_bboxes_intersect_north_america
+from util.cmr_cache_util import CmrResponseCache
+from util.http_util import get_session
 
 DateTimeRange = namedtuple("DateTimeRange", ["start_date", "end_date"])
 PRODUCT_PROVIDER_MAP = {"HLSL30": "LPCLOUD",
@@ -22,56 +28,102 @@ PRODUCT_PROVIDER_MAP = {"HLSL30": "LPCLOUD",
                         "SENTINEL-1A_SLC": "ASF",
                         "SENTINEL-1B_SLC": "ASF"}
 
+CMR_PAGE_SIZE = 2000  # default is 10, max is 2000
+DEFAULT_MAX_QUERY_CONCURRENCY = 4  # CMR recommends 2-5 concurrent clients
+DEFAULT_WATERMARK_OVERLAP_MINUTES = 10  # allows for CMR ingest latency between consecutive queries
+
 
 async def run_query(args, token, es_conn, cmr, job_id, settings):
     query_dt = datetime.now()
     now = datetime.utcnow()
-    query_timerange: DateTimeRange = get_query_timerange(args, now)
 
+    watermark_conn = None
+    watermark = None
+    if _is_using_watermark(args):
+        watermark_conn = get_query_watermark_catalog_connection(logging.getLogger(__name__))
+        watermark = watermark_conn.get_watermark(_get_watermark_id(args))
+        logging.info(f"{watermark=}")
+
+    query_timerange: DateTimeRange = get_query_timerange(args, now, watermark=watermark)
+
+    results = await _run_query(args, token, es_conn, cmr, job_id, settings, query_dt, now, query_timerange)
+
+    # only advance the watermark once everything up to it has been cataloged and scheduled.
+    #  failures raise above, leaving the watermark in place for the next query to retry the same window
+    if watermark_conn:
+        if results and results["fail"]:
+            logging.warning(f"Failed to submit {len(results['fail'])} download job(s). Not advancing watermark.")
+        else:
+            watermark_conn.set_watermark(_get_watermark_id(args), query_timerange.end_date, job_id)
+
+    return results
+
+
+async def _run_query(args, token, es_conn, cmr, job_id, settings, query_dt: datetime, now: datetime,
+                     query_timerange: DateTimeRange):
     granules = query_cmr(args, token, cmr, settings, query_timerange, now)
 
     if args.smoke_run:
         logging.info(f"{args.smoke_run=}. Restricting to 1 granule(s).")
-        granules = granules[:1]
+        # close the query once the granule is read, cancelling any outstanding CMR requests
+        with closing(granules) as all_granules:
+            granules = list(itertools.islice(all_granules, 1))
+
+    if PRODUCT_PROVIDER_MAP[args.collection] == "LPCLOUD":
+        spatial_catalog_conn = get_hls_spatial_catalog_connection(logging.getLogger(__name__))
+    elif PRODUCT_PROVIDER_MAP[args.collection] == "ASF":
+        spatial_catalog_conn = get_slc_spatial_catalog_connection(logging.getLogger(__name__))
 
     download_urls: list[str] = []
+    catalog_failures: list[dict] = []
 
-    for granule in granules:
-        additional_fields = {}
+    # catalog granules a page at a time, so that spatial catalog writes can be batched
+    for granules_page in chunked(granules, n=CMR_PAGE_SIZE):
+        cataloged_granules = []
+
+        if args.proc_mode == "historical" or PRODUCT_PROVIDER_MAP[args.collection] == "ASF":
+            granules_in_north_america = do_bboxes_intersect_north_america(
+                [granule["bounding_box"] for granule in granules_page]
+            )
+        else:
+            granules_in_north_america = [None] * len(granules_page)
 
-        additional_fields["processing_mode"] = args.proc_mode
+        for granule, is_granule_in_north_america in zip(granules_page, granules_in_north_america):
+            additional_fields = {}
 
-        # If processing mode is historical,
-        # throw out any granules that do not intersect with North America
-        if args.proc_mode == "historical" and not does_bbox_intersect_north_america(granule["bounding_box"]):
-            logging.info(f"Processing mode is historical and the following granule does not intersect with \
+            additional_fields["processing_mode"] = args.proc_mode
+
+            # If processing mode is historical,
+            # throw out any granules that do not intersect with North America
+            if args.proc_mode == "historical" and not is_granule_in_north_america:
+                logging.info(f"Processing mode is historical and the following granule does not intersect with \
 North America. Skipping processing. %s" % granule.get("granule_id"))
-            continue
+                continue
+
+            if PRODUCT_PROVIDER_MAP[args.collection] == "ASF":
+                if is_granule_in_north_america:
+                    additional_fields["intersects_north_america"] = True
+
+            catalog_failures += update_url_index(
+                es_conn,
+                granule.get("filtered_urls"),
+                granule.get("granule_id"),
+                job_id,
+                query_dt,
+                temporal_extent_beginning_dt=dateutil.parser.isoparse(granule["temporal_extent_beginning_datetime"]),
+                revision_date_dt=dateutil.parser.isoparse(granule["revision_date"]),
+                **additional_fields
+            )
+            cataloged_granules.append(granule)
 
-        if PRODUCT_PROVIDER_MAP[args.collection] == "ASF":
-            if does_bbox_intersect_north_america(granule["bounding_box"]):
-                additional_fields["intersects_north_america"] = True
-
-        update_url_index(
-            es_conn,
-            granule.get("filtered_urls"),
-            granule.get("granule_id"),
-            job_id,
-            query_dt,
-            temporal_extent_beginning_dt=dateutil.parser.isoparse(granule["temporal_extent_beginning_datetime"]),
-            revision_date_dt=dateutil.parser.isoparse(granule["revision_date"]),
-            **additional_fields
-        )
+            if granule.get("filtered_urls"):
+                download_urls.extend(granule.get("filtered_urls"))
 
-        if PRODUCT_PROVIDER_MAP[args.collection] == "LPCLOUD":
-            spatial_catalog_conn = get_hls_spatial_catalog_connection(logging.getLogger(__name__))
-            update_granule_index(spatial_catalog_conn, granule)
-        elif PRODUCT_PROVIDER_MAP[args.collection] == "ASF":
-            spatial_catalog_conn = get_slc_spatial_catalog_connection(logging.getLogger(__name__))
-            update_granule_index(spatial_catalog_conn, granule)
+        catalog_failures += update_granules_index(spatial_catalog_conn, cataloged_granules)
 
-        if granule.get("filtered_urls"):
-            download_urls.extend(granule.get("filtered_urls"))
+    catalog_failures += es_conn.flush_bulk()
+    if catalog_failures:
+        raise Exception(f"Failed to catalog {len(catalog_failures)} document(s). {catalog_failures=}")
 
     if args.subparser_name == "full":
         logging.info(f"{args.subparser_name=}. Skipping download job submission.")
@@ -185,10 +237,18 @@ North America. Skipping processing. %s" % granule.get("granule_id"))
     }
 
 
-def get_query_timerange(args, now: datetime, silent=False):
+def get_query_timerange(args, now: datetime, silent=False, watermark: str = None):
+    """
+    :param watermark: the revision date up to which previous queries fully processed the collection. If given,
+                      the query starts from the watermark (less a small overlap) instead of looking back `--minutes`.
+    """
     now_date = now.strftime("%Y-%m-%dT%H:%M:%SZ")
     now_minus_minutes_date = (now - timedelta(minutes=args.minutes)).strftime(
         "%Y-%m-%dT%H:%M:%SZ") if not args.native_id else "1900-01-01T00:00:00Z"
+    if watermark:
+        overlap = timedelta(minutes=getattr(args, "watermark_overlap_minutes", DEFAULT_WATERMARK_OVERLAP_MINUTES))
+        now_minus_minutes_date = (dateutil.parser.isoparse(watermark).replace(tzinfo=None) - overlap).strftime(
+            "%Y-%m-%dT%H:%M:%SZ")
     start_date = args.start_date if args.start_date else now_minus_minutes_date
     end_date = args.end_date if args.end_date else now_date
 
@@ -198,8 +258,28 @@ def get_query_timerange(args, now: datetime, silent=False):
     return query_timerange
 
 
-def query_cmr(args, token, cmr, settings, timerange: DateTimeRange, now: datetime, silent=False) -> list:
-    page_size = 2000
+def _is_using_watermark(args) -> bool:
+    """Watermarks only apply to complete, rolling revision date queries, i.e. when the time range is relative to now."""
+    if not getattr(args, "use_watermark", False):
+        return False
+
+    if args.start_date or args.end_date or args.native_id or args.use_temporal or args.smoke_run:
+        logging.warning(f"Ignoring watermark. Watermarks are incompatible with the given query arguments. "
+                        f"{args.start_date=}, {args.end_date=}, {args.native_id=}, {args.use_temporal=}, "
+                        f"{args.smoke_run=}")
+        return False
+
+    return True
+
+
+def _get_watermark_id(args) -> str:
+    """Watermarks are kept per bounding box, as a query of one region says nothing about the granules of another."""
+    return f"{args.endpoint}-{args.collection}-{args.proc_mode}-{args.bbox}"
+
+
+def query_cmr(args, token, cmr, settings, timerange: DateTimeRange, now: datetime, silent=False) -> Iterator[dict]:
+    """Queries CMR for granules, yielding each (filtered) granule as its page of search results arrives."""
+    page_size = CMR_PAGE_SIZE
     request_url = f"https://{cmr}/search/granules.umm_json"
     bounding_box = args.bbox
 
@@ -245,24 +325,40 @@ def query_cmr(args, token, cmr, settings, timerange: DateTimeRange, now: datetim
 
     if not silent:
         logging.info(f"{request_url=} {params=}")
-    product_granules, search_after = _request_search(args, request_url, params)
 
-    while search_after:
-        granules, search_after = _request_search(args, request_url, params, search_after=search_after)
-        product_granules.extend(granules)
+    # split the time range into sub-windows and page through each one concurrently. Granules then arrive in no
+    #  particular order, so native ID queries and smoke runs (which keep the first, i.e. newest, granule) aren't split
+    temporal_param = "temporal" if args.use_temporal else "revision_date"
+    max_concurrency = getattr(args, "max_query_concurrency", None) or DEFAULT_MAX_QUERY_CONCURRENCY
+    is_ordered = args.native_id or getattr(args, "smoke_run", False)
+    subranges = [temporal_range] if is_ordered else _get_temporal_subranges(temporal_range, max_concurrency)
+    if not silent:
+        logging.info(f"{len(subranges)=} {max_concurrency=}")
 
-    if args.collection in settings["SHORTNAME_FILTERS"]:
-        product_granules = [granule
-                            for granule in product_granules
-                            if _match_identifier(settings, args, granule)]
+    cmr_response_cache = CmrResponseCache(args.cache_dir) if getattr(args, "cache_dir", None) else None
+    pages = _iter_pages_concurrently(args, request_url, [{**params, temporal_param: subrange} for subrange in subranges],
+                                     max_concurrency, cmr_response_cache=cmr_response_cache)
+    product_granules = _dedupe_granules(itertools.chain.from_iterable(pages))
 
-        if not silent:
-            logging.info(f"Found {str(len(product_granules))} total granules")
+    is_filtered_by_identifier = args.collection in settings["SHORTNAME_FILTERS"]
+    granule_matcher = get_granule_matcher(
+        args.collection,
+        tuple(settings["SHORTNAME_FILTERS"][args.collection]) if is_filtered_by_identifier else None
+    )
+    if is_filtered_by_identifier:
+        product_granules = (granule
+                            for granule in product_granules
+                            if granule_matcher.match_identifier(granule["identifier"]))
 
-    for granule in product_granules:
-        granule["filtered_urls"] = _filter_granules(granule, args)
+    num_granules = 0
+    with closing(pages):  # closing this generator closes the pages too, rather than leaving it to garbage collection
+        for granule in product_granules:
+            granule["filtered_urls"] = granule_matcher.filter_urls(granule.get("related_urls"))
+            num_granules += 1
+            yield granule
 
-    return product_granules
+    if is_filtered_by_identifier and not silent:
+        logging.info(f"Found {str(num_granules)} total granules")
 
 
 def _get_temporal_range(start: str, end: str, now: str):
@@ -279,9 +375,83 @@ def _get_temporal_range(start: str, end: str, now: str):
         return "1900-01-01T00:00:00Z,{}".format(now)
 
 
+def _get_temporal_subranges(temporal_range: str, n: int) -> list[str]:
+    """Splits a CMR "start,end" range string into `n` contiguous sub-ranges, oldest first.
+
+    CMR range bounds are inclusive, so granules on a shared boundary may be returned for both neighbouring sub-ranges.
+    Callers are expected to dedupe the merged results.
+    """
+    start, end = temporal_range.split(",")
+    start_dt = dateutil.parser.isoparse(start)
+    end_dt = dateutil.parser.isoparse(end)
+    if n <= 1 or end_dt <= start_dt:
+        return [temporal_range]
+
+    step = (end_dt - start_dt) / n
+    bounds = [start] + [(start_dt + step * i).strftime("%Y-%m-%dT%H:%M:%SZ") for i in range(1, n)] + [end]
+    subranges = [f"{sub_start},{sub_end}" for sub_start, sub_end in zip(bounds, bounds[1:]) if sub_start != sub_end]
+    return subranges
+
+
+def _iter_pages_concurrently(args, request_url, params_list: list[dict], max_concurrency: int,
+                             cmr_response_cache: CmrResponseCache = None) -> Iterator[list]:
+    """Pages through a CMR search for each of the given params, yielding each page of granules as soon as it arrives,
+    so pages of different searches are yielded in no particular order.
+
+    At most one request per params is in flight at a time, and at most `max_concurrency` requests overall, so only a
+    bounded number of pages is ever held in memory. Abandoning the iterator cancels any outstanding requests.
+
+    If a cache is given, searches are served from the cache where possible, and completed searches are cached.
+    """
+    if cmr_response_cache:
+        uncached_params_list = []
+        for params in params_list:
+            cached_pages = cmr_response_cache.get(cmr_response_cache.to_key(request_url, params))
+            if cached_pages is None:
+                uncached_params_list.append(params)
+            else:
+                yield from cached_pages
+        params_list = uncached_params_list
+
+    cache_writers = [cmr_response_cache.writer(cmr_response_cache.to_key(request_url, params)) for params in params_list] \
+        if cmr_response_cache else []
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    try:
+        in_flight = {executor.submit(_request_search, args, request_url, params): i for i, params in enumerate(params_list)}
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = in_flight.pop(future)
+                granules, search_after = future.result()
+                if cache_writers:
+                    cache_writers[i].append(granules)
+                if search_after:
+                    in_flight[executor.submit(_request_search, args, request_url, params_list[i], search_after=search_after)] = i
+                elif cache_writers:
+                    cache_writers[i].commit()
+                    cache_writers[i] = None
+                yield granules
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for cache_writer in cache_writers:
+            if cache_writer:
+                cache_writer.abort()
+
+
+def _dedupe_granules(granules: Iterable[dict]) -> Iterator[dict]:
+    """Removes duplicate granules by GranuleUR, preserving the order of first occurrence."""
+    seen_granule_ids = set()
+    for granule in granules:
+        if granule["granule_id"] in seen_granule_ids:
+            continue
+        seen_granule_ids.add(granule["granule_id"])
+        yield granule
+
+
 def _request_search(args, request_url, params, search_after=None):
-    response = requests.get(request_url, params=params, headers={"CMR-Search-After": search_after}) \
-        if search_after else requests.get(request_url, params=params)
+    session = get_session()
+    response = session.get(request_url, params=params, headers={"CMR-Search-After": search_after}) \
+        if search_after else session.get(request_url, params=params)
 
     results = response.json()
     items = results.get("items")
@@ -319,31 +489,77 @@ def _request_search(args, request_url, params, search_after=None):
         return [], None
 
 
-def _filter_granules(granule, args):
-    collection_map = {"HLSL30": ["B02", "B03", "B04", "B05", "B06", "B07", "Fmask"],
-                      "HLSS30": ["B02", "B03", "B04", "B8A", "B11", "B12", "Fmask"],
-                      "SENTINEL-1A_SLC": ["IW"],
-                      "SENTINEL-1B_SLC": ["IW"],
-                      "DEFAULT": ["tif"]}
-    filter_extension = "DEFAULT"
+COLLECTION_BAND_MAP = {"HLSL30": ["B02", "B03", "B04", "B05", "B06", "B07", "Fmask"],
+                       "HLSS30": ["B02", "B03", "B04", "B8A", "B11", "B12", "Fmask"],
+                       "SENTINEL-1A_SLC": ["IW"],
+                       "SENTINEL-1B_SLC": ["IW"],
+                       "DEFAULT": ["tif"]}
+"""The substrings that select the URLs (e.g. bands) of a granule to download, by collection"""
+
+BAND_SUFFIX_COLLECTIONS = {"HLSL30", "HLSS30"}
+"""Collections whose file names end with the band, e.g. HLS.S30.T10SEG.2023001T184711.v2.0.B02.tif"""
+
+
+class GranuleMatcher:
+    """
+    Precompiled granule filters for a collection.
+
+    The collection's SHORTNAME_FILTERS patterns are compiled into a single alternation, so each granule identifier
+    is matched once rather than once per pattern. For collections whose file names end with the band, the band is
+    sliced off the end of each URL and looked up in a set, rather than searching each URL for each band.
+    """
+
+    def __init__(self, collection: str, shortname_filters: Iterable[str] = None):
+        """
+        :param collection: the collection shortname.
+        :param shortname_filters: regex patterns, one of which the start of a granule identifier must match.
+                                  None if granules are not filtered by identifier.
+        """
+        band_key = next((key for key in COLLECTION_BAND_MAP if key in collection), "DEFAULT")
+        self.bands = tuple(COLLECTION_BAND_MAP[band_key])
+        self._is_band_suffix = band_key in BAND_SUFFIX_COLLECTIONS
+        self._band_set = frozenset(self.bands)
+
+        if shortname_filters is None:
+            self._identifier_regex = None
+        else:
+            # an empty alternation would match everything. (?!) matches nothing, like an empty list of filters
+            self._identifier_regex = re.compile("|".join(f"(?:{pattern})" for pattern in shortname_filters) or "(?!)")
+
+    def match_identifier(self, identifier: str) -> bool:
+        """Returns True if the identifier matches any of the SHORTNAME_FILTERS patterns (or if there are none)."""
+        if self._identifier_regex is None:
+            return True
+        return self._identifier_regex.match(identifier) is not None
 
-    for collection in collection_map:
-        if collection in args.collection:
-            filter_extension = collection
-            break
+    def filter_urls(self, urls: Iterable[str]) -> list[str]:
+        """Returns the URLs of the collection's bands, in order."""
+        if self._is_band_suffix:
+            return [url for url in urls if self._to_band(url) in self._band_set]
 
-    return [f
-            for f in granule.get("related_urls")
-            for extension in collection_map.get(filter_extension)
-            if extension in f]
+        bands = self.bands
+        return [url for url in urls if any(band in url for band in bands)]
 
+    @staticmethod
+    def _to_band(url: str) -> str:
+        """Returns the second to last "."-delimited component of the URL, i.e. the band of a band file URL."""
+        extension_idx = url.rfind(".")
+        return url[url.rfind(".", 0, extension_idx) + 1:extension_idx]
 
-def _match_identifier(settings, args, granule) -> bool:
-    for filter in settings["SHORTNAME_FILTERS"][args.collection]:
-        if re.match(filter, granule["identifier"]):
-            return True
 
-    return False
+@cache
+def get_granule_matcher(collection: str, shortname_filters: tuple[str, ...] = None) -> GranuleMatcher:
+    """Returns the (cached) matcher for the collection, so patterns are compiled once per run rather than per granule."""
+    return GranuleMatcher(collection, shortname_filters)
+
+
+def _filter_granules(granule, args):
+    return get_granule_matcher(args.collection).filter_urls(granule.get("related_urls"))
+
+
+def _match_identifier(settings, args, granule) -> bool:
+    return get_granule_matcher(args.collection, tuple(settings["SHORTNAME_FILTERS"][args.collection])) \
+        .match_identifier(granule["identifier"])
 
 
 def submit_download_job(*, release_version=None, provider="LPCLOUD", params: list[dict[str, str]],
@@ -389,11 +605,27 @@ def update_url_index(
         revision_date_dt: datetime,
         *args,
         **kwargs
-):
+) -> list[dict]:
+    """
+    Buffers catalog upserts for the given URLs. The caller must call `es_conn.flush_bulk()` once all URLs are processed.
+
+    :return: per-document failures of any bulk requests sent while buffering.
+    """
+    failures = []
     for url in urls:
-        es_conn.process_url(url, granule_id, job_id, query_dt, temporal_extent_beginning_dt, revision_date_dt, *args,
-                            **kwargs)
+        failures += es_conn.bulk_process_url(url, granule_id, job_id, query_dt, temporal_extent_beginning_dt,
+                                             revision_date_dt, *args, **kwargs)
+    return failures
 
 
 def update_granule_index(es_spatial_conn, granule, *args, **kwargs):
     es_spatial_conn.process_granule(granule, *args, **kwargs)
+
+
+def update_granules_index(es_spatial_conn, granules: list[dict]) -> list[dict]:
+    """
+    Catalogs the given granules in a single bulk request. Granules that are already cataloged are left untouched.
+
+    :return: per-document failures of the bulk request.
+    """
+    return es_spatial_conn.process_granules(granules)
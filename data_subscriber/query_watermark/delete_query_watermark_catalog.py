@@ -0,0 +1,10 @@
+import logging
+
+from data_subscriber.query_watermark.query_watermark_catalog_connection import get_query_watermark_catalog_connection
+
+logging.basicConfig(level=logging.INFO)  # Set up logging
+LOGGER = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    data_subscriber_catalog = get_query_watermark_catalog_connection(LOGGER)
+    data_subscriber_catalog.delete_index()
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+from data_subscriber import es_conn_util
+
+ES_INDEX = "query_watermark_catalog"
+
+
+class QueryWatermarkCatalog:
+    """
+    Class to track the query watermarks of daac_data_subscriber.py
+
+    A watermark is the revision date up to which a query job has fully processed a collection. Subsequent query jobs
+    resume from the watermark rather than from a fixed lookback.
+
+    https://github.com/hysds/hysds_commons/blob/develop/hysds_commons/elasticsearch_utils.py
+    ElasticsearchUtility methods
+        index_document
+        get_by_id
+        query
+        search
+        get_count
+        delete_by_id
+        update_document
+    """
+    def __init__(self, /, logger=None):
+        self.logger = logger
+        self.es = es_conn_util.get_es_connection(logger)
+
+    def create_index(self):
+        self.es.es.indices.create(body={"settings": {},
+                                     "mappings": {
+                                         "properties": {
+                                             "watermark_id": {"type": "keyword"},
+                                             "revision_date": {"type": "date"},
+                                             "query_job_id": {"type": "keyword"},
+                                             "last_update": {"type": "date"}}}},
+                               index=ES_INDEX)
+        if self.logger:
+            self.logger.info("Successfully created index: {}".format(ES_INDEX))
+
+    def delete_index(self):
+        self.es.es.indices.delete(index=ES_INDEX, ignore=404)
+        if self.logger:
+            self.logger.info("Successfully deleted index: {}".format(ES_INDEX))
+
+    def get_watermark(self, watermark_id):
+        """Returns the watermark as a "%Y-%m-%dT%H:%M:%SZ" date string, or None if there is no watermark yet."""
+        try:
+            result = self.es.get_by_id(index=ES_INDEX, id=watermark_id)
+            if self.logger:
+                self.logger.debug(f"Query result: {result}")
+        except:
+            if self.logger:
+                self.logger.info(f"{watermark_id} does not exist in {ES_INDEX}")
+            return None
+
+        return result["_source"]["revision_date"]
+
+    def set_watermark(self, watermark_id, revision_date, job_id):
+        """
+        Advances the watermark to the given "%Y-%m-%dT%H:%M:%SZ" date string. The watermark never moves backwards, so
+        a slow job that completes after a newer one cannot rewind it.
+        """
+        doc = {
+            "watermark_id": watermark_id,
+            "revision_date": revision_date,
+            "query_job_id": job_id,
+            "last_update": datetime.now()
+        }
+        result = self.es.update_document(
+            id=watermark_id,
+            body={
+                "script": {
+                    "source": "if (ctx._source.revision_date == null "
+                              "|| ctx._source.revision_date.compareTo(params.doc.revision_date) < 0) "
+                              "{ ctx._source.putAll(params.doc) } else { ctx.op = 'noop' }",
+                    "params": {"doc": {**doc, "last_update": doc["last_update"].isoformat()}}
+                },
+                "upsert": doc
+            },
+            index=ES_INDEX
+        )
+
+        if self.logger:
+            self.logger.info(f"Document updated: {result}")
@@ -0,0 +1,5 @@
+from data_subscriber.query_watermark.query_watermark_catalog import QueryWatermarkCatalog
+
+
+def get_query_watermark_catalog_connection(logger):
+    return QueryWatermarkCatalog(logger=logger)
@@ -1,10 +1,17 @@
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
 
 from data_subscriber import es_conn_util
+from data_subscriber import es_claim_util
+from data_subscriber.es_bulk_util import BulkActionBuffer
+from data_subscriber.es_search_util import search_all
 
 ES_INDEX = "slc_catalog"
 
+PENDING_DOWNLOAD_SOURCE_FIELDS = ["s3_url", "https_url", "processing_mode", "intersects_north_america"]
+"""Fields of pending downloads needed by the download job"""
+
 
 class SLCProductCatalog:
     """
@@ -20,9 +27,15 @@ class SLCProductCatalog:
         delete_by_id
         update_document
     """
-    def __init__(self, /, logger=None):
+    def __init__(self, /, logger=None, bulk_journal_dir=None):
+        """
+        :param logger: optional logger.
+        :param bulk_journal_dir: optional directory of the journal of buffered bulk actions. See `BulkActionBuffer`.
+        """
         self.logger = logger
         self.es = es_conn_util.get_es_connection(logger)
+        self.bulk_journal_dir = bulk_journal_dir
+        self._bulk_buffer = None
 
     def create_index(self, index=ES_INDEX, delete_old_index=False):
         if delete_old_index is True:
@@ -38,6 +51,8 @@ class SLCProductCatalog:
                                              "https_url": {"type": "keyword"},
                                              "creation_timestamp": {"type": "date"},
                                              "download_datetime": {"type": "date"},
+                                             "download_claim_job_id": {"type": "keyword"},
+                                             "download_claim_expiry_datetime": {"type": "date"},
                                              "downloaded": {"type": "boolean"}}}},
                                index=ES_INDEX)
         if self.logger:
@@ -48,10 +63,42 @@ class SLCProductCatalog:
         if self.logger:
             self.logger.info("Successfully deleted index: {}".format(ES_INDEX))
 
-    def get_all_between(self, start_dt: datetime, end_dt: datetime, use_temporal: bool):
-        undownloaded = self._query_undownloaded(start_dt, end_dt, use_temporal)
+    def get_all_between(self, start_dt: datetime, end_dt: datetime, use_temporal: bool) -> Iterator[dict]:
+        """
+        Lazily yields the URL fields of the products pending download (i.e. not yet marked as downloaded) within the
+        given time range, ordered by creation time. Pages are requested as the generator is consumed.
+        """
+        for result in self._query_undownloaded(start_dt, end_dt, use_temporal):
+            yield result["_source"]
+
+    def claim_all_between(
+            self,
+            start_dt: datetime,
+            end_dt: datetime,
+            use_temporal: bool,
+            job_id: str,
+            /,
+            predicate: Optional[Callable[[dict], bool]] = None,
+            group_key: Optional[Callable[[dict], Any]] = None,
+            claim_size=es_claim_util.DEFAULT_CLAIM_SIZE,
+            lease_seconds=es_claim_util.DEFAULT_LEASE_SECONDS
+    ) -> Iterator[dict]:
+        """
+        Like `get_all_between`, but only yields the products that the given job managed to claim, skipping products
+        claimed by other (concurrent) download jobs whose claim hasn't expired. Products are claimed a slice at a time,
+        as the generator is consumed. See `es_claim_util.claim_all`.
+
+        :param predicate: optional filter of the products to claim.
+        :param group_key: optional function returning the group of a product. Groups are claimed all or nothing.
+        """
+        results = self._query_undownloaded(start_dt, end_dt, use_temporal, claimable=True)
+        if predicate:
+            results = (result for result in results if predicate(result["_source"]))
 
-        return [result['_source'] for result in (undownloaded or [])]
+        for result in es_claim_util.claim_all(
+                self.es.es, results, job_id, logger=self.logger, claim_size=claim_size, lease_seconds=lease_seconds,
+                group_key=(lambda result: group_key(result["_source"])) if group_key else None):
+            yield result["_source"]
 
     def process_url(
             self,
@@ -63,9 +110,57 @@ class SLCProductCatalog:
             revision_date_dt: datetime,
             *args,
             **kwargs
+    ):
+        filename, doc = self._to_url_doc(url, granule_id, job_id, query_dt, temporal_extent_beginning_dt,
+                                         revision_date_dt, **kwargs)
+
+        self.es.update_document(index=ES_INDEX, body={"doc_as_upsert": True, "doc": doc}, id=filename)
+        return True
+
+    def bulk_process_url(
+            self,
+            url: str,
+            granule_id: str,
+            job_id: str,
+            query_dt: datetime,
+            temporal_extent_beginning_dt: datetime,
+            revision_date_dt: datetime,
+            *args,
+            **kwargs
+    ) -> list[dict]:
+        """
+        Buffers an upsert of the given URL, to be sent through the `_bulk` endpoint once enough upserts are buffered
+        or enough time has passed. Call `flush_bulk()` once all URLs are processed.
+
+        :return: per-document failures of the bulk request, if one was sent.
+        """
+        filename, doc = self._to_url_doc(url, granule_id, job_id, query_dt, temporal_extent_beginning_dt,
+                                         revision_date_dt, **kwargs)
+
+        return self._get_bulk_buffer().add(
+            {"_op_type": "update", "_index": ES_INDEX, "_id": filename, "doc_as_upsert": True, "doc": doc}
+        )
+
+    def flush_bulk(self) -> list[dict]:
+        """Sends all buffered upserts and updates through the `_bulk` endpoint. Returns any per-document failures."""
+        return self._get_bulk_buffer().flush()
+
+    def _get_bulk_buffer(self) -> BulkActionBuffer:
+        if self._bulk_buffer is None:
+            self._bulk_buffer = BulkActionBuffer(self.es.es, logger=self.logger, journal_dir=self.bulk_journal_dir)
+        return self._bulk_buffer
+
+    def _to_url_doc(
+            self,
+            url: str,
+            granule_id: str,
+            job_id: str,
+            query_dt: datetime,
+            temporal_extent_beginning_dt: datetime,
+            revision_date_dt: datetime,
+            **kwargs
     ):
         filename = Path(url).name
-        result = self._query_existence(filename)
         doc = {
             "id": filename,
             "granule_id": granule_id,
@@ -85,8 +180,7 @@ class SLCProductCatalog:
 
         doc.update(kwargs)
 
-        self.es.update_document(index=ES_INDEX, body={"doc_as_upsert": True, "doc": doc}, id=filename)
-        return True
+        return filename, doc
 
     def product_is_downloaded(self, url):
         filename = url.split('/')[-1]
@@ -109,6 +203,26 @@ class SLCProductCatalog:
         if self.logger:
             self.logger.info(f"Document updated: {result}")
 
+    def bulk_mark_product_as_downloaded(self, url, job_id) -> list[dict]:
+        """
+        Buffers marking the given URL as downloaded, to be sent through the `_bulk` endpoint once enough updates are
+        buffered or enough time has passed. Call `flush_bulk()` at batch boundaries, and before exiting.
+
+        :return: per-document failures of the bulk request, if one was sent.
+        """
+        filename = url.split("/")[-1]
+        return self._get_bulk_buffer().add({
+            "_op_type": "update",
+            "_index": ES_INDEX,
+            "_id": filename,
+            "doc_as_upsert": True,
+            "doc": {
+                "downloaded": True,
+                "download_datetime": datetime.now(),
+                "download_job_id": job_id,
+            }
+        })
+
     def _post(self, filename, body):
         result = self.es.index_document(index=ES_INDEX, body=body, id=filename)
 
@@ -128,18 +242,17 @@ class SLCProductCatalog:
 
         return result
 
-    def _query_undownloaded(self, start_dt: datetime, end_dt: datetime, use_temporal: bool, index=ES_INDEX):
+    def _query_undownloaded(self, start_dt: datetime, end_dt: datetime, use_temporal: bool, index=ES_INDEX,
+                            claimable=False):
         range_str = "temporal_extent_beginning_datetime" if use_temporal else "revision_date"
-        try:
-            result = self.es.query(index=index,
-                                body={"sort": [{"creation_timestamp": "asc"}],
-                                      "query": {"bool": {"must": [{"range": {range_str: {
-                                                                      "gte": start_dt.isoformat(),
-                                                                      "lt": end_dt.isoformat()}}}]}}})
-            if self.logger:
-                self.logger.debug(f"Query result: {result}")
+        filters = [{"range": {range_str: {"gte": start_dt.isoformat(), "lt": end_dt.isoformat()}}}]
+        if claimable:
+            filters.append(es_claim_util.to_claimable_query(datetime.now()))
 
-        except:
-            result = None
-
-        return result
+        return search_all(self.es.es, index,
+                          {"sort": [{"creation_timestamp": "asc"}],
+                           "_source": PENDING_DOWNLOAD_SOURCE_FIELDS,
+                           "seq_no_primary_term": claimable,
+                           "query": {"bool": {"filter": filters,
+                                              "must_not": [{"term": {"downloaded": True}}]}}},
+                          logger=self.logger)
@@ -1,5 +1,5 @@
 from data_subscriber.slc.slc_catalog import SLCProductCatalog
 
 
-def get_slc_catalog_connection(logger):
-    return SLCProductCatalog(logger=logger)
+def get_slc_catalog_connection(logger, bulk_journal_dir=None):
+    return SLCProductCatalog(logger=logger, bulk_journal_dir=bulk_journal_dir)
@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from elasticsearch.helpers import bulk
+
 from data_subscriber import es_conn_util
 
 ES_INDEX = "slc_spatial_catalog"
@@ -45,18 +47,42 @@ class SLCSpatialProductCatalog:
         result = self._query_existence(granule["granule_id"])
 
         if not result:
-            doc = {
-                "id": granule['granule_id'],
-                "provider": granule["provider"],
-                "production_datetime": granule["production_datetime"],
-                "short_name": granule["short_name"],
-                "product_id": granule["identifier"],
-                "bounding_box": granule["bounding_box"],
-                "creation_timestamp": datetime.now()
-            }
+            doc = self._to_granule_doc(granule)
 
             self._post(granule['granule_id'], doc)
 
+    def process_granules(self, granules: list[dict]) -> list[dict]:
+        """
+        Indexes the given granules in a single `_bulk` request. Each granule is created only if it does not already
+        exist in the catalog. Version conflicts are treated as "already exists" and are not reported as failures.
+
+        :return: per-document failures of the bulk request.
+        """
+        if not granules:
+            return []
+
+        actions = [{"_op_type": "create", "_index": ES_INDEX, "_id": granule["granule_id"],
+                    "_source": self._to_granule_doc(granule)}
+                   for granule in granules]
+        num_created, errors = bulk(self.es.es, actions, stats_only=False, raise_on_error=False)
+
+        failures = [error for error in errors if error["create"]["status"] != 409]
+        if self.logger:
+            self.logger.info(f"Bulk create complete. {num_created=}, "
+                             f"num_existing={len(errors) - len(failures)}, num_failed={len(failures)}")
+        return failures
+
+    def _to_granule_doc(self, granule):
+        return {
+            "id": granule['granule_id'],
+            "provider": granule["provider"],
+            "production_datetime": granule["production_datetime"],
+            "short_name": granule["short_name"],
+            "product_id": granule["identifier"],
+            "bounding_box": granule["bounding_box"],
+            "creation_timestamp": datetime.now()
+        }
+
     def _post(self, granule_id, body):
         result = self.es.index_document(index=ES_INDEX, body=body, id=granule_id)
 
@@ -7,7 +7,7 @@ _date_format_str = "%Y-%m-%dT%H:%M:%SZ"
 _date_format_str_cmr = _date_format_str[:-1] + ".%fZ"
 @backoff.on_exception(backoff.expo, Exception, max_value=13, max_time=34)
 def _query_cmr_backoff(args, token, cmr, settings, query_timerange, now, silent=True):
-    return query_cmr(args, token, cmr, settings, query_timerange, now, silent)
+    return list(query_cmr(args, token, cmr, settings, query_timerange, now, silent))
 def run_survey(args, token, cmr, settings):
 
     start_dt = datetime.strptime(args.start_date, _date_format_str)
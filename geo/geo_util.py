@@ -1,13 +1,31 @@
+import argparse
+import hashlib
 import json
 import logging
+import mmap
+import os
+import tempfile
 from functools import cache
 from pathlib import Path
 from typing import TypedDict
 
-from osgeo import ogr
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, shape
 
 logger = logging.getLogger(__name__)
 
+NORTH_AMERICA_OPERA_GEOJSON_PATH = Path(__file__).parent / "north_america_opera.geojson"
+"""Path to the North America (OPERA) GeoJSON file"""
+
+NORTH_AMERICA_OPERA_WKB_CACHE_PATH = Path(__file__).parent / "north_america_opera.wkb"
+"""Path to the precompiled WKB cache of North America (OPERA), built from the GeoJSON file"""
+
+_WKB_CACHE_MAGIC = b"NAOPERA1"
+"""Identifies (and versions) the layout of the WKB cache file: magic, SHA-256 of the source GeoJSON, then WKB"""
+
+_WKB_CACHE_HEADER_LEN = len(_WKB_CACHE_MAGIC) + hashlib.sha256().digest_size
+
 
 class Coordinate(TypedDict):
     lat: float
@@ -27,36 +45,149 @@ def does_bbox_intersect_north_america(bbox: list[Coordinate]) -> bool:
     """
     logger.info(f"{bbox=}")
 
-    bbox_ring = ogr.Geometry(ogr.wkbLinearRing)
-    for coordinate in bbox:
-        bbox_ring.AddPoint(coordinate["lon"], coordinate["lat"])
-    bbox_poly = ogr.Geometry(ogr.wkbPolygon)
-    bbox_poly.AddGeometry(bbox_ring)
-
-    na_geom = _load_north_america_opera_geometry_collection()
-
-    is_bbox_in_north_america = na_geom.Intersects(bbox_poly)
+    is_bbox_in_north_america = do_bboxes_intersect_north_america([bbox])[0]
     logger.info(f"{is_bbox_in_north_america=}")
     return is_bbox_in_north_america
 
 
+def do_bboxes_intersect_north_america(bboxes: list[list[Coordinate]]) -> list[bool]:
+    """
+    Check whether each of the given bboxes intersects North America (OPERA). See `does_bbox_intersect_north_america`.
+
+    Bboxes outside the overall extent of North America (OPERA) are rejected by envelope alone. The remainder are
+    matched against the envelopes of the individual North America (OPERA) polygons using a spatial index, and only
+    the candidate pairs are tested for intersection using prepared geometries.
+
+    :param bboxes: a list of bboxes, e.g. the footprints of a page of granules.
+    :return: a list with one entry per bbox. True if that bbox intersects with North America (OPERA). Otherwise False.
+    """
+    if not bboxes:
+        return []
+
+    na_geoms, na_tree, (na_min_x, na_min_y, na_max_x, na_max_y) = _load_north_america_opera_index()
+
+    bbox_polys = np.array([_to_polygon(bbox) for bbox in bboxes], dtype=object)
+    is_bbox_in_north_america = np.zeros(len(bbox_polys), dtype=bool)
+
+    # cheap envelope reject against the overall extent of North America (OPERA)
+    min_x, min_y, max_x, max_y = shapely.bounds(bbox_polys).T
+    candidate_idxs = np.flatnonzero((min_x <= na_max_x) & (max_x >= na_min_x) & (min_y <= na_max_y) & (max_y >= na_min_y))
+    if not candidate_idxs.size:
+        return is_bbox_in_north_america.tolist()
+
+    # pairs of (bbox, North America polygon) with overlapping envelopes
+    bbox_idxs, na_idxs = na_tree.query(bbox_polys[candidate_idxs])
+    intersects = shapely.intersects(na_geoms[na_idxs], bbox_polys[candidate_idxs][bbox_idxs])
+    is_bbox_in_north_america[candidate_idxs[bbox_idxs[intersects]]] = True
+
+    return is_bbox_in_north_america.tolist()
+
+
+def _to_polygon(bbox: list[Coordinate]) -> Polygon:
+    coordinates = [(coordinate["lon"], coordinate["lat"]) for coordinate in bbox or []]
+    # degenerate bboxes (e.g. points or lines) are empty, so never intersect, as with the previous OGR implementation
+    if len(set(coordinates)) < 3:
+        return Polygon()
+    return Polygon(coordinates)
+
+
 @cache
-def _load_north_america_opera_geometry_collection() -> ogr.Geometry:
+def _load_north_america_opera_index() -> tuple[np.ndarray, shapely.STRtree, tuple[float, float, float, float]]:
+    """
+    Loads North America (OPERA) as an array of prepared polygons, a spatial index over those polygons, and the
+    overall bounds (min x, min y, max x, max y) of North America (OPERA).
+    """
+    na_geoms = _load_north_america_opera_geometries()
+    shapely.prepare(na_geoms)
+    na_tree = shapely.STRtree(na_geoms)
+    na_bounds = tuple(shapely.total_bounds(na_geoms))
+
+    logger.info(f"Loaded North America (OPERA) spatial index. {len(na_geoms)=}")
+    return na_geoms, na_tree, na_bounds
+
+
+def _load_north_america_opera_geometries() -> np.ndarray:
+    """
+    Loads North America (OPERA) as an array of polygons. Multi-polygons are split into their individual parts.
+
+    The precompiled WKB cache is used if it is up-to-date with the GeoJSON file. Otherwise, the GeoJSON file is
+    parsed. The cache is read-only at runtime, as the package directory may be. It is built when the container image
+    is built, by running `python -m geo.geo_util`.
+    """
+    na_geoms = _load_north_america_opera_wkb_cache(_hash_north_america_opera_geojson())
+    if na_geoms is not None:
+        return na_geoms
+
+    logger.warning("Falling back to parsing the North America (OPERA) GeoJSON file. "
+                   "Run `python -m geo.geo_util` to build the WKB cache.")
+    return _load_north_america_opera_geojson_geometries()
+
+
+def _load_north_america_opera_geojson_geometries() -> np.ndarray:
     north_america_opera_geojson = _cached_load_north_america_opera_geojson()
 
-    na_geoms = ogr.Geometry(ogr.wkbGeometryCollection)
-    for feature in north_america_opera_geojson["features"]:
-        na_geoms.AddGeometry(ogr.CreateGeometryFromJson(json.dumps(feature["geometry"])))
+    na_geoms = shapely.get_parts([shape(feature["geometry"]) for feature in north_america_opera_geojson["features"]])
+    na_geoms = shapely.get_parts(shapely.make_valid(na_geoms))  # repairs are returned as (multi-)polygon collections
+
+    logger.info("Loaded geojson as shapely geometries")
+    return na_geoms
+
 
-    logger.info("Loaded geojson as osgeo GeometryCollection")
+def _load_north_america_opera_wkb_cache(geojson_digest: bytes, path=NORTH_AMERICA_OPERA_WKB_CACHE_PATH):
+    """Memory-maps the WKB cache. Returns None if the cache is missing or was built from a different GeoJSON file."""
+    try:
+        with open(path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(_WKB_CACHE_MAGIC)] != _WKB_CACHE_MAGIC \
+                    or mm[len(_WKB_CACHE_MAGIC):_WKB_CACHE_HEADER_LEN] != geojson_digest:
+                logger.info(f"North America (OPERA) WKB cache is stale. {path=!s}")
+                return None
+            na_geoms = shapely.get_parts(shapely.from_wkb(mm[_WKB_CACHE_HEADER_LEN:]))
+    except (FileNotFoundError, ValueError):  # ValueError for empty files, which can't be memory-mapped
+        logger.info(f"North America (OPERA) WKB cache not found. {path=!s}")
+        return None
+
+    logger.info("Loaded WKB cache as shapely geometries")
     return na_geoms
 
 
+def _write_north_america_opera_wkb_cache(na_geoms: np.ndarray, geojson_digest: bytes,
+                                         path=NORTH_AMERICA_OPERA_WKB_CACHE_PATH):
+    """Atomically writes the WKB cache, so concurrent readers never see a partially written file."""
+    wkb = shapely.to_wkb(shapely.geometrycollections(na_geoms))
+
+    with tempfile.NamedTemporaryFile("wb", dir=Path(path).parent, prefix=".", delete=False) as fp:
+        fp.write(_WKB_CACHE_MAGIC)
+        fp.write(geojson_digest)
+        fp.write(wkb)
+    os.chmod(fp.name, 0o644)
+    os.replace(fp.name, path)
+
+    logger.info(f"Wrote North America (OPERA) WKB cache. {path=!s}")
+
+
+def _hash_north_america_opera_geojson() -> bytes:
+    return hashlib.sha256(NORTH_AMERICA_OPERA_GEOJSON_PATH.read_bytes()).digest()
+
+
 @cache
 def _cached_load_north_america_opera_geojson() -> dict:
     """Loads a RFC7946 GeoJSON file."""
-    with Path(__file__).parent.joinpath('north_america_opera.geojson').open() as fp:
+    with NORTH_AMERICA_OPERA_GEOJSON_PATH.open() as fp:
         geojson_obj: dict = json.load(fp)
 
     logger.info("Loaded geojson")
     return geojson_obj
+
+
+def build_north_america_opera_wkb_cache():
+    """(Re)builds the precompiled WKB cache of North America (OPERA) from the GeoJSON file."""
+    _write_north_america_opera_wkb_cache(_load_north_america_opera_geojson_geometries(),
+                                         _hash_north_america_opera_geojson())
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Build the precompiled WKB cache of North America (OPERA), "
+                                        f"{NORTH_AMERICA_OPERA_WKB_CACHE_PATH.name}, from "
+                                        f"{NORTH_AMERICA_OPERA_GEOJSON_PATH.name}.").parse_args()
+    logging.basicConfig(level=logging.INFO)
+    build_north_america_opera_wkb_cache()
@@ -995,6 +995,8 @@ class OperaPreConditionFunctions(PreConditionFunctions):
         args.log_level = LogLevels.INFO.value
         args.bbox = bbox
         args.tile_code = None
+        args.cache_dir = self._settings.get("DEM_CACHE_DIR")
+        args.cache_s3_url = self._settings.get("DEM_CACHE_S3_URL")
 
         pge_metrics = self.get_opera_ancillary(ancillary_type='S1 DEM',
                                                output_filepath=output_filepath,
@@ -1255,6 +1257,8 @@ class OperaPreConditionFunctions(PreConditionFunctions):
         # give preference to the tile code over the bbox if both are provided.
         args.bbox = bbox
         args.tile_code = tile_code
+        args.cache_dir = self._settings.get("DEM_CACHE_DIR")
+        args.cache_s3_url = self._settings.get("DEM_CACHE_S3_URL")
 
         pge_metrics = self.get_opera_ancillary(ancillary_type='DSWx DEM',
                                                output_filepath=output_filepath,
@@ -54,7 +54,9 @@ setup(
             "more-itertools==8.13.0",
             "requests==2.27.1",
             "validators",
-            "cachetools==5.2.0"
+            "cachetools==5.2.0",
+            "numpy",
+            "Shapely>=2.0"
         ],
         "test": [
             "prov-es@https://github.com/hysds/prov_es/archive/refs/tags/v0.2.2.tar.gz",
@@ -70,7 +72,7 @@ setup(
             "botocore",
             "click==8.1.3",
             # "GDAL==3.6.2",  # install native gdal first. `brew install gdal` on macOS.
-            "Shapely",
+            "Shapely>=2.0",
             "elasticsearch==7.13.4",
             "elasticsearch[async]>=7.13.4",
             "requests==2.27.1",
@@ -121,7 +123,8 @@ setup(
             "compact-json",
             "more-itertools",
             "python-dateutil",
-            "python-dotenv"
+            "python-dotenv",
+            "Shapely>=2.0"
         ],
         "cnm_check": [
             "compact-json",
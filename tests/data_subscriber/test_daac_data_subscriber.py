@@ -1,9 +1,13 @@
+import itertools
+import os
 import random
+import time
 from datetime import datetime
-from pathlib import Path
+from pathlib import Path, PurePath
 from unittest.mock import MagicMock
 
 import pytest
+import requests
 
 from data_subscriber import daac_data_subscriber, download, query, aws_token, url
 
@@ -165,6 +169,86 @@ async def test_query_smoke_run(monkeypatch):
     assert len(results["query"]["fail"]) == 0
 
 
+@pytest.mark.asyncio
+async def test_query_smoke_run_stops_paging(monkeypatch):
+    # ARRANGE
+    patch_subscriber(monkeypatch)
+    page_counter = itertools.count()
+    monkeypatch.setattr(query, "_request_search", MagicMock(side_effect=lambda *args, **kwargs: (
+        [{
+            "granule_id": f"granule{next(page_counter)}",
+            "related_urls": ["https://example.com/T00000.B02.tif"],
+            "identifier": "S2A_dummy",
+            "temporal_extent_beginning_datetime": datetime.now().isoformat(),
+            "revision_date": datetime.now().isoformat(),
+        }],
+        "search_after"  # CMR always has another page
+    )))
+
+    executors = []
+
+    class SpyThreadPoolExecutor(query.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.is_shut_down = False
+            executors.append(self)
+
+        def shutdown(self, *args, **kwargs):
+            self.is_shut_down = True
+            super().shutdown(*args, **kwargs)
+
+    monkeypatch.setattr(query, "ThreadPoolExecutor", SpyThreadPoolExecutor)
+
+    # hold a reference to the query, so that it isn't closed by garbage collection
+    query_generators = []
+    query_cmr = query.query_cmr
+    monkeypatch.setattr(query, query.query_cmr.__name__,
+                        lambda *args, **kwargs: query_generators.append(query_cmr(*args, **kwargs)) or query_generators[-1])
+
+    is_paging_while_cataloging = []
+    mock_update_granules_index = MagicMock(side_effect=lambda *args: is_paging_while_cataloging.append(
+        not executors[0].is_shut_down) or [])
+    monkeypatch.setattr(query, query.update_granules_index.__name__, mock_update_granules_index)
+
+    args = "dummy.py query " \
+           "--collection-shortname=HLSS30 " \
+           "--chunk-size=1 " \
+           "--smoke-run " \
+           "".split()
+
+    # ACT
+    await daac_data_subscriber.run(args)
+
+    # ASSERT
+    assert is_paging_while_cataloging == [False]
+    cataloged_granules = mock_update_granules_index.call_args.args[1]
+    assert [granule["granule_id"] for granule in cataloged_granules] == ["granule0"]
+
+
+@pytest.mark.asyncio
+async def test_query_file_exits_non_zero_on_catalog_failure(monkeypatch, tmp_path):
+    # ARRANGE
+    patch_subscriber(monkeypatch)
+    mock_es_conn = daac_data_subscriber.get_hls_catalog_connection()
+    mock_es_conn.flush_bulk.return_value = [{"index": {"status": 500}}]
+    urls_filepath = tmp_path / "urls.txt"
+    urls_filepath.write_text("https://example.com/T00000.B01.tif\n")
+
+    args = "dummy.py " \
+           f"--file={urls_filepath} " \
+           "query " \
+           "--collection-shortname=HLSS30 " \
+           "".split()
+
+    # ACT
+    with pytest.raises(SystemExit) as exc_info:
+        await daac_data_subscriber.run(args)
+
+    # ASSERT
+    assert exc_info.value.code == 1
+    daac_data_subscriber.update_url_index.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_download(monkeypatch):
     # ARRANGE
@@ -304,7 +388,6 @@ async def test_download_https(monkeypatch):
     patch_subscriber(monkeypatch)
     patch_subscriber_io(monkeypatch)
     mock_get_aws_creds(monkeypatch)
-    mock_https_transfer(monkeypatch)
     mock_boto3(monkeypatch)
 
     mock_extract = MagicMock(side_effect=["extracts/T00003/T00003.Fmask"])
@@ -401,7 +484,7 @@ def test_download_granules_using_https(monkeypatch):
     )
     mock_create_merged_files(monkeypatch)
 
-    mock_es_conn = MagicMock()
+    mock_es_conn = mock_catalog_connection()
     mock_es_conn.product_is_downloaded.return_value = False
 
     from dataclasses import dataclass
@@ -414,11 +497,176 @@ def test_download_granules_using_https(monkeypatch):
 
     download.download_granules(None, mock_es_conn, {
         "granule1": ["http://example.com/granule1.Fmask.tif"]
-    }, Args(), None, None)
+    }.items(), Args(), None, None)
 
     mock_download_product_using_https.assert_called()
 
 
+
+def test_download_granules_collects_failures(monkeypatch):
+    patch_subscriber(monkeypatch)
+    patch_subscriber_io(monkeypatch)
+
+    def mock_download_product_using_https(product_url, *args, **kwargs):
+        if product_url == "http://example.com/granule1.B02.tif":
+            raise Exception("Not Found")
+        return Path(f"downloads/{PurePath(product_url).name}").resolve()
+    monkeypatch.setattr(
+        download,
+        download.download_product_using_https.__name__,
+        mock_download_product_using_https
+    )
+    mock_extract_many_to_one = MagicMock()
+    monkeypatch.setattr(download, download.extract_many_to_one.__name__, mock_extract_many_to_one)
+
+    mock_es_conn = mock_catalog_connection()
+
+    from dataclasses import dataclass
+
+    @dataclass
+    class Args:
+        dry_run = False
+        smoke_run = False
+        transfer_protocol = "https"
+        max_concurrent_downloads = 2
+
+    with pytest.raises(Exception, match="Failed to download 1 product"):
+        download.download_granules(None, mock_es_conn, {
+            "granule1": ["http://example.com/granule1.B01.tif", "http://example.com/granule1.B02.tif"],
+            "granule2": [f"http://example.com/granule2.B0{i}.tif" for i in range(1, 6)]
+        }.items(), Args(), None, None)
+
+    # the failed granule is left pending, while the others are marked as downloaded in order
+    assert [c.args[0] for c in mock_es_conn.bulk_mark_product_as_downloaded.call_args_list] == \
+           [f"http://example.com/granule2.B0{i}.tif" for i in range(1, 6)]
+    mock_extract_many_to_one.assert_called_once()
+    assert mock_extract_many_to_one.call_args.args[1] == "granule2"
+
+
+def test_download_concurrently_preserves_order():
+    def mock_download(i):
+        time.sleep(0.01 * (5 - i))  # later items finish first
+        if i == 2:
+            raise ValueError(i)
+        return i * 10
+
+    results = list(download._download_concurrently(range(5), mock_download, max_concurrent_downloads=3))
+
+    assert [item for item, _, _ in results] == [0, 1, 2, 3, 4]
+    assert [result for _, result, _ in results] == [0, 10, None, 30, 40]
+    assert isinstance(results[2][2], ValueError)
+
+def test_download_product_using_https_streams_to_file(tmp_path):
+    mock_response = MagicMock()
+    mock_response.__enter__.return_value = mock_response
+    mock_response.headers = {}
+    mock_response.iter_content.return_value = iter([b"chunk1", b"chunk2"])
+    mock_session = MagicMock(get=MagicMock(return_value=mock_response))
+
+    product_filepath = download.download_product_using_https(
+        "https://example.com/granule1.Fmask.tif", mock_session, "dummy_token", tmp_path, chunk_size=6
+    )
+
+    assert mock_session.get.call_args.kwargs["stream"] is True
+    mock_response.iter_content.assert_called_once_with(chunk_size=6)
+    assert product_filepath == (tmp_path / "granule1.Fmask.tif").resolve()
+    assert product_filepath.read_bytes() == b"chunk1chunk2"
+
+
+def test_download_product_using_https_resumes_interrupted_download(tmp_path):
+    def iter_interrupted_content(chunk_size):
+        yield b"chunk1"
+        raise requests.exceptions.ChunkedEncodingError("Connection broken")
+
+    mock_full_response = MagicMock(status_code=200, headers={"ETag": '"etag1"', "Content-Length": "12"})
+    mock_full_response.__enter__.return_value = mock_full_response
+    mock_full_response.iter_content.side_effect = iter_interrupted_content
+
+    mock_partial_response = MagicMock(status_code=206, headers={"Content-Range": "bytes 6-11/12"})
+    mock_partial_response.__enter__.return_value = mock_partial_response
+    mock_partial_response.iter_content.return_value = iter([b"chunk2"])
+
+    mock_session = MagicMock(get=MagicMock(side_effect=[mock_full_response, mock_partial_response]))
+
+    product_filepath = download.download_product_using_https(
+        "https://example.com/granule1.Fmask.tif", mock_session, "dummy_token", tmp_path, chunk_size=6
+    )
+
+    resume_headers = mock_session.get.call_args_list[1].kwargs["headers"]
+    assert resume_headers["Range"] == "bytes=6-"
+    assert resume_headers["If-Range"] == '"etag1"'
+    assert product_filepath.read_bytes() == b"chunk1chunk2"
+    assert not (tmp_path / "granule1.Fmask.tif.part").exists()
+    assert not (tmp_path / "granule1.Fmask.tif.part.json").exists()
+
+
+def test_download_product_using_https_resumes_download_of_previous_job(tmp_path):
+    partial_download_dir = tmp_path / "partial"
+    partial_download_dir.mkdir()
+    url = "https://example.com/granule1.Fmask.tif"
+    partial_path = download._to_partial_download_path(url, partial_download_dir)
+    partial_path.with_name(f"{partial_path.name}.part").write_bytes(b"chunk1")
+    partial_path.with_name(f"{partial_path.name}.part.json").write_text('{"validator": "\\"etag1\\"", "size": 12}')
+
+    mock_partial_response = MagicMock(status_code=206, headers={"Content-Range": "bytes 6-11/12"})
+    mock_partial_response.__enter__.return_value = mock_partial_response
+    mock_partial_response.iter_content.return_value = iter([b"chunk2"])
+    mock_session = MagicMock(get=MagicMock(return_value=mock_partial_response))
+
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    product_filepath = download.download_product_using_https(
+        url, mock_session, "dummy_token", job_dir, partial_download_dir=partial_download_dir
+    )
+
+    assert mock_session.get.call_args.kwargs["headers"]["Range"] == "bytes=6-"
+    assert product_filepath.read_bytes() == b"chunk1chunk2"
+    assert not partial_path.with_name(f"{partial_path.name}.part").exists()
+    assert not partial_path.with_name(f"{partial_path.name}.part.json").exists()
+
+
+def test_get_partial_download_dir_removes_abandoned_downloads(tmp_path):
+    (tmp_path / "abandoned.part").write_bytes(b"chunk1")
+    os.utime(tmp_path / "abandoned.part", times=(0, 0))
+    (tmp_path / "recent.part").write_bytes(b"chunk1")
+
+    assert download._get_partial_download_dir({"PARTIAL_DOWNLOAD_DIR": str(tmp_path)}) == tmp_path
+    assert [path.name for path in tmp_path.iterdir()] == ["recent.part"]
+    assert download._get_partial_download_dir({}) is None
+
+
+def test_download_product_using_https_completes_fully_written_download(tmp_path):
+    (tmp_path / "granule1.Fmask.tif.part").write_bytes(b"chunk1chunk2")
+    (tmp_path / "granule1.Fmask.tif.part.json").write_text('{"validator": "\\"etag1\\"", "size": 12}')
+    mock_session = MagicMock()
+
+    product_filepath = download.download_product_using_https(
+        "https://example.com/granule1.Fmask.tif", mock_session, "dummy_token", tmp_path
+    )
+
+    mock_session.get.assert_not_called()
+    assert product_filepath.read_bytes() == b"chunk1chunk2"
+
+
+def test_download_product_using_https_restarts_unsatisfiable_range(tmp_path):
+    (tmp_path / "granule1.Fmask.tif.part").write_bytes(b"chunk1")
+    (tmp_path / "granule1.Fmask.tif.part.json").write_text('{"validator": "\\"etag1\\"", "size": 12}')
+
+    mock_unsatisfiable_response = MagicMock(status_code=416, headers={})
+    mock_unsatisfiable_response.__enter__.return_value = mock_unsatisfiable_response
+    mock_full_response = MagicMock(status_code=200, headers={"ETag": '"etag2"', "Content-Length": "12"})
+    mock_full_response.__enter__.return_value = mock_full_response
+    mock_full_response.iter_content.return_value = iter([b"chunk3", b"chunk4"])
+    mock_session = MagicMock(get=MagicMock(side_effect=[mock_unsatisfiable_response, mock_full_response]))
+
+    product_filepath = download.download_product_using_https(
+        "https://example.com/granule1.Fmask.tif", mock_session, "dummy_token", tmp_path
+    )
+
+    assert "Range" not in mock_session.get.call_args.kwargs["headers"]
+    assert product_filepath.read_bytes() == b"chunk3chunk4"
+
+
 def test_download_granules_using_s3(monkeypatch):
     patch_subscriber(monkeypatch)
     patch_subscriber_io(monkeypatch)
@@ -437,7 +685,7 @@ def test_download_granules_using_s3(monkeypatch):
     )
     mock_create_merged_files(monkeypatch)
 
-    mock_es_conn = MagicMock()
+    mock_es_conn = mock_catalog_connection()
     mock_es_conn.product_is_downloaded.return_value = False
 
     from dataclasses import dataclass
@@ -450,11 +698,52 @@ def test_download_granules_using_s3(monkeypatch):
 
     download.download_granules(None, mock_es_conn, {
         "granule1": ["s3://example.com/granule1.Fmask.tif"]
-    }, Args(), None, None)
+    }.items(), Args(), None, None)
 
     mock_download_product_using_s3.assert_called()
 
 
+
+def test_get_s3_client_is_reused_until_credentials_rotate(monkeypatch):
+    download._create_s3_client.cache_clear()
+    mock_session = MagicMock()
+    monkeypatch.setattr(download.boto3, download.boto3.Session.__name__, mock_session)
+    mock_get_aws_creds = MagicMock(return_value={"accessKeyId": "1", "secretAccessKey": "1", "sessionToken": "1"})
+    monkeypatch.setattr(download, download._get_aws_creds.__name__, mock_get_aws_creds)
+
+    s3 = download._get_s3_client("dummy_token", "ASF")
+    assert download._get_s3_client("dummy_token", "ASF") is s3
+    assert mock_session.call_count == 1
+
+    mock_get_aws_creds.return_value = {"accessKeyId": "2", "secretAccessKey": "2", "sessionToken": "2"}
+    download._get_s3_client("dummy_token", "ASF")
+    assert mock_session.call_count == 2
+
+    download._create_s3_client.cache_clear()
+
+
+def test_get_transfer_config():
+    small_config = download._get_transfer_config(10 * 1024 ** 2)
+    assert small_config.multipart_chunksize == download.S3_MIN_MULTIPART_CHUNKSIZE
+    assert small_config.max_concurrency == 1
+
+    large_config = download._get_transfer_config(4 * 1024 ** 3)
+    assert large_config.multipart_chunksize == 64 * 1024 ** 2
+    assert large_config.max_concurrency == download.S3_TRANSFER_MAX_CONCURRENCY
+
+
+def test_s3_download_uses_transfer_config():
+    mock_s3 = MagicMock()
+    mock_s3.head_object.return_value = {"ContentLength": 4 * 1024 ** 3}
+
+    product_download_path = download._s3_download("s3://bucket/path/to/product.zip", mock_s3, "/tmp")
+
+    assert product_download_path == Path("/tmp/product.zip")
+    mock_s3.head_object.assert_called_once_with(Bucket="bucket", Key="path/to/product.zip")
+    assert mock_s3.download_file.call_args.args == ("bucket", "path/to/product.zip", "/tmp/product.zip")
+    assert mock_s3.download_file.call_args.kwargs["Config"].max_concurrency == download.S3_TRANSFER_MAX_CONCURRENCY
+
+
 def test_download_from_asf(monkeypatch):
     # ARRANGE
     patch_subscriber_io(monkeypatch)
@@ -487,14 +776,20 @@ def test_download_from_asf(monkeypatch):
         download.stage_orbit_file.get_parser.__name__,
         MagicMock()
     )
-    mock_stage_orbit_file = MagicMock()
+    mock_query_orbit_file = MagicMock(return_value=("dummy_orbit_file.EOF", "https://www.example.com/dummy_orbit_file"))
+    monkeypatch.setattr(
+        download.stage_orbit_file,
+        download.stage_orbit_file.query_orbit_file.__name__,
+        mock_query_orbit_file
+    )
+    mock_stage_orbit_file = MagicMock(return_value="downloads/dummy_orbit_file.EOF")
     monkeypatch.setattr(
         download.stage_orbit_file,
-        download.stage_orbit_file.main.__name__,
+        download.stage_orbit_file.download_orbit_file.__name__,
         mock_stage_orbit_file
     )
 
-    mock_stage_ionosphere_file = MagicMock()
+    mock_stage_ionosphere_file = MagicMock(return_value="downloads/dummy_ionosphere_file")
     monkeypatch.setattr(
         download.ionosphere_download,
         download.ionosphere_download.download_ionosphere_correction_file.__name__,
@@ -522,7 +817,7 @@ def test_download_from_asf(monkeypatch):
 
     # ACT
     download.download_from_asf(session=MagicMock(),
-                               es_conn=MagicMock(),
+                               es_conn=mock_catalog_connection(),
                                downloads=[
                                    {
                                        "https_url": "https://www.example.com/dummy_slc_product.zip",
@@ -536,11 +831,342 @@ def test_download_from_asf(monkeypatch):
 
     # ASSERT
     mock_extract_one_to_one.assert_called_once()
+    assert mock_query_orbit_file.call_count == 2  # POEORB and RESORB
     mock_stage_orbit_file.assert_called_once()
     mock_stage_ionosphere_file.assert_called_once()
     mock_stage_ionosphere_file_url.assert_called_once()
 
 
+
+def test_download_from_asf_pipelines_products(monkeypatch):
+    # ARRANGE
+    patch_subscriber_io(monkeypatch)
+
+    from dataclasses import dataclass
+
+    @dataclass
+    class Args:
+        dry_run = False
+        smoke_run = False
+        provider = "ASF"
+        transfer_protocol = "https"
+        max_concurrent_downloads = 2
+
+    def mock_download_asf_product(product_url, token, target_dirpath, partial_download_dir=None):
+        time.sleep(random.random() / 100)
+        return MagicMock(name=PurePath(product_url).name)
+    monkeypatch.setattr(download, download.download_asf_product.__name__, mock_download_asf_product)
+
+    monkeypatch.setattr(
+        download,
+        download.extract_one_to_one.__name__,
+        MagicMock(side_effect=lambda product, *args, **kwargs: PurePath(f"dataset_{product._mock_name}"))
+    )
+    monkeypatch.setattr(
+        download,
+        download._download_ancillary_files.__name__,
+        MagicMock(side_effect=lambda product_filename, *args, **kwargs: f"ancillary_{product_filename}")
+    )
+    mock_stage_ancillary_files = MagicMock()
+    monkeypatch.setattr(download, download._stage_ancillary_files.__name__, mock_stage_ancillary_files)
+
+    mock_es_conn = mock_catalog_connection()
+    product_urls = [f"https://www.example.com/dummy_slc_product_{i}.zip" for i in range(5)]
+
+    # ACT
+    download.download_from_asf(session=MagicMock(),
+                               es_conn=mock_es_conn,
+                               downloads=[{"https_url": product_url, "processing_mode": "forward"}
+                                          for product_url in product_urls],
+                               args=Args(),
+                               token=None,
+                               job_id=None)
+
+    # ASSERT
+    assert [c.args[0] for c in mock_es_conn.bulk_mark_product_as_downloaded.call_args_list] == product_urls
+    assert [(c.args[0], c.args[1].result()) for c in mock_stage_ancillary_files.call_args_list] == \
+           [(PurePath(f"dataset_dummy_slc_product_{i}.zip"), f"ancillary_dummy_slc_product_{i}.zip") for i in range(5)]
+
+
+def test_download_orbit_file_falls_back_to_resorb(monkeypatch):
+    def mock_query_orbit_file(args):
+        if args.orbit_type == "POEORB":
+            raise download.NoQueryResultsException()
+        return "dummy_resorb_file.EOF", "https://www.example.com/dummy_resorb_file"
+    monkeypatch.setattr(download.stage_orbit_file, download.stage_orbit_file.query_orbit_file.__name__, mock_query_orbit_file)
+    mock_download_orbit_file = MagicMock(return_value="ancillary/dummy_resorb_file.EOF")
+    monkeypatch.setattr(download.stage_orbit_file, download.stage_orbit_file.download_orbit_file.__name__, mock_download_orbit_file)
+
+    orbit_filepath = download._download_orbit_file(
+        "S1A_IW_SLC__1SDV_20230101T000000_20230101T000030_046572_0595B2_1A2B.zip", Path("ancillary"), {}
+    )
+
+    assert orbit_filepath == Path("ancillary/dummy_resorb_file.EOF")
+    mock_download_orbit_file.assert_called_once()
+    assert mock_download_orbit_file.call_args.args[:3] == \
+           ("https://www.example.com/dummy_resorb_file", "ancillary", "dummy_resorb_file.EOF")
+
+
+def test_download_orbit_file_uses_cache(monkeypatch, tmp_path):
+    mock_query_orbit_file = MagicMock()
+    monkeypatch.setattr(download.stage_orbit_file, download.stage_orbit_file.query_orbit_file.__name__, mock_query_orbit_file)
+
+    orbit_file_name = "S1A_OPER_AUX_POEORB_OPOD_20230121T080000_V20221231T225942_20230102T005942.EOF"
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "cache" / orbit_file_name).write_text("orbit")
+    (tmp_path / "ancillary").mkdir()
+
+    orbit_filepath = download._download_orbit_file(
+        "S1A_IW_SLC__1SDV_20230101T000000_20230101T000030_046572_0595B2_1A2B.zip", tmp_path / "ancillary",
+        {"ORBIT_CACHE_DIR": str(tmp_path / "cache")}
+    )
+
+    mock_query_orbit_file.assert_not_called()
+    assert orbit_filepath == tmp_path / "ancillary" / orbit_file_name
+    assert orbit_filepath.read_text() == "orbit"
+
+def test_get_temporal_subranges():
+    subranges = query._get_temporal_subranges("2023-01-01T00:00:00Z,2023-01-01T04:00:00Z", 4)
+
+    assert subranges == [
+        "2023-01-01T00:00:00Z,2023-01-01T01:00:00Z",
+        "2023-01-01T01:00:00Z,2023-01-01T02:00:00Z",
+        "2023-01-01T02:00:00Z,2023-01-01T03:00:00Z",
+        "2023-01-01T03:00:00Z,2023-01-01T04:00:00Z"
+    ]
+
+
+def test_get_temporal_subranges_empty_range():
+    subranges = query._get_temporal_subranges("2023-01-01T00:00:00Z,2023-01-01T00:00:00Z", 4)
+
+    assert subranges == ["2023-01-01T00:00:00Z,2023-01-01T00:00:00Z"]
+
+
+def test_query_cmr_dedupes_subrange_results(monkeypatch):
+    mock_request_search = MagicMock(return_value=(
+        [
+            {"granule_id": "granule1", "related_urls": ["https://example.com/granule1.B02.tif"]},
+            {"granule_id": "granule2", "related_urls": ["https://example.com/granule2.B02.tif"]}
+        ],
+        None  # search_after
+    ))
+    monkeypatch.setattr(query, query._request_search.__name__, mock_request_search)
+
+    args = daac_data_subscriber.create_parser().parse_args(
+        "query --collection-shortname=HLSS30 --max-query-concurrency=3 "
+        "--start-date=2023-01-01T00:00:00Z --end-date=2023-01-01T03:00:00Z".split()
+    )
+    timerange = query.get_query_timerange(args, datetime.utcnow())
+
+    granules = list(query.query_cmr(args, None, "cmr.example.com", {"SHORTNAME_FILTERS": {}}, timerange, datetime.utcnow()))
+
+    assert mock_request_search.call_count == 3
+    assert [granule["granule_id"] for granule in granules] == ["granule1", "granule2"]
+
+
+def test_query_cmr_does_not_split_smoke_run(monkeypatch):
+    mock_request_search = MagicMock(return_value=([{"granule_id": "granule1", "related_urls": []}], None))
+    monkeypatch.setattr(query, query._request_search.__name__, mock_request_search)
+
+    args = daac_data_subscriber.create_parser().parse_args(
+        "query --collection-shortname=HLSS30 --max-query-concurrency=3 --smoke-run "
+        "--start-date=2023-01-01T00:00:00Z --end-date=2023-01-01T03:00:00Z".split()
+    )
+    timerange = query.get_query_timerange(args, datetime.utcnow())
+
+    list(query.query_cmr(args, None, "cmr.example.com", {"SHORTNAME_FILTERS": {}}, timerange, datetime.utcnow()))
+
+    # a single search, sorted newest first
+    mock_request_search.assert_called_once()
+    assert mock_request_search.call_args.args[2]["revision_date"] == "2023-01-01T00:00:00Z,2023-01-01T03:00:00Z"
+
+
+def test_query_cmr_streams_pages(monkeypatch):
+    mock_request_search = MagicMock(side_effect=[
+        ([{"granule_id": "granule1", "related_urls": []}], "search_after_1"),
+        ([{"granule_id": "granule2", "related_urls": []}], None)
+    ])
+    monkeypatch.setattr(query, query._request_search.__name__, mock_request_search)
+
+    args = daac_data_subscriber.create_parser().parse_args("query --collection-shortname=HLSS30 --max-query-concurrency=1".split())
+    timerange = query.get_query_timerange(args, datetime.utcnow())
+
+    granules = query.query_cmr(args, None, "cmr.example.com", {"SHORTNAME_FILTERS": {}}, timerange, datetime.utcnow())
+
+    assert next(granules)["granule_id"] == "granule1"
+    assert next(granules)["granule_id"] == "granule2"
+    assert mock_request_search.call_count == 2
+
+
+def test_query_cmr_uses_cache(monkeypatch, tmp_path):
+    mock_request_search = MagicMock(side_effect=[
+        ([{"granule_id": "granule1", "related_urls": []}], "search_after_1"),
+        ([{"granule_id": "granule2", "related_urls": []}], None)
+    ])
+    monkeypatch.setattr(query, query._request_search.__name__, mock_request_search)
+
+    args = daac_data_subscriber.create_parser().parse_args(
+        f"survey --collection-shortname=HLSS30 --max-query-concurrency=1 --cache-dir={tmp_path} "
+        "--start-date=2023-01-01T00:00:00Z --end-date=2023-01-01T03:00:00Z".split()
+    )
+    timerange = query.get_query_timerange(args, datetime.utcnow())
+
+    granules = list(query.query_cmr(args, None, "cmr.example.com", {"SHORTNAME_FILTERS": {}}, timerange, datetime.utcnow()))
+    cached_granules = list(query.query_cmr(args, None, "cmr.example.com", {"SHORTNAME_FILTERS": {}}, timerange, datetime.utcnow()))
+
+    assert mock_request_search.call_count == 2
+    assert [granule["granule_id"] for granule in cached_granules] == [granule["granule_id"] for granule in granules] \
+           == ["granule1", "granule2"]
+
+
+def test_granule_matcher():
+    matcher = query.GranuleMatcher("HLSS30", ["S2A", "S2B"])
+
+    assert matcher.match_identifier("S2A_MSIL1C_20230101T000000")
+    assert matcher.match_identifier("S2B_MSIL1C_20230101T000000")
+    assert not matcher.match_identifier("S1A_MSIL1C_20230101T000000")
+    assert not matcher.match_identifier("X_S2A_MSIL1C_20230101T000000")
+    assert matcher.filter_urls([
+        "https://example.com/HLS.S30.T00000.B01.tif",
+        "https://example.com/HLS.S30.T00000.B02.tif",
+        "https://example.com/HLS.S30.T00000.B8A.tif",
+        "https://example.com/HLS.S30.T00000.Fmask.tif",
+        "https://example.com/HLS.S30.T00000.cmr.xml",
+    ]) == [
+        "https://example.com/HLS.S30.T00000.B02.tif",
+        "https://example.com/HLS.S30.T00000.B8A.tif",
+        "https://example.com/HLS.S30.T00000.Fmask.tif",
+    ]
+
+
+def test_granule_matcher_without_filters():
+    assert query.GranuleMatcher("HLSS30").match_identifier("anything")
+    assert not query.GranuleMatcher("HLSS30", []).match_identifier("anything")
+    assert query.GranuleMatcher("OTHER").filter_urls(["a.tif", "b.xml"]) == ["a.tif"]
+    assert query.GranuleMatcher("SENTINEL-1A_SLC").filter_urls([
+        "https://example.com/S1A_IW_SLC__1SDV_20230101T000000_20230101T000030_000000_000000_0000.zip",
+        "https://example.com/S1A_EW_SLC__1SDV_20230101T000000_20230101T000030_000000_000000_0000.zip"
+    ]) == ["https://example.com/S1A_IW_SLC__1SDV_20230101T000000_20230101T000030_000000_000000_0000.zip"]
+
+
+def test_get_query_timerange_from_watermark():
+    args = daac_data_subscriber.create_parser().parse_args(
+        "query --collection-shortname=HLSS30 --use-watermark --watermark-overlap-minutes=10".split()
+    )
+
+    timerange = query.get_query_timerange(args, datetime(2023, 1, 2), watermark="2023-01-01T12:00:00Z")
+
+    assert timerange == query.DateTimeRange("2023-01-01T11:50:00Z", "2023-01-02T00:00:00Z")
+
+
+@pytest.mark.asyncio
+async def test_query_advances_watermark(monkeypatch):
+    # ARRANGE
+    patch_subscriber(monkeypatch)
+    mock_watermark_conn = mock_query_watermark_catalog_connection(monkeypatch, watermark="2023-01-01T12:00:00Z")
+
+    args = "dummy.py query " \
+           "--collection-shortname=HLSS30 " \
+           "--use-watermark " \
+           "--chunk-size=1 " \
+           "".split()
+
+    # ACT
+    results = await daac_data_subscriber.run(args)
+
+    # ASSERT
+    assert len(results["query"]["fail"]) == 0
+    mock_watermark_conn.get_watermark.assert_called_once_with("OPS-HLSS30-forward--180,-90,180,90")
+    watermark_id, revision_date, _ = mock_watermark_conn.set_watermark.call_args.args
+    assert watermark_id == "OPS-HLSS30-forward--180,-90,180,90"
+    assert revision_date > "2023-01-01T12:00:00Z"
+
+
+@pytest.mark.asyncio
+async def test_query_keeps_watermark_per_bbox(monkeypatch):
+    # ARRANGE
+    patch_subscriber(monkeypatch)
+    mock_watermark_conn = mock_query_watermark_catalog_connection(monkeypatch, watermark="2023-01-01T12:00:00Z")
+
+    args = "dummy.py query " \
+           "--collection-shortname=HLSS30 " \
+           "--bounds=-120,30,-110,40 " \
+           "--use-watermark " \
+           "".split()
+
+    # ACT
+    await daac_data_subscriber.run(args)
+
+    # ASSERT
+    mock_watermark_conn.get_watermark.assert_called_once_with("OPS-HLSS30-forward--120,30,-110,40")
+    watermark_id, _, _ = mock_watermark_conn.set_watermark.call_args.args
+    assert watermark_id == "OPS-HLSS30-forward--120,30,-110,40"
+
+
+@pytest.mark.asyncio
+async def test_query_does_not_advance_watermark_on_catalog_failure(monkeypatch):
+    # ARRANGE
+    patch_subscriber(monkeypatch)
+    mock_watermark_conn = mock_query_watermark_catalog_connection(monkeypatch, watermark=None)
+    monkeypatch.setattr(
+        query,
+        "get_hls_spatial_catalog_connection",
+        MagicMock(
+            return_value=MagicMock(process_granules=MagicMock(return_value=[{"create": {"status": 500}}]))
+        )
+    )
+
+    args = "dummy.py query " \
+           "--collection-shortname=HLSS30 " \
+           "--use-watermark " \
+           "".split()
+
+    # ACT
+    with pytest.raises(Exception, match="Failed to catalog"):
+        await daac_data_subscriber.run(args)
+
+    # ASSERT
+    mock_watermark_conn.set_watermark.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_query_ignores_watermark_for_explicit_timerange(monkeypatch):
+    # ARRANGE
+    patch_subscriber(monkeypatch)
+    mock_watermark_conn = mock_query_watermark_catalog_connection(monkeypatch, watermark="2023-01-01T12:00:00Z")
+
+    args = "dummy.py query " \
+           "--collection-shortname=HLSS30 " \
+           "--start-date=1970-01-01T00:00:00Z " \
+           "--end-date=1970-01-01T00:00:00Z " \
+           "--use-watermark " \
+           "".split()
+
+    # ACT
+    await daac_data_subscriber.run(args)
+
+    # ASSERT
+    mock_watermark_conn.get_watermark.assert_not_called()
+    mock_watermark_conn.set_watermark.assert_not_called()
+
+
+def mock_query_watermark_catalog_connection(monkeypatch, watermark):
+    mock_watermark_conn = MagicMock(get_watermark=MagicMock(return_value=watermark))
+    monkeypatch.setattr(
+        query,
+        query.get_query_watermark_catalog_connection.__name__,
+        MagicMock(return_value=mock_watermark_conn)
+    )
+    return mock_watermark_conn
+
+
+def mock_catalog_connection():
+    return MagicMock(
+        bulk_mark_product_as_downloaded=MagicMock(return_value=[]),
+        flush_bulk=MagicMock(return_value=[])
+    )
+
+
 def mock_token(*args):
     return "test_token"
 
@@ -551,8 +1177,11 @@ def patch_subscriber(monkeypatch):
         daac_data_subscriber.get_hls_catalog_connection.__name__,
             MagicMock(
                 return_value=MagicMock(
-                get_all_between=MagicMock(
-                    return_value=[
+                bulk_process_url=MagicMock(return_value=[]),
+                bulk_mark_product_as_downloaded=MagicMock(return_value=[]),
+                flush_bulk=MagicMock(return_value=[]),
+                claim_all_between=MagicMock(
+                    side_effect=lambda *args, predicate=None, **kwargs: filter(predicate, [
                         {
                             "https_url": "https://example.com/T00000.B01.tif",
                             "s3_url": "s3://example/T00000.B01.tif"
@@ -572,7 +1201,7 @@ def patch_subscriber(monkeypatch):
                         {
                             "https_url": "https://example.com/T00003.B01.tif",
                         }
-                    ]
+                    ])
                 )
             )
         )
@@ -581,14 +1210,14 @@ def patch_subscriber(monkeypatch):
         query,
         query.get_hls_spatial_catalog_connection.__name__,
         MagicMock(
-            return_value=MagicMock(process_granule=MagicMock())
+            return_value=MagicMock(process_granules=MagicMock(return_value=[]))
         )
     )
     monkeypatch.setattr(
         query,
         query.get_slc_spatial_catalog_connection.__name__,
         MagicMock(
-            return_value=MagicMock(process_granule=MagicMock())
+            return_value=MagicMock(process_granules=MagicMock(return_value=[]))
         )
     )
     monkeypatch.setattr(
@@ -673,7 +1302,7 @@ def patch_subscriber(monkeypatch):
     monkeypatch.setattr(
         daac_data_subscriber,
         daac_data_subscriber.update_url_index.__name__,
-        MagicMock()
+        MagicMock(return_value=[])
     )
     monkeypatch.setattr(
         query,
@@ -709,6 +1338,9 @@ def patch_subscriber_io(monkeypatch):
     Patched functions will do no-op, returning None.
     """
     mock_smart_open(monkeypatch)
+    mock_resumable_download(monkeypatch)
+    mock_ancillary_file_caches(monkeypatch)
+    mock_partial_download_dir(monkeypatch)
     mock_path_package(monkeypatch)
     mock_shutil_package(monkeypatch)
     mock_json_package(monkeypatch)
@@ -723,6 +1355,27 @@ def mock_smart_open(monkeypatch):
     )
 
 
+def mock_resumable_download(monkeypatch):
+    def download_resumable(request, path, *args, **kwargs):
+        with request({}) as response:
+            response.raise_for_status()
+
+    monkeypatch.setattr(download, download._download_resumable.__name__, download_resumable)
+
+
+def mock_partial_download_dir(monkeypatch):
+    monkeypatch.setattr(download, download._get_partial_download_dir.__name__, MagicMock(return_value=None))
+
+
+def mock_ancillary_file_caches(monkeypatch):
+    monkeypatch.setattr(download, download._get_orbit_file_cache.__name__, MagicMock(return_value=None))
+    monkeypatch.setattr(
+        download.ionosphere_download,
+        download.ionosphere_download.get_ionosphere_file_cache.__name__,
+        MagicMock(return_value=None)
+    )
+
+
 def mock_path_package(monkeypatch):
     monkeypatch.setattr(
         daac_data_subscriber.Path,
@@ -742,6 +1395,11 @@ def mock_shutil_package(monkeypatch):
         download.shutil.copy.__name__,
         MagicMock()
     )
+    monkeypatch.setattr(
+        download.shutil,
+        download.shutil.move.__name__,
+        MagicMock()
+    )
 
 
 def mock_json_package(monkeypatch):
@@ -769,14 +1427,6 @@ def mock_get_aws_creds(monkeypatch):
     )
 
 
-def mock_https_transfer(monkeypatch):
-    monkeypatch.setattr(
-        download,
-        download._https_transfer.__name__,
-        MagicMock(return_value={})
-    )
-
-
 def mock_s3_transfer(monkeypatch):
     monkeypatch.setattr(
         download,
@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock
+
+from data_subscriber import es_bulk_util
+from data_subscriber.es_bulk_util import BulkActionBuffer
+
+
+def test_flush_when_full(monkeypatch):
+    mock_bulk = MagicMock(return_value=(2, []))
+    monkeypatch.setattr(es_bulk_util, es_bulk_util.bulk.__name__, mock_bulk)
+
+    buffer = BulkActionBuffer(MagicMock(), max_actions=2)
+    buffer.add({"_id": "1"})
+    mock_bulk.assert_not_called()
+
+    buffer.add({"_id": "2"})
+    mock_bulk.assert_called_once()
+    assert buffer.actions == []
+
+
+def test_flush_reports_failures(monkeypatch):
+    error = {"update": {"_id": "2", "status": 400, "error": "mapper_parsing_exception"}}
+    monkeypatch.setattr(es_bulk_util, es_bulk_util.bulk.__name__, MagicMock(return_value=(1, [error])))
+
+    buffer = BulkActionBuffer(MagicMock())
+    buffer.add({"_id": "1"})
+    buffer.add({"_id": "2"})
+
+    assert buffer.flush() == [error]
+    assert buffer.failures == [error]
+
+
+def test_flush_empty_buffer(monkeypatch):
+    mock_bulk = MagicMock()
+    monkeypatch.setattr(es_bulk_util, es_bulk_util.bulk.__name__, mock_bulk)
+
+    assert BulkActionBuffer(MagicMock()).flush() == []
+    mock_bulk.assert_not_called()
+
+
+def test_journal_survives_failed_flush(monkeypatch, tmp_path):
+    from datetime import datetime
+
+    journal_dir = tmp_path / "journal"
+    monkeypatch.setattr(es_bulk_util, es_bulk_util.bulk.__name__, MagicMock(side_effect=ConnectionError()))
+
+    buffer = BulkActionBuffer(MagicMock(), journal_dir=journal_dir)
+    buffer.add({"_id": "1", "doc": {"download_datetime": datetime(2023, 1, 1)}})
+    try:
+        buffer.flush()
+    except ConnectionError:
+        pass
+    assert len(buffer.actions) == 1
+
+    # the journal of a running process isn't adopted
+    mock_bulk = MagicMock(return_value=(1, []))
+    monkeypatch.setattr(es_bulk_util, "bulk", mock_bulk)
+    assert BulkActionBuffer(MagicMock(), journal_dir=journal_dir).actions == []
+
+    # a later buffer (e.g. the next run, once the process has exited) picks up the unflushed actions
+    buffer._journal_fp.close()
+    replayed_buffer = BulkActionBuffer(MagicMock(), journal_dir=journal_dir)
+    assert replayed_buffer.actions == [{"_id": "1", "doc": {"download_datetime": "2023-01-01T00:00:00"}}]
+
+    replayed_buffer.flush()
+    mock_bulk.assert_called_once()
+    assert all(journal_path.stat().st_size == 0 for journal_path in journal_dir.glob("*.jsonl"))
+    assert BulkActionBuffer(MagicMock(), journal_dir=journal_dir).actions == []
+
+
+def test_journal_syncs_once_per_batch(monkeypatch, tmp_path):
+    monkeypatch.setattr(es_bulk_util, es_bulk_util.bulk.__name__, MagicMock(return_value=(2, [])))
+    mock_fsync = MagicMock()
+    monkeypatch.setattr(es_bulk_util.os, "fsync", mock_fsync)
+
+    buffer = BulkActionBuffer(MagicMock(), max_actions=2, journal_dir=tmp_path)
+    for i in range(4):
+        buffer.add({"_id": str(i)})
+
+    assert mock_fsync.call_count == 2
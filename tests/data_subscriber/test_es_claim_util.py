@@ -0,0 +1,74 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from data_subscriber import es_claim_util, es_conn_util
+from data_subscriber.es_claim_util import claim_all
+from data_subscriber.hls import hls_catalog
+from data_subscriber.url import _to_granule_id
+
+
+def to_hit(_id, granule_id):
+    return {"_index": "hls_catalog", "_id": _id, "_seq_no": 1, "_primary_term": 1, "_source": {"granule_id": granule_id}}
+
+
+def to_conflict(_id):
+    return {"update": {"_id": _id, "status": 409}}
+
+
+def test_claim_all_claims_lazily_in_slices(monkeypatch):
+    mock_bulk = MagicMock(return_value=(0, []))
+    monkeypatch.setattr(es_claim_util, "bulk", mock_bulk)
+
+    hits = [to_hit(str(i), str(i)) for i in range(5)]
+    claimed_hits = claim_all(MagicMock(), hits, "job1", claim_size=2)
+
+    assert next(claimed_hits)["_id"] == "0"
+    assert mock_bulk.call_count == 1
+    assert [hit["_id"] for hit in claimed_hits] == ["1", "2", "3", "4"]
+    assert mock_bulk.call_count == 3
+
+    action = mock_bulk.call_args_list[0].args[1][0]
+    assert action["if_seq_no"] == 1
+    assert action["if_primary_term"] == 1
+    assert action["doc"][es_claim_util.CLAIM_JOB_ID_FIELD] == "job1"
+
+
+def test_claim_all_skips_groups_claimed_by_other_jobs(monkeypatch):
+    mock_bulk = MagicMock(side_effect=[(2, [to_conflict("a2")]), (1, [])])
+    monkeypatch.setattr(es_claim_util, "bulk", mock_bulk)
+
+    hits = [to_hit("a1", "a"), to_hit("b1", "b"), to_hit("a2", "a")]
+    claimed_hits = list(claim_all(MagicMock(), hits, "job1", group_key=lambda hit: hit["_source"]["granule_id"]))
+
+    assert [hit["_id"] for hit in claimed_hits] == ["b1"]
+    # the part of the group claimed by this job is released
+    released_actions = mock_bulk.call_args_list[1].args[1]
+    assert [action["_id"] for action in released_actions] == ["a1"]
+    assert released_actions[0]["doc"][es_claim_util.CLAIM_EXPIRY_FIELD] is None
+
+
+def test_claim_all_between_claims_interleaved_granules_whole(monkeypatch):
+    monkeypatch.setattr(es_conn_util, es_conn_util.get_es_connection.__name__, MagicMock())
+    mock_bulk = MagicMock(return_value=(0, []))
+    monkeypatch.setattr(es_claim_util, "bulk", mock_bulk)
+
+    # the bands of two granules, interleaved in creation order
+    bands = [("a", "B01", 1), ("b", "B01", 1), ("a", "B02", 2), ("b", "B02", 2)]
+    hits = [{**to_hit(f"{granule_id}.{band}", granule_id),
+             "_source": {"granule_id": granule_id, "creation_timestamp": creation_timestamp,
+                         "https_url": f"https://example.com/HLS.S30.T{granule_id}.v2.0.{band}.tif"}}
+            for granule_id, band, creation_timestamp in bands]
+
+    def mock_search_all(es, index, body, **kwargs):
+        # emulate the sort done by Elasticsearch
+        sort_fields = [next(iter(sort)) for sort in body["sort"]]
+        return iter(sorted(hits, key=lambda hit: [hit["_source"][field] for field in sort_fields]))
+    monkeypatch.setattr(hls_catalog, "search_all", mock_search_all)
+
+    claimed = hls_catalog.HLSProductCatalog().claim_all_between(
+        datetime(2023, 1, 1), datetime(2023, 1, 2), False, "job1", group_key=_to_granule_id, claim_size=1)
+
+    assert [_to_granule_id(doc) for doc in claimed] == ["HLS.S30.Ta.v2.0"] * 2 + ["HLS.S30.Tb.v2.0"] * 2
+    # each granule is claimed in a single slice
+    assert [[action["_id"] for action in call.args[1]] for call in mock_bulk.call_args_list] == \
+           [["a.B01", "a.B02"], ["b.B01", "b.B02"]]
@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock
+
+from elasticsearch import NotFoundError
+
+from data_subscriber.es_search_util import search_all
+
+
+def to_hit(i, timestamp):
+    return {"_id": str(i), "_source": {"i": i}, "sort": [timestamp, i]}
+
+
+def to_response(hits):
+    return {"pit_id": "pit", "hits": {"hits": hits}}
+
+
+def test_search_all_pages_lazily():
+    mock_es = MagicMock()
+    mock_es.open_point_in_time.return_value = {"id": "pit"}
+    mock_es.search.side_effect = [
+        to_response([to_hit(0, 0), to_hit(1, 1)]),
+        to_response([to_hit(2, 2)])
+    ]
+
+    hits = search_all(mock_es, "index", {"sort": [{"creation_timestamp": "asc"}]}, page_size=2)
+    mock_es.search.assert_not_called()
+
+    assert [hit["_id"] for hit in hits] == ["0", "1", "2"]
+    assert mock_es.search.call_args_list[0].kwargs["body"]["size"] == 2
+    assert "search_after" not in mock_es.search.call_args_list[0].kwargs["body"]
+    assert mock_es.search.call_args_list[1].kwargs["body"]["search_after"] == [1, 1]
+    mock_es.close_point_in_time.assert_called_once_with(body={"id": "pit"})
+
+
+def test_search_all_resumes_after_expired_point_in_time():
+    mock_es = MagicMock()
+    mock_es.open_point_in_time.return_value = {"id": "pit"}
+    mock_es.search.side_effect = [
+        to_response([to_hit(0, 0), to_hit(1, 1)]),
+        NotFoundError(404, "search_context_missing_exception", {}),
+        # the new PIT resumes at the first hit with the last hit's timestamp
+        to_response([to_hit(1, 1), to_hit(2, 1)]),
+        to_response([])
+    ]
+
+    hits = list(search_all(mock_es, "index", {"sort": [{"creation_timestamp": "asc"}]}, page_size=2))
+
+    assert [hit["_id"] for hit in hits] == ["0", "1", "2"]
+    assert mock_es.open_point_in_time.call_count == 2
+    assert mock_es.search.call_args_list[2].kwargs["body"]["search_after"] == [1, -1]
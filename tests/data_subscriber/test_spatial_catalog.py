@@ -0,0 +1,47 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from data_subscriber import es_conn_util
+from data_subscriber.hls_spatial import hls_spatial_catalog
+from data_subscriber.slc_spatial import slc_spatial_catalog
+
+
+@pytest.mark.parametrize("catalog_module, catalog_class", [
+    (hls_spatial_catalog, hls_spatial_catalog.HLSSpatialProductCatalog),
+    (slc_spatial_catalog, slc_spatial_catalog.SLCSpatialProductCatalog)
+])
+def test_process_granules_ignores_existing_granules(monkeypatch, catalog_module, catalog_class):
+    monkeypatch.setattr(es_conn_util, es_conn_util.get_es_connection.__name__, MagicMock())
+    existing_error = {"create": {"_id": "granule2", "status": 409, "error": {"type": "version_conflict_engine_exception"}}}
+    other_error = {"create": {"_id": "granule3", "status": 400, "error": {"type": "mapper_parsing_exception"}}}
+    mock_bulk = MagicMock(return_value=(1, [existing_error, other_error]))
+    monkeypatch.setattr(catalog_module, catalog_module.bulk.__name__, mock_bulk)
+
+    granules = [
+        {
+            "granule_id": f"granule{i}",
+            "provider": "dummy_provider",
+            "production_datetime": "2023-01-01T00:00:00.000Z",
+            "short_name": "dummy_short_name",
+            "identifier": "dummy_identifier",
+            "bounding_box": []
+        }
+        for i in range(1, 4)
+    ]
+
+    failures = catalog_class().process_granules(granules)
+
+    mock_bulk.assert_called_once()
+    actions = mock_bulk.call_args.args[1]
+    assert [action["_op_type"] for action in actions] == ["create"] * 3
+    assert failures == [other_error]
+
+
+def test_process_granules_empty(monkeypatch):
+    monkeypatch.setattr(es_conn_util, es_conn_util.get_es_connection.__name__, MagicMock())
+    mock_bulk = MagicMock()
+    monkeypatch.setattr(hls_spatial_catalog, hls_spatial_catalog.bulk.__name__, mock_bulk)
+
+    assert hls_spatial_catalog.HLSSpatialProductCatalog().process_granules([]) == []
+    mock_bulk.assert_not_called()
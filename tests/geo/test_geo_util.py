@@ -1,7 +1,14 @@
-from geo.geo_util import does_bbox_intersect_north_america, Coordinate
-from util.geo_util import polygon_from_bounding_box, polygon_from_mgrs_tile
+from geo import geo_util
+from geo.geo_util import does_bbox_intersect_north_america, do_bboxes_intersect_north_america, Coordinate
+from util.geo_util import (check_dateline, epsg_from_polygon, point2epsg, points2epsg, polygon_from_bounding_box,
+                           polygon_from_mgrs_tile)
 
-from shapely.geometry import Polygon
+from unittest.mock import MagicMock
+
+import numpy as np
+import shapely
+from shapely import affinity
+from shapely.geometry import Polygon, box
 
 def test_bbox_not_in_north_america():
     # random bbox from CMR
@@ -27,6 +34,73 @@ def test_bbox_in_north_america():
     ]
     assert does_bbox_intersect_north_america(bbox)
 
+def test_bboxes_in_north_america():
+    # random bbox from CMR, Colorado bbox, bbox over the Indian Ocean
+    bboxes: list[list[Coordinate]] = [
+        [
+            {"lon": -91.324852, "lat": 11.026079},
+            {"lon": -90.954483, "lat": 9.222121},
+            {"lon": -88.683533, "lat": 9.676103},
+            {"lon": -89.040413, "lat": 11.475266},
+            {"lon": -91.324852, "lat": 11.026079}
+        ],
+        [
+            {"lon": -109.060253, "lat": 36.992426},
+            {"lon": -109.060253, "lat": 41.003444},
+            {"lon": -102.041524, "lat": 41.003444},
+            {"lon": -102.041524, "lat": 36.992426},
+            {"lon": -109.060253, "lat": 36.992426}
+        ],
+        [
+            {"lon": 70.0, "lat": -20.0},
+            {"lon": 70.0, "lat": -18.0},
+            {"lon": 72.0, "lat": -18.0},
+            {"lon": 72.0, "lat": -20.0},
+            {"lon": 70.0, "lat": -20.0}
+        ]
+    ]
+    assert do_bboxes_intersect_north_america(bboxes) == [False, True, False]
+
+
+def test_bboxes_in_north_america_empty():
+    assert do_bboxes_intersect_north_america([]) == []
+    assert not does_bbox_intersect_north_america([])
+
+
+def test_degenerate_bboxes_in_north_america():
+    point = Coordinate(lat=40.0, lon=-100.0)
+    other_point = Coordinate(lat=41.0, lon=-101.0)
+
+    assert do_bboxes_intersect_north_america([[point], [point, other_point], [point, other_point, point]]) == \
+           [False, False, False]
+
+
+def test_north_america_opera_wkb_cache(tmp_path):
+    cache_path = tmp_path / "north_america_opera.wkb"
+    na_geoms = geo_util._load_north_america_opera_geojson_geometries()
+    geojson_digest = geo_util._hash_north_america_opera_geojson()
+
+    assert geo_util._load_north_america_opera_wkb_cache(geojson_digest, path=cache_path) is None
+
+    geo_util._write_north_america_opera_wkb_cache(na_geoms, geojson_digest, path=cache_path)
+    cached_na_geoms = geo_util._load_north_america_opera_wkb_cache(geojson_digest, path=cache_path)
+    assert len(cached_na_geoms) == len(na_geoms)
+    assert all(shapely.equals_exact(cached_na_geoms, na_geoms))
+
+    # cache built from a different GeoJSON file
+    assert geo_util._load_north_america_opera_wkb_cache(bytes(32), path=cache_path) is None
+
+
+def test_north_america_opera_geometries_without_wkb_cache(monkeypatch):
+    monkeypatch.setattr(geo_util, "_load_north_america_opera_wkb_cache", lambda geojson_digest: None)
+    mock_write = MagicMock()
+    monkeypatch.setattr(geo_util, "_write_north_america_opera_wkb_cache", mock_write)
+
+    assert len(geo_util._load_north_america_opera_geometries()) > 0
+    # the cache is only built at image build time
+    mock_write.assert_not_called()
+
+
 def test_polygon_from_bounding_box():
     # bbox obtained from S1A_IW_SLC__1SDH_20230628T122459_20230628T122529_049186_05EA1E_AD77
     bounding_box = [-77.210869, 81.085464, -55.746243, 83.767433]
@@ -59,4 +133,19 @@ def test_polygon_from_mgrs_tile_nominal_antimeridian():
                                         xmax= 178.82637550795243,
                                         ymax=63.16076767648831)
 
-    assert poly == expected_poly
\ No newline at end of file
+    assert poly == expected_poly
+
+def test_points2epsg_matches_point2epsg():
+    lons = np.array([-179.5, -3.1, 0.0, 3.1, 179.5, 180.0, 185.0, 10.0, 10.0])
+    lats = np.array([10.0, -10.0, 45.0, -45.0, 10.0, 10.0, -10.0, 75.0, -75.0])
+
+    assert list(points2epsg(lons, lats)) == [point2epsg(lon, lat) for lon, lat in zip(lons, lats)]
+
+def test_epsg_from_polygon():
+    # rectangle straddling UTM zones 30 and 31, the majority of which lies in zone 31
+    assert epsg_from_polygon([box(-2.0, 40.0, 4.0, 46.0)]) == [32631]
+    # the same rectangle rotated, and split at the dateline
+    assert epsg_from_polygon([affinity.rotate(box(-2.0, 40.0, 4.0, 46.0), 30)]) == [32631]
+    assert sorted(epsg_from_polygon(check_dateline(box(179.0, -51.0, 181.0, -50.0)))) == [32701, 32760]
+    # polar regions
+    assert epsg_from_polygon([box(10.0, 76.0, 20.0, 80.0), box(10.0, -80.0, 20.0, -76.0)]) == [3413, 3031]
@@ -0,0 +1,52 @@
+from unittest.mock import MagicMock
+
+from tools import harvest_orbit_catalog
+from tools.orbit_catalog import OrbitCatalog
+
+POEORB_FILE_NAME = "S1A_OPER_AUX_POEORB_OPOD_20230121T080000_V20221231T225942_20230102T005942.EOF"
+NEXT_POEORB_FILE_NAME = "S1A_OPER_AUX_POEORB_OPOD_20230122T080000_V20230101T225942_20230103T005942.EOF"
+REPROCESSED_POEORB_FILE_NAME = "S1A_OPER_AUX_POEORB_OPOD_20230125T080000_V20221231T225942_20230102T005942.EOF"
+
+
+def to_query_response(orbit_file_names):
+    entries = "".join(
+        f'<entry><id>{orbit_file_name[25:40]}</id><str name="filename">{orbit_file_name}</str></entry>'
+        for orbit_file_name in orbit_file_names
+    )
+    return (f'<feed xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+            f'<opensearch:totalResults>{len(orbit_file_names)}</opensearch:totalResults>{entries}</feed>')
+
+
+def test_find_covering(tmp_path):
+    catalog = OrbitCatalog(tmp_path / "catalog.sqlite3")
+    assert catalog.add([(POEORB_FILE_NAME, "1"), (NEXT_POEORB_FILE_NAME, "2"), ("not_an_orbit_file.EOF", "3")]) == 2
+
+    assert catalog.find_covering("S1A", "POEORB", "20230101T120000", "20230101T120100") == (POEORB_FILE_NAME, "1")
+    assert catalog.find_covering("S1A", "POEORB", "20230102T120000", "20230102T120100") == (NEXT_POEORB_FILE_NAME, "2")
+    assert catalog.find_covering("S1A", "POEORB", "20230103T120000", "20230103T120100") is None
+    assert catalog.find_covering("S1A", "RESORB", "20230101T120000", "20230101T120100") is None
+    assert catalog.find_covering("S1B", "POEORB", "20230101T120000", "20230101T120100") is None
+
+    # the most recently created Orbit file is preferred
+    catalog.add([(REPROCESSED_POEORB_FILE_NAME, "4")])
+    assert catalog.find_covering("S1A", "POEORB", "20230101T120000", "20230101T120100") == (REPROCESSED_POEORB_FILE_NAME, "4")
+
+
+def test_harvest_pages_and_resumes(tmp_path, monkeypatch):
+    mock_query_orbit_file_service = MagicMock(side_effect=[
+        to_query_response([POEORB_FILE_NAME, REPROCESSED_POEORB_FILE_NAME]),
+        to_query_response([NEXT_POEORB_FILE_NAME])
+    ])
+    monkeypatch.setattr(harvest_orbit_catalog, "query_orbit_file_service", mock_query_orbit_file_service)
+    catalog = OrbitCatalog(tmp_path / "catalog.sqlite3")
+
+    assert harvest_orbit_catalog.harvest(catalog, "S1A", "POEORB", "endpoint", "user", "pass", page_size=2) == 3
+
+    assert [call.kwargs["start"] for call in mock_query_orbit_file_service.call_args_list] == [0, 2]
+    assert "beginPosition:[2014-04-03T00:00:00.000000Z TO NOW]" in mock_query_orbit_file_service.call_args.args[1]
+    assert catalog.get_latest_valid_start_time("S1A", "POEORB") == "20230101T225942"
+
+    # harvesting again resumes from the latest Orbit file, less the overlap
+    mock_query_orbit_file_service.side_effect = [to_query_response([])]
+    assert harvest_orbit_catalog.harvest(catalog, "S1A", "POEORB", "endpoint", "user", "pass") == 0
+    assert "beginPosition:[2022-12-30T22:59:42.000000Z TO NOW]" in mock_query_orbit_file_service.call_args.args[1]
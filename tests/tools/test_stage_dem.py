@@ -0,0 +1,26 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from tools import stage_dem
+
+
+def test_check_aws_connection_heads_global_dem(monkeypatch):
+    mock_obj = MagicMock(bucket_name="opera-dem", key="EPSG4326/EPSG4326.vrt", e_tag='"etag"')
+    mock_s3 = MagicMock(Object=MagicMock(return_value=mock_obj))
+    monkeypatch.setattr(stage_dem.boto3, "resource", MagicMock(return_value=mock_s3))
+
+    assert stage_dem.check_aws_connection("opera-dem") == '"etag"'
+
+    mock_obj.load.assert_called_once()
+    mock_obj.get.assert_not_called()
+
+
+def test_check_aws_connection_raises_without_access(monkeypatch):
+    mock_obj = MagicMock(bucket_name="opera-dem", key="EPSG4326/EPSG4326.vrt")
+    mock_obj.load.side_effect = Exception("403")
+    mock_s3 = MagicMock(Object=MagicMock(return_value=mock_obj))
+    monkeypatch.setattr(stage_dem.boto3, "resource", MagicMock(return_value=mock_s3))
+
+    with pytest.raises(RuntimeError):
+        stage_dem.check_aws_connection("opera-dem")
@@ -0,0 +1,54 @@
+import os
+import time
+
+from util.cmr_cache_util import CmrResponseCache
+
+
+def test_to_key_normalizes_params():
+    key = CmrResponseCache.to_key("https://cmr.example.com", {"b": 2, "a": 1, "token": "secret"})
+
+    assert key == CmrResponseCache.to_key("https://cmr.example.com", {"a": 1, "b": 2, "token": "other"})
+    assert key == CmrResponseCache.to_key("https://cmr.example.com", "b=2&a=1")
+    assert key != CmrResponseCache.to_key("https://cmr.example.com", {"a": 1, "b": 3})
+
+
+def test_put_get(tmp_path):
+    cache = CmrResponseCache(tmp_path)
+    cache.put("key", [[{"id": 1}, {"id": 2}], [{"id": 3}]])
+
+    assert list(cache.get("key")) == [[{"id": 1}, {"id": 2}], [{"id": 3}]]
+    assert cache.get("missing") is None
+
+
+def test_get_expired(tmp_path):
+    cache = CmrResponseCache(tmp_path, ttl_seconds=60)
+    cache.put("key", [[{"id": 1}]])
+
+    an_hour_ago = time.time() - 3600
+    os.utime(tmp_path / "key.jsonl.gz", times=(an_hour_ago, an_hour_ago))
+
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.jsonl.gz").exists()
+
+
+def test_writer_abort(tmp_path):
+    cache = CmrResponseCache(tmp_path)
+    writer = cache.writer("key")
+    writer.append([{"id": 1}])
+    writer.abort()
+
+    assert cache.get("key") is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = CmrResponseCache(tmp_path)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, [[{"id": "x" * 1000}]])
+        os.utime(tmp_path / f"{key}.jsonl.gz", times=(time.time() - 300 + i, time.time()))
+    list(cache.get("a"))  # most recently used
+
+    cache.max_size_bytes = 2 * (tmp_path / "a.jsonl.gz").stat().st_size
+    cache.evict()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.jsonl.gz", "c.jsonl.gz"]
@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from util.dem_cache_util import DemCache, to_dem_cache_key
+
+
+def fill_dem(contents):
+    def fill(fill_dir):
+        dem_list = []
+        for idx, content in enumerate(contents):
+            dem_filepath = fill_dir / f"tile_{idx}.tif"
+            dem_filepath.write_text(content)
+            dem_list.append(str(dem_filepath))
+        return dem_list
+    return MagicMock(side_effect=fill)
+
+
+def test_to_dem_cache_key():
+    key = to_dem_cache_key("T15SXR", None, 50, "opera-dem", '"etag"')
+
+    assert key == to_dem_cache_key("T15SXR", [], 50, "opera-dem", '"etag"')
+    assert key != to_dem_cache_key("T15SXS", None, 50, "opera-dem", '"etag"')
+    assert key != to_dem_cache_key("T15SXR", None, 100, "opera-dem", '"etag"')
+    assert key != to_dem_cache_key("T15SXR", None, 50, "opera-dem", '"new_etag"')
+    # the bounding box takes precedence over the tile code
+    assert to_dem_cache_key("T15SXR", [-120, 34, -119, 35], 50, "opera-dem", None) == \
+           to_dem_cache_key(None, [-120.0, 34.0, -119.0, 35.0], 50, "opera-dem", None)
+
+
+def test_stage_fills_once(tmp_path):
+    cache = DemCache(tmp_path / "cache")
+    fill = fill_dem(["east", "west"])
+
+    for job_dir in (tmp_path / "job1", tmp_path / "job2"):
+        job_dir.mkdir()
+        dem_list = cache.stage("key", fill, str(job_dir / "dem"))
+
+        assert dem_list == [str(job_dir / "dem_0.tif"), str(job_dir / "dem_1.tif")]
+        assert [Path(dem_filepath).read_text() for dem_filepath in dem_list] == ["east", "west"]
+
+    fill.assert_called_once()
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = DemCache(tmp_path / "cache", max_size_bytes=9)
+    (tmp_path / "job").mkdir()
+    file_prefix = str(tmp_path / "job" / "dem")
+
+    cache.stage("old", fill_dem(["old"]), file_prefix)
+    os.utime(tmp_path / "cache" / "old", times=(0, 0))
+    cache.stage("recent", fill_dem(["recent"]), file_prefix)
+    cache.stage("new", fill_dem(["new"]), file_prefix)
+
+    assert sorted(path.name for path in (tmp_path / "cache").iterdir() if not path.name.startswith(".")) == \
+           ["new", "recent"]
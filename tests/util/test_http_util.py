@@ -0,0 +1,32 @@
+import requests
+
+from util import http_util
+
+
+def test_jittered_retry_backoff_is_bounded():
+    retry = http_util.JitteredRetry(total=5, backoff_factor=1).increment().increment().increment()
+
+    for _ in range(100):
+        assert 0 <= retry.get_backoff_time() <= 4
+
+
+def test_mount_pooled_adapters():
+    session = http_util.mount_pooled_adapters(requests.Session(), pool_maxsize=20, max_retries=3)
+
+    adapter = session.get_adapter("https://cmr.earthdata.nasa.gov")
+    assert adapter._pool_maxsize == 20
+    assert adapter.max_retries.total == 3
+    assert isinstance(adapter.max_retries, http_util.JitteredRetry)
+    assert session.get_adapter("http://example.com") is adapter
+
+
+def test_get_session_shares_only_connection_pools():
+    session = http_util.get_session()
+    session.cookies.set("session_id", "secret", domain="urs.earthdata.nasa.gov")
+    other_session = http_util.get_session()
+
+    assert other_session is not session
+    assert not other_session.cookies
+    assert other_session.get_adapter("https://cmr.earthdata.nasa.gov") is session.get_adapter("https://example.com")
+    assert http_util.get_session(pool_maxsize=1).get_adapter("https://example.com") is not \
+           session.get_adapter("https://example.com")
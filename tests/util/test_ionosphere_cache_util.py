@@ -0,0 +1,35 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from util.ionosphere_cache_util import IonosphereFileCache
+
+
+def fill_with(contents):
+    def fill(output_dir):
+        path = output_dir / "downloaded"
+        path.write_text(contents)
+        return path
+    return MagicMock(side_effect=fill)
+
+
+def test_get_or_fill_fills_once(tmp_path):
+    cache = IonosphereFileCache(tmp_path)
+    fill = fill_with("tec")
+
+    path = cache.get_or_fill("jplg0010.23i", fill)
+    cached_path = cache.get_or_fill("jplg0010.23i", fill)
+
+    fill.assert_called_once()
+    assert path == cached_path == tmp_path / "jplg0010.23i"
+    assert path.read_text() == "tec"
+
+
+def test_get_or_fill_propagates_fill_failure(tmp_path):
+    cache = IonosphereFileCache(tmp_path)
+
+    with pytest.raises(FileNotFoundError):
+        cache.get_or_fill("jplg0010.23i", MagicMock(side_effect=FileNotFoundError()))
+
+    assert not (tmp_path / "jplg0010.23i").exists()
+    assert cache.get_or_fill("jplg0010.23i", fill_with("tec")).read_text() == "tec"
@@ -0,0 +1,50 @@
+import os
+import time
+from datetime import datetime
+
+from util.orbit_cache_util import OrbitFileCache, OrbitFileIndex, parse_orbit_file_name
+
+POEORB_FILE_NAME = "S1A_OPER_AUX_POEORB_OPOD_20230121T080000_V20221231T225942_20230102T005942.EOF"
+NEXT_POEORB_FILE_NAME = "S1A_OPER_AUX_POEORB_OPOD_20230122T080000_V20230101T225942_20230103T005942.EOF"
+
+
+def test_index_find_covering():
+    index = OrbitFileIndex()
+    for orbit_file_name in (POEORB_FILE_NAME, NEXT_POEORB_FILE_NAME):
+        index.add(parse_orbit_file_name(orbit_file_name)[2])
+
+    assert index.find_covering(datetime(2023, 1, 1, 12), datetime(2023, 1, 1, 12, 1)).name == POEORB_FILE_NAME
+    assert index.find_covering(datetime(2023, 1, 2, 12), datetime(2023, 1, 2, 12, 1)).name == NEXT_POEORB_FILE_NAME
+    assert index.find_covering(datetime(2023, 1, 3, 12), datetime(2023, 1, 3, 12, 1)) is None
+
+
+def test_put_get(tmp_path):
+    orbit_filepath = tmp_path / POEORB_FILE_NAME
+    orbit_filepath.write_text("orbit")
+    cache = OrbitFileCache(tmp_path / "cache")
+
+    cached_orbit_filepath = cache.put(orbit_filepath)
+
+    assert cached_orbit_filepath.read_text() == "orbit"
+    assert cache.get("S1A", "POEORB", datetime(2023, 1, 1), datetime(2023, 1, 1, 0, 1)) == cached_orbit_filepath
+    assert cache.get("S1B", "POEORB", datetime(2023, 1, 1), datetime(2023, 1, 1, 0, 1)) is None
+    assert cache.get("S1A", "RESORB", datetime(2023, 1, 1), datetime(2023, 1, 1, 0, 1)) is None
+
+
+def test_get_cached_by_another_job(tmp_path):
+    cache = OrbitFileCache(tmp_path)
+    (tmp_path / POEORB_FILE_NAME).write_text("orbit")
+
+    assert cache.get("S1A", "POEORB", datetime(2023, 1, 1), datetime(2023, 1, 1, 0, 1)) == tmp_path / POEORB_FILE_NAME
+
+
+def test_evict_expired(tmp_path):
+    cache = OrbitFileCache(tmp_path, max_age_seconds=60)
+    (tmp_path / POEORB_FILE_NAME).write_text("orbit")
+
+    an_hour_ago = time.time() - 3600
+    os.utime(tmp_path / POEORB_FILE_NAME, times=(an_hour_ago, an_hour_ago))
+    cache.evict()
+
+    assert cache.get("S1A", "POEORB", datetime(2023, 1, 1), datetime(2023, 1, 1, 0, 1)) is None
+    assert not (tmp_path / POEORB_FILE_NAME).exists()
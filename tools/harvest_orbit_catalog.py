@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+"""
+========================
+harvest_orbit_catalog.py
+========================
+
+Script to harvest the listing of available Orbit Ephemeris files from the
+SciHub query service into a local Orbit catalog, for use with the --catalog
+option of stage_orbit_file.py.
+
+Harvesting is incremental: unless a start date is provided, only the Orbit
+files whose validity starts after those already in the catalog (less some
+overlap, for late-published files) are queried for.
+
+Harvesting is a manual (or cron-scheduled) step, not run by any PCM job. The
+catalog must be harvested at the ORBIT_CATALOG_PATH setting on each worker
+before that setting is enabled, e.g.:
+
+    python -m tools.harvest_orbit_catalog --catalog=/tmp/opera_orbit_catalog.sqlite3
+
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+from commons.logger import logger
+from commons.logger import LogLevels
+from tools.orbit_catalog import OrbitCatalog
+from tools.stage_orbit_file import (DEFAULT_QUERY_ENDPOINT,
+                                    DEFAULT_USERNAME,
+                                    DEFAULT_PASSWORD,
+                                    VALID_ORBIT_TYPES,
+                                    NoQueryResultsException,
+                                    parse_orbit_file_entries,
+                                    parse_orbit_file_query_xml,
+                                    query_orbit_file_service)
+
+DEFAULT_HARVEST_START_DATE = datetime(2014, 4, 3)
+"""Default start of the harvested time range, the launch of Sentinel-1A"""
+
+DEFAULT_HARVEST_OVERLAP = timedelta(days=2)
+"""Overlap with the previously harvested time range, covering late-published Orbit files"""
+
+DEFAULT_PAGE_SIZE = 100
+"""Number of Orbit files requested from the query service at a time, the maximum it allows"""
+
+VALID_MISSION_IDS = ('S1A', 'S1B')
+"""List of the mission IDs that Orbit files may be harvested for"""
+
+
+def get_parser():
+    """Returns the command line parser for harvest_orbit_catalog.py"""
+    parser = argparse.ArgumentParser(
+        description="Harvest the listing of Orbit Ephemeris files from the "
+                    "SciHub query service into a local Orbit catalog."
+    )
+    parser.add_argument("--catalog", type=str, action='store', required=True,
+                        metavar='PATH',
+                        help="Specify the path to the Orbit catalog to harvest "
+                             "into. The catalog is created if it does not exist.")
+    parser.add_argument("--mission", type=str.upper, action='store',
+                        nargs='+', choices=VALID_MISSION_IDS,
+                        default=list(VALID_MISSION_IDS),
+                        help="Specify the mission(s) to harvest Orbit files for.")
+    parser.add_argument("--orbit-type", type=str.upper, action='store',
+                        nargs='+', choices=VALID_ORBIT_TYPES,
+                        default=list(VALID_ORBIT_TYPES),
+                        help="Specify the type(s) of Orbit file to harvest.")
+    parser.add_argument("--start-date", type=datetime.fromisoformat,
+                        action='store', default=None,
+                        help="Specify the start of the validity time range to "
+                             "harvest, in ISO format. If not specified, harvesting "
+                             "resumes from the latest Orbit file in the catalog.")
+    parser.add_argument("--query-endpoint", type=str, action='store',
+                        default=DEFAULT_QUERY_ENDPOINT, metavar='URL',
+                        help="Specify the query service endpoint URL.")
+    parser.add_argument("--username", type=str, action='store',
+                        default=DEFAULT_USERNAME,
+                        help="Specify a username to authenticate the query with.")
+    parser.add_argument("--password", type=str, action='store',
+                        default=DEFAULT_PASSWORD,
+                        help="Specify a password to authenticate the query with.")
+    parser.add_argument("--log-level",
+                        type=lambda log_level: LogLevels[log_level].value,
+                        choices=LogLevels.list(),
+                        default=LogLevels.INFO.value,
+                        help="Specify a logging verbosity level.")
+
+    return parser
+
+
+def construct_harvest_query(mission_id, orbit_type, start_date):
+    """
+    Constructs the query for all Orbit files of a mission and type whose
+    validity starts on or after the provided date.
+
+    Parameters
+    ----------
+    mission_id : str
+        The mission ID to query for, one of S1A or S1B.
+    orbit_type : str
+        The type of Orbit file to query for, one of POEORB or RESORB.
+    start_date : datetime.datetime
+        The earliest validity start time to query for.
+
+    Returns
+    -------
+    query : str
+        The Orbit file query formatted as the payload the query service expects.
+
+    """
+    query_template = (
+        "( beginPosition:[{start_date}Z TO NOW] ) AND "
+        "( (platformname:Sentinel-1 AND filename:{mission_id}_* AND producttype:AUX_{orbit_type}))"
+    )
+
+    query = query_template.format(start_date=start_date.strftime("%Y-%m-%dT%H:%M:%S.%f"),
+                                  mission_id=mission_id,
+                                  orbit_type=orbit_type)
+
+    logger.debug(f'query: {query}')
+
+    return query
+
+
+def harvest(catalog, mission_id, orbit_type, endpoint_url, username, password,
+            start_date=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Harvests the Orbit files of a mission and type into the catalog, paging
+    through the results of the query service.
+
+    Parameters
+    ----------
+    catalog : OrbitCatalog
+        The catalog to harvest into.
+    mission_id : str
+        The mission ID to harvest Orbit files for.
+    orbit_type : str
+        The type of Orbit file to harvest.
+    endpoint_url : str
+        The URL for the query endpoint.
+    username : str
+        The username to authenticate the requests with.
+    password : str
+        The password to authenticate the requests with.
+    start_date : datetime.datetime, optional
+        The earliest validity start time to harvest. If not provided, harvesting
+        resumes from the latest Orbit file in the catalog.
+    page_size : int, optional
+        The number of Orbit files requested at a time.
+
+    Returns
+    -------
+    num_harvested : int
+        The number of Orbit files added to (or updated within) the catalog.
+
+    """
+    if not start_date:
+        latest_valid_start_time = catalog.get_latest_valid_start_time(mission_id, orbit_type)
+
+        if latest_valid_start_time:
+            start_date = datetime.strptime(latest_valid_start_time, "%Y%m%dT%H%M%S") - DEFAULT_HARVEST_OVERLAP
+        else:
+            start_date = DEFAULT_HARVEST_START_DATE
+
+    logger.info(f"Harvesting {mission_id} {orbit_type} Orbit files with validity starting from {start_date}")
+
+    query = construct_harvest_query(mission_id, orbit_type, start_date)
+
+    num_harvested = 0
+    start = 0
+
+    while True:
+        xml_response = query_orbit_file_service(
+            endpoint_url, query, username, password, start=start, rows=page_size
+        )
+
+        try:
+            entry_elems, namespace_map = parse_orbit_file_query_xml(xml_response)
+        except NoQueryResultsException:
+            break
+
+        num_harvested += catalog.add(parse_orbit_file_entries(entry_elems, namespace_map))
+
+        logger.debug(f'num_harvested: {num_harvested}')
+
+        if len(entry_elems) < page_size:
+            break
+
+        start += len(entry_elems)
+
+    logger.info(f"Harvested {num_harvested} {mission_id} {orbit_type} Orbit file(s)")
+
+    return num_harvested
+
+
+def main(args):
+    """
+    Main script to execute Orbit catalog harvesting.
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        Arguments parsed from the command-line.
+
+    """
+    # Set the logging level
+    if args.log_level:
+        LogLevels.set_level(args.log_level)
+
+    catalog = OrbitCatalog(args.catalog)
+
+    for mission_id in args.mission:
+        for orbit_type in args.orbit_type:
+            harvest(catalog, mission_id, orbit_type, args.query_endpoint,
+                    args.username, args.password, start_date=args.start_date)
+
+
+if __name__ == '__main__':
+    parser = get_parser()
+    args = parser.parse_args()
+    main(args)
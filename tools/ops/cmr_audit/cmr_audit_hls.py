@@ -14,6 +14,7 @@ from dotenv import dotenv_values
 
 from tools.ops.cmr_audit.cmr_audit_utils import async_get_cmr_granules
 from tools.ops.cmr_audit.cmr_client import async_cmr_post
+from util.cmr_cache_util import CmrResponseCache
 
 logging.getLogger("compact_json.formatter").setLevel(level=logging.INFO)
 logging.basicConfig(
@@ -51,6 +52,11 @@ def create_parser():
         choices=["txt", "json"],
         help=f'Output file format. Defaults to "%(default)s".'
     )
+    argparser.add_argument(
+        "--cache-dir",
+        help=f'Directory in which to cache CMR search results, so that reruns over the same datetime ranges are '
+             f'served from disk. Cached results expire after a week. Caching is disabled if omitted.'
+    )
     return argparser
 
 
@@ -58,20 +64,20 @@ def create_parser():
 # CMR AUDIT FUNCTIONS
 #######################################################################
 
-async def async_get_cmr_granules_hls_l30(temporal_date_start: str, temporal_date_end: str):
+async def async_get_cmr_granules_hls_l30(temporal_date_start: str, temporal_date_end: str, cache: CmrResponseCache = None):
     return await async_get_cmr_granules(collection_short_name="HLSL30",
                                         temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end,
-                                        platform_short_name="LANDSAT-8")
+                                        platform_short_name="LANDSAT-8", cache=cache)
 
 
-async def async_get_cmr_granules_hls_s30(temporal_date_start: str, temporal_date_end: str):
+async def async_get_cmr_granules_hls_s30(temporal_date_start: str, temporal_date_end: str, cache: CmrResponseCache = None):
     return await async_get_cmr_granules(collection_short_name="HLSS30",
                                         temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end,
-                                        platform_short_name=["Sentinel-2A", "Sentinel-2B"])
+                                        platform_short_name=["Sentinel-2A", "Sentinel-2B"], cache=cache)
 
 
 
-async def async_get_cmr_dswx(dswx_native_id_patterns: set):
+async def async_get_cmr_dswx(dswx_native_id_patterns: set, cache: CmrResponseCache = None):
     logger.debug(f"entry({len(dswx_native_id_patterns)=:,})")
 
     # batch granules-requests due to CMR limitation. 1000 native-id clauses seems to be near the limit.
@@ -92,7 +98,7 @@ async def async_get_cmr_dswx(dswx_native_id_patterns: set):
                 f"{dswx_native_id_patterns_query_params}"
             )
             logger.debug(f"Creating request task {i} of {len(dswx_native_id_pattern_batches)}")
-            post_cmr_tasks.append(async_cmr_post(request_url, request_body, session))
+            post_cmr_tasks.append(async_cmr_post(request_url, request_body, session, cache=cache))
         logger.debug(f"Number of requests to make: {len(post_cmr_tasks)=}")
 
         # issue requests in batches
@@ -188,9 +194,10 @@ async def run(argv: list[str]):
     logger.info("Querying CMR for list of expected L30 and S30 granules (HLS)")
     cmr_start_dt_str = args.start_datetime
     cmr_end_dt_str = args.end_datetime
+    cache = CmrResponseCache(args.cache_dir) if args.cache_dir else None
 
-    cmr_granules_l30, cmr_granules_l30_details = await async_get_cmr_granules_hls_l30(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str)
-    cmr_granules_s30, cmr_granules_s30_details = await async_get_cmr_granules_hls_s30(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str)
+    cmr_granules_l30, cmr_granules_l30_details = await async_get_cmr_granules_hls_l30(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str, cache=cache)
+    cmr_granules_s30, cmr_granules_s30_details = await async_get_cmr_granules_hls_s30(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str, cache=cache)
 
     cmr_granules_hls = cmr_granules_l30.union(cmr_granules_s30)
     cmr_granules_details = {}; cmr_granules_details.update(cmr_granules_l30_details); cmr_granules_details.update(cmr_granules_s30_details)
@@ -203,7 +210,7 @@ async def run(argv: list[str]):
     )
 
     logger.info("Querying CMR for list of expected DSWx granules")
-    cmr_dswx_products = await async_get_cmr_dswx(dswx_native_id_patterns)
+    cmr_dswx_products = await async_get_cmr_dswx(dswx_native_id_patterns, cache=cache)
 
     cmr_dswx_prefix_expected = {prefix[:-1] for prefix in dswx_native_id_patterns}
     cmr_dswx_prefix_actual = dswx_native_ids_to_prefixes(cmr_dswx_products)
@@ -1,6 +1,5 @@
 import argparse
 import asyncio
-import concurrent.futures
 import functools
 import logging
 import os
@@ -17,9 +16,10 @@ import more_itertools
 from dotenv import dotenv_values
 from more_itertools import always_iterable
 
-from geo.geo_util import does_bbox_intersect_north_america
+from geo.geo_util import do_bboxes_intersect_north_america
 from tools.ops.cmr_audit.cmr_audit_utils import async_get_cmr_granules
 from tools.ops.cmr_audit.cmr_client import async_cmr_post
+from util.cmr_cache_util import CmrResponseCache
 
 logging.getLogger("compact_json.formatter").setLevel(level=logging.INFO)
 logging.getLogger("geo.geo_util").setLevel(level=logging.WARNING)
@@ -58,6 +58,11 @@ def create_parser():
         choices=["txt", "json"],
         help=f'Output file format. Defaults to "%(default)s".'
     )
+    argparser.add_argument(
+        "--cache-dir",
+        help=f'Directory in which to cache CMR search results, so that reruns over the same datetime ranges are '
+             f'served from disk. Cached results expire after a week. Caching is disabled if omitted.'
+    )
     return argparser
 
 
@@ -65,33 +70,34 @@ def create_parser():
 # CMR AUDIT FUNCTIONS
 #######################################################################
 
-async def async_get_cmr_granules_slc_s1a(temporal_date_start: str, temporal_date_end: str):
+async def async_get_cmr_granules_slc_s1a(temporal_date_start: str, temporal_date_end: str, cache: CmrResponseCache = None):
     return await async_get_cmr_granules("SENTINEL-1A_SLC",
                                   temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end,
-                                  platform_short_name="SENTINEL-1A")
+                                  platform_short_name="SENTINEL-1A", cache=cache)
 
 
-async def async_get_cmr_granules_slc_s1b(temporal_date_start: str, temporal_date_end: str):
+async def async_get_cmr_granules_slc_s1b(temporal_date_start: str, temporal_date_end: str, cache: CmrResponseCache = None):
     return await async_get_cmr_granules("SENTINEL-1B_SLC",
                                   temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end,
-                                  platform_short_name="SENTINEL-1B")
+                                  platform_short_name="SENTINEL-1B", cache=cache)
 
 
-async def async_get_cmr_cslc(cslc_native_id_patterns: set, temporal_date_start: str, temporal_date_end: str):
+async def async_get_cmr_cslc(cslc_native_id_patterns: set, temporal_date_start: str, temporal_date_end: str, cache: CmrResponseCache = None):
     return await async_get_cmr(cslc_native_id_patterns, collection_short_name="OPERA_CSLC_S1", collection_concept_id="C1257337155-ASF",
-                               temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end)
+                               temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end, cache=cache)
 
 
-async def async_get_cmr_rtc(rtc_native_id_patterns: set, temporal_date_start: str, temporal_date_end: str):
+async def async_get_cmr_rtc(rtc_native_id_patterns: set, temporal_date_start: str, temporal_date_end: str, cache: CmrResponseCache = None):
     return await async_get_cmr(rtc_native_id_patterns, collection_short_name="OPERA_RTC_S1", collection_concept_id="C1257337044-ASF",
-                               temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end)
+                               temporal_date_start=temporal_date_start, temporal_date_end=temporal_date_end, cache=cache)
 
 
 async def async_get_cmr(
         native_id_patterns: set,
         collection_short_name: Union[str, Iterable[str]],
         collection_concept_id: str,
-        temporal_date_start: str, temporal_date_end: str):
+        temporal_date_start: str, temporal_date_end: str,
+        cache: CmrResponseCache = None):
     logger.debug(f"entry({len(native_id_patterns)=:,})")
 
     # batch granules-requests due to CMR limitation. 1000 native-id clauses seems to be near the limit.
@@ -117,7 +123,7 @@ async def async_get_cmr(
                 f"&temporal[]={urllib.parse.quote(temporal_date_start, safe='/:')},{urllib.parse.quote(temporal_date_end, safe='/:')}"
             )
             logger.debug(f"Creating request task {i} of {len(native_id_pattern_batches)}")
-            post_cmr_tasks.append(async_cmr_post(request_url, request_body, session))
+            post_cmr_tasks.append(async_cmr_post(request_url, request_body, session, cache=cache))
         logger.debug(f"Number of requests to make: {len(post_cmr_tasks)=}")
 
         # issue requests in batches
@@ -238,9 +244,10 @@ async def run(argv: list[str]):
     logger.info("Querying CMR for list of expected SLC granules")
     cmr_start_dt_str = args.start_datetime
     cmr_end_dt_str = args.end_datetime
+    cache = CmrResponseCache(args.cache_dir) if args.cache_dir else None
 
-    cmr_granules_slc_s1a, cmr_granules_slc_s1a_details = await async_get_cmr_granules_slc_s1a(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str)
-    cmr_granules_slc_s1b, cmr_granules_slc_s1b_details = await async_get_cmr_granules_slc_s1b(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str)
+    cmr_granules_slc_s1a, cmr_granules_slc_s1a_details = await async_get_cmr_granules_slc_s1a(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str, cache=cache)
+    cmr_granules_slc_s1b, cmr_granules_slc_s1b_details = await async_get_cmr_granules_slc_s1b(temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str, cache=cache)
 
     cmr_granules_slc = cmr_granules_slc_s1a.union(cmr_granules_slc_s1b)
     cmr_granules_slc_details = {}; cmr_granules_slc_details.update(cmr_granules_slc_s1a_details); cmr_granules_slc_details.update(cmr_granules_slc_s1b_details)
@@ -248,21 +255,18 @@ async def run(argv: list[str]):
     logger.info("Filtering North America granules")
     cmr_granules_slc_na = set()
     cmr_granules_slc_details_na = {}
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        does_bbox_intersect_north_america([])  # DEV: optimization to force initial cache load of geojson file
-        future_to_granule_map = {}
-        for granule_id, granule_details in cmr_granules_slc_details.items():
-            bounding_box = [
-                {"lat": point["Latitude"], "lon": point["Longitude"]}
-                for point in granule_details["umm"]["SpatialExtent"]["HorizontalSpatialDomain"]["Geometry"]["GPolygons"][0]["Boundary"]["Points"]
-            ]
-            future_to_granule_map[executor.submit(does_bbox_intersect_north_america, bbox=bounding_box)] = (granule_id, granule_details)
-        for future in concurrent.futures.as_completed(future_to_granule_map):
-            is_granule_in_na = future.result()
-            if is_granule_in_na:
-                granule_id, granule_details = future_to_granule_map[future]
-                cmr_granules_slc_na.add(granule_id)
-                cmr_granules_slc_details_na[granule_id] = granule_details
+    granule_ids = list(cmr_granules_slc_details)
+    bounding_boxes = [
+        [
+            {"lat": point["Latitude"], "lon": point["Longitude"]}
+            for point in cmr_granules_slc_details[granule_id]["umm"]["SpatialExtent"]["HorizontalSpatialDomain"]["Geometry"]["GPolygons"][0]["Boundary"]["Points"]
+        ]
+        for granule_id in granule_ids
+    ]
+    for granule_id, is_granule_in_na in zip(granule_ids, do_bboxes_intersect_north_america(bounding_boxes)):
+        if is_granule_in_na:
+            cmr_granules_slc_na.add(granule_id)
+            cmr_granules_slc_details_na[granule_id] = cmr_granules_slc_details[granule_id]
 
     logger.info(f"Expected CSLC input (granules): {len(cmr_granules_slc_na)=:,}")
     logger.info(f"Expected RTC input (granules): {len(cmr_granules_slc)=:,}")
@@ -280,10 +284,10 @@ async def run(argv: list[str]):
     )
 
     logger.info("Querying CMR for list of expected CSLC granules")
-    cmr_cslc_products = await async_get_cmr_cslc(cslc_native_id_patterns, temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str)
+    cmr_cslc_products = await async_get_cmr_cslc(cslc_native_id_patterns, temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str, cache=cache)
 
     logger.info("Querying CMR for list of expected RTC granules")
-    cmr_rtc_products = await async_get_cmr_rtc(rtc_native_id_patterns, temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str)
+    cmr_rtc_products = await async_get_cmr_rtc(rtc_native_id_patterns, temporal_date_start=cmr_start_dt_str, temporal_date_end=cmr_end_dt_str, cache=cache)
 
     missing_cslc_native_id_patterns = cmr_products_native_id_pattern_diff(cmr_products=cmr_cslc_products, cmr_native_id_patterns=cslc_native_id_patterns)
     missing_rtc_native_id_patterns = cmr_products_native_id_pattern_diff(cmr_products=cmr_rtc_products, cmr_native_id_patterns=rtc_native_id_patterns)
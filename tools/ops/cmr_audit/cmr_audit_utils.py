@@ -13,12 +13,13 @@ from dateutil.rrule import rrule, HOURLY, DAILY
 from more_itertools import always_iterable
 
 from tools.ops.cmr_audit.cmr_client import async_cmr_post
+from util.cmr_cache_util import CmrResponseCache
 
 logger = logging.getLogger(__name__)
 
 
 async def async_get_cmr_granules(collection_short_name, temporal_date_start: str, temporal_date_end: str,
-                                 platform_short_name: Union[str, Iterable[str]]):
+                                 platform_short_name: Union[str, Iterable[str]], cache: CmrResponseCache = None):
     logger.debug(f"entry({collection_short_name=}, {temporal_date_start=}, {temporal_date_end=}, {platform_short_name})")
 
     async with aiohttp.ClientSession() as session:
@@ -59,7 +60,7 @@ async def async_get_cmr_granules(collection_short_name, temporal_date_start: str
 
                 request_body = request_body_supplier(collection_short_name, temporal_date_start=local_start_dt_str, temporal_date_end=local_end_dt_str, platform_short_name=platform_short_name)
                 logger.debug(f"Creating request task for {local_start_dt_str=}, {local_end_dt_str=}")
-                post_cmr_tasks.append(async_cmr_post(request_url, request_body, session))
+                post_cmr_tasks.append(async_cmr_post(request_url, request_body, session, cache=cache))
 
                 if local_end_dt == temporal_end_dt:  # processed last partial hour. prevent further iterations.
                     logger.debug("EDGECASE: processed last partial hour. Preempting")
@@ -5,10 +5,12 @@ from math import ceil
 import aiohttp
 import backoff
 
+from util.cmr_cache_util import CmrResponseCache
+
 logger = logging.getLogger(__name__)
 
 
-async def async_cmr_post(url, data: str, session: aiohttp.ClientSession):
+async def async_cmr_post(url, data: str, session: aiohttp.ClientSession, cache: CmrResponseCache = None):
     page_size = 2000  # default is 10, max is 2000
     data += f"&page_size={page_size}"
 
@@ -16,6 +18,32 @@ async def async_cmr_post(url, data: str, session: aiohttp.ClientSession):
 
     cmr_granules = set()
     cmr_granules_detailed = {}
+
+    if cache:
+        cache_key = cache.to_key(url, data)
+        cached_pages = cache.get(cache_key)
+        if cached_pages is not None:
+            for items in cached_pages:
+                cmr_granules.update({item["meta"]["native-id"] for item in items})
+                cmr_granules_detailed.update({item["meta"]["native-id"]: item for item in items})
+            logger.info(f'CMR number of granules (cmr-cache): {len(cmr_granules)=:,}')
+            return cmr_granules, cmr_granules_detailed
+        cache_writer = cache.writer(cache_key)
+    else:
+        cache_writer = None
+
+    try:
+        await _async_cmr_post_pages(url, data, session, page_size, cmr_granules, cmr_granules_detailed, cache_writer)
+    except BaseException:
+        if cache_writer:
+            cache_writer.abort()
+        raise
+
+    return cmr_granules, cmr_granules_detailed
+
+
+async def _async_cmr_post_pages(url, data: str, session: aiohttp.ClientSession, page_size: int,
+                                cmr_granules: set, cmr_granules_detailed: dict, cache_writer=None):
     # page_num, offset (0-based), page_size, sort_key
     # You can not page past the 1 millionth item.
     # Additionally granule queries which do not target a set of collections are limited to paging up to the 10000th item.
@@ -36,6 +64,8 @@ async def async_cmr_post(url, data: str, session: aiohttp.ClientSession):
         logger.debug(f'CMR number of granules (cmr-query-page {current_page} of {ceil(response_json["hits"]/page_size)}): {len(response_json["items"])=:,}')
         cmr_granules.update({item["meta"]["native-id"] for item in response_json["items"]})
         cmr_granules_detailed.update({item["meta"]["native-id"]: item for item in response_json["items"]})  # DEV: uncomment as needed
+        if cache_writer:
+            cache_writer.append(response_json["items"])
 
         cmr_search_after = response.headers.get("CMR-Search-After")
         logger.debug(f"{cmr_search_after=}")
@@ -44,13 +74,15 @@ async def async_cmr_post(url, data: str, session: aiohttp.ClientSession):
 
         if len(response_json["items"]) < page_size:
             logger.debug("Reached end of CMR search results. Ending query.")
+            if cache_writer:
+                cache_writer.commit()
             break
 
         current_page += 1
         if not current_page <= max_pages:
             logger.warning("Reached max pages limit. Not all search results exhausted. Adjust limit or time ranges to process all hits, then re-run this script.")
-
-    return cmr_granules, cmr_granules_detailed
+            if cache_writer:
+                cache_writer.abort()  # incomplete results. don't cache
 
 
 def giveup_cmr_requests(e):
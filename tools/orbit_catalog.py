@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+"""
+================
+orbit_catalog.py
+================
+
+Local SQLite catalog of the Orbit Ephemeris files available from the SciHub
+query service, as harvested by harvest_orbit_catalog.py.
+
+The catalog indexes Orbit files by mission, orbit type and validity interval,
+so that the Orbit file covering the time range of an SLC SAFE archive can be
+selected with an indexed (logarithmic time) local query, rather than a query
+to the remote service.
+
+"""
+
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+
+from commons.logger import logger
+from util.orbit_cache_util import parse_orbit_file_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orbit_files (
+    orbit_file_name TEXT PRIMARY KEY,
+    request_id TEXT NOT NULL,
+    mission_id TEXT NOT NULL,
+    orbit_type TEXT NOT NULL,
+    creation INTEGER NOT NULL,
+    valid_start INTEGER NOT NULL,
+    valid_stop INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orbit_files_validity ON orbit_files (mission_id, orbit_type, valid_start);
+CREATE TABLE IF NOT EXISTS orbit_types (
+    mission_id TEXT NOT NULL,
+    orbit_type TEXT NOT NULL,
+    max_validity INTEGER NOT NULL,
+    PRIMARY KEY (mission_id, orbit_type)
+);
+"""
+"""
+Catalog schema. Times are stored as seconds since the epoch. The longest
+validity interval of each mission and orbit type bounds the range of the
+validity index scanned by a lookup.
+"""
+
+
+def _to_epoch(datetime_obj):
+    """Converts a (naive, UTC) datetime to seconds since the epoch"""
+    return int(datetime_obj.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _parse_timestamp(timestamp):
+    """Parses a YYYYmmddTHHMMSS timestamp"""
+    return datetime.strptime(timestamp, "%Y%m%dT%H%M%S")
+
+
+def _to_timestamp(epoch):
+    """Converts seconds since the epoch to a YYYYmmddTHHMMSS timestamp"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+
+
+class OrbitCatalog:
+    """
+    Local SQLite catalog of Orbit files. A connection is opened per call, so
+    a catalog may be used from multiple threads, and by multiple processes.
+    """
+
+    def __init__(self, catalog_path):
+        self.catalog_path = str(catalog_path)
+
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # sqlite3 connections only commit (or roll back) as context managers, so also close them
+        connection = sqlite3.connect(self.catalog_path, timeout=30)
+        return _ClosingConnection(connection)
+
+    def add(self, orbit_files):
+        """
+        Adds Orbit files to the catalog, replacing any existing entries of the
+        same name.
+
+        Parameters
+        ----------
+        orbit_files : iterable of tuple
+            The file name and the request ID (as used by the download service)
+            of each Orbit file.
+
+        Returns
+        -------
+        num_added : int
+            The number of Orbit files added. Files whose names don't conform to
+            the expected format are skipped.
+
+        """
+        rows = []
+        for orbit_file_name, request_id in orbit_files:
+            parsed = parse_orbit_file_name(orbit_file_name)
+
+            if not parsed:
+                logger.warning(f'Orbit file name {orbit_file_name} does not conform to expected format')
+                continue
+
+            mission_id, orbit_type, orbit_file = parsed
+            rows.append((orbit_file_name, request_id, mission_id, orbit_type, _to_epoch(orbit_file.creation),
+                         _to_epoch(orbit_file.valid_start), _to_epoch(orbit_file.valid_stop)))
+
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO orbit_files VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            connection.executemany(
+                "INSERT INTO orbit_types VALUES (?, ?, ?) ON CONFLICT (mission_id, orbit_type) "
+                "DO UPDATE SET max_validity = MAX(max_validity, excluded.max_validity)",
+                [(mission_id, orbit_type, valid_stop - valid_start)
+                 for _, _, mission_id, orbit_type, _, valid_start, valid_stop in rows]
+            )
+
+        return len(rows)
+
+    def find_covering(self, mission_id, orbit_type, safe_start_time, safe_stop_time):
+        """
+        Selects the Orbit file whose validity time range fully envelops the
+        time range of an SLC SAFE archive, using the same criterion as
+        stage_orbit_file.select_orbit_file(). If several Orbit files qualify,
+        the most recently created one is selected.
+
+        Parameters
+        ----------
+        mission_id : str
+            The mission ID parsed from the SAFE file name.
+        orbit_type : str
+            The type of Orbit file to select, either POEORB or RESORB.
+        safe_start_time : str
+            The start time parsed from the SAFE file name in YYYYmmddTHHMMSS format.
+        safe_stop_time : str
+            The stop time parsed from the SAFE file name in YYYYmmddTHHMMSS format.
+
+        Returns
+        -------
+        orbit_file : tuple or None
+            The file name and request ID of the selected Orbit file, or None if
+            no Orbit file in the catalog covers the time range.
+
+        """
+        safe_start = _to_epoch(_parse_timestamp(safe_start_time))
+        safe_stop = _to_epoch(_parse_timestamp(safe_stop_time))
+
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT max_validity FROM orbit_types WHERE mission_id = ? AND orbit_type = ?",
+                (mission_id, orbit_type)
+            ).fetchone()
+
+            if not row:
+                return None
+
+            # Only Orbit files starting less than the longest validity interval
+            # before the SAFE stop time can cover it
+            max_validity = row[0]
+
+            return connection.execute(
+                "SELECT orbit_file_name, request_id FROM orbit_files "
+                "WHERE mission_id = ? AND orbit_type = ? AND valid_start > ? AND valid_start < ? AND valid_stop > ? "
+                "ORDER BY creation DESC LIMIT 1",
+                (mission_id, orbit_type, safe_stop - max_validity, safe_start, safe_stop)
+            ).fetchone()
+
+    def get_latest_valid_start_time(self, mission_id, orbit_type):
+        """
+        Returns the latest validity start time (in YYYYmmddTHHMMSS format) of
+        the cataloged Orbit files of a mission and orbit type, or None if there
+        are none. Used to harvest incrementally.
+        """
+        with self._connect() as connection:
+            (latest_valid_start,) = connection.execute(
+                "SELECT MAX(valid_start) FROM orbit_files WHERE mission_id = ? AND orbit_type = ?",
+                (mission_id, orbit_type)
+            ).fetchone()
+
+        return _to_timestamp(latest_valid_start) if latest_valid_start is not None else None
+
+
+class _ClosingConnection:
+    """Context manager committing (or rolling back) a connection's transaction, then closing the connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.__enter__()
+        return self.connection
+
+    def __exit__(self, *exc_info):
+        with closing(self.connection):
+            return self.connection.__exit__(*exc_info)
@@ -14,6 +14,7 @@ from shapely.geometry import Polygon
 
 from commons.logger import logger
 from commons.logger import LogLevels
+from util.dem_cache_util import DemCache, to_dem_cache_key
 from util.geo_util import (check_dateline,
                            epsg_from_polygon,
                            polygon_from_bounding_box,
@@ -53,6 +54,15 @@ def get_parser():
                              'latitude/longitude (WSEN, decimal degrees)')
     parser.add_argument('-m', '--margin', type=int, action='store',
                         default=5, help='Margin for DEM bounding box in km.')
+    parser.add_argument('--cache-dir', type=str, action='store',
+                        default=None, dest='cache_dir',
+                        help='Local directory in which to cache staged DEMs, '
+                             'keyed by region, margin and global DEM version. '
+                             'If not provided, DEMs are not cached.')
+    parser.add_argument('--cache-s3-url', type=str, action='store',
+                        default=None, dest='cache_s3_url',
+                        help='S3 URL (s3://bucket/prefix) of a cache shared '
+                             'by all nodes, backing the local cache directory.')
     parser.add_argument("--log-level",
                         type=lambda log_level: LogLevels[log_level].value,
                         choices=LogLevels.list(),
@@ -147,9 +157,10 @@ def translate_dem(vrt_filename, output_path, x_min, x_max, y_min, y_max):
     )
 
 
-def download_dem(polys, epsgs, dem_bucket, outfile):
+def download_dem_tiles(polys, epsgs, dem_bucket, file_prefix):
     """
-    Download a DEM from the specified S3 bucket.
+    Download the DEM tile of each polygon from the specified S3 bucket, as
+    GTiff files named <file_prefix>_<index>.tif.
 
     Parameters:
     ----------
@@ -159,15 +170,19 @@ def download_dem(polys, epsgs, dem_bucket, outfile):
         List of EPSG codes corresponding to polys.
     dem_bucket : str
         Name of the S3 bucket containing the global DEM to download from.
-    outfile:
-        Path to the where the output DEM file is to be staged.
+    file_prefix: str
+        Path prefix of the DEM tiles to stage.
+
+    Returns
+    -------
+    dem_list: list of str
+        Paths to the downloaded DEM tiles.
 
     """
     # set epsg to 4326 for each element in the list
     epsgs = [4326] * len(epsgs)
 
     # Download DEM for each polygon/epsg
-    file_prefix = os.path.splitext(outfile)[0]
     dem_list = []
 
     for idx, (epsg, poly) in enumerate(zip(epsgs, polys)):
@@ -177,8 +192,7 @@ def download_dem(polys, epsgs, dem_bucket, outfile):
         x_min, y_min, x_max, y_max = poly.bounds
         translate_dem(vrt_filename, output_path, x_min, x_max, y_min, y_max)
 
-    # Build vrt with downloaded DEMs
-    gdal.BuildVRT(outfile, dem_list)
+    return dem_list
 
 
 def check_dem_overlap(dem_filepath, polys):
@@ -231,6 +245,12 @@ def check_aws_connection(dem_bucket):
     dem_bucket : str
         Name of the bucket to use with the connection test.
 
+    Returns
+    -------
+    dem_version: str
+        The ETag of the global DEM VRT, identifying the version of the global
+        DEM when caching staged DEMs.
+
     Raises
     ------
     RuntimeError
@@ -241,14 +261,17 @@ def check_aws_connection(dem_bucket):
     obj = s3.Object(dem_bucket, 'EPSG4326/EPSG4326.vrt')
 
     try:
-        logger.info(f'Attempting test read of s3://{obj.bucket_name}/{obj.key}')
-        obj.get()['Body'].read()
+        # a HEAD request, so that cache hits never read the global DEM
+        logger.info(f'Attempting test access of s3://{obj.bucket_name}/{obj.key}')
+        obj.load()
         logger.info('Connection test successful.')
     except Exception:
         errmsg = (f'No access to the {dem_bucket} s3 bucket. '
                   f'Check your AWS credentials and re-run the code.')
         raise RuntimeError(errmsg)
 
+    return obj.e_tag
+
 
 def main(opts):
     """
@@ -303,17 +326,35 @@ def main(opts):
     # Check connection to the S3 bucket
     logger.info(f'Checking connection to AWS S3 {opts.s3_bucket} bucket.')
 
-    check_aws_connection(opts.s3_bucket)
+    dem_version = check_aws_connection(opts.s3_bucket)
 
-    # Determine EPSG code
-    logger.info("Determining EPSG code(s) for region polygon(s)")
+    def download_region_dem_tiles(file_prefix):
+        # Determine EPSG code
+        logger.info("Determining EPSG code(s) for region polygon(s)")
 
-    epsgs = epsg_from_polygon(polys)
+        epsgs = epsg_from_polygon(polys)
 
-    logger.debug(f'Derived the following EPSG codes: {epsgs}')
+        logger.debug(f'Derived the following EPSG codes: {epsgs}')
 
-    # Download DEM
-    download_dem(polys, epsgs, opts.s3_bucket, opts.outfile)
+        return download_dem_tiles(polys, epsgs, opts.s3_bucket, file_prefix)
+
+    # Download DEM, or copy it from the cache if it was already staged for
+    # the same region
+    file_prefix = os.path.splitext(opts.outfile)[0]
+
+    if opts.cache_dir:
+        cache_key = to_dem_cache_key(opts.tile_code, opts.bbox, opts.margin, opts.s3_bucket, dem_version)
+
+        logger.info(f'Staging DEM through cache {opts.cache_dir} with key {cache_key}')
+
+        dem_list = DemCache(opts.cache_dir, opts.cache_s3_url).stage(
+            cache_key, lambda cache_dir: download_region_dem_tiles(os.path.join(cache_dir, 'dem')), file_prefix
+        )
+    else:
+        dem_list = download_region_dem_tiles(file_prefix)
+
+    # Build vrt with downloaded DEMs
+    gdal.BuildVRT(opts.outfile, dem_list)
 
     logger.info(f'Done, DEM stored locally to {opts.outfile}')
 
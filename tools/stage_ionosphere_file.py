@@ -24,6 +24,7 @@ import requests
 
 from commons.logger import logger
 from commons.logger import LogLevels
+from util.http_util import mount_pooled_adapters
 
 DEFAULT_DOWNLOAD_ENDPOINT = "https://cddis.nasa.gov/archive/gnss/products/ionex"
 """Default URL endpoint for Ionosphere download requests"""
@@ -104,6 +105,7 @@ class SessionWithHeaderRedirection(requests.Session):
     def __init__(self, username, password):
         super().__init__()
         self.auth = (username, password)
+        mount_pooled_adapters(self)
 
     # Overrides from the library to keep headers when redirected to or from
     # the NASA auth host.
@@ -310,6 +312,43 @@ def uncompress_ionosphere_archive(output_ionosphere_archive_path):
     return extraction_path
 
 
+def get_ionosphere_archive_url(args):
+    """
+    Formulates the name and URL of the Ionosphere archive corresponding to the
+    input SAFE file. Only the start date of the SAFE file is used, so every
+    SLC acquired on the same day maps to the same archive.
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        Arguments parsed from the command-line.
+
+    Returns
+    -------
+    archive_name : str
+        The file name of the compressed Ionosphere archive.
+    request_url : str
+        The URL of the compressed Ionosphere archive.
+
+    """
+    logger.info(f"Determining Ionosphere file for input SAFE file {args.input_safe_file}")
+
+    # Parse the relevant info from the input SAFE filename
+    safe_start_date = parse_start_date_from_safe(args.input_safe_file)
+
+    logger.info(f"Parsed start date {safe_start_date} from SAFE filename")
+
+    # Convert start date to Year and Day of Year (Julian date)
+    year, doy = safe_start_date_to_julian_day(safe_start_date)
+
+    # Formulate the archive name and URL location based on the file type and
+    # the Julian date of the SLC archive
+    archive_name = f"{args.type}{doy}0.{year[2:]}i.Z"
+    request_url = join(args.download_endpoint, year, doy, archive_name)
+
+    return archive_name, request_url
+
+
 def main(args):
     """
     Main script to execute Orbit file staging.
@@ -335,20 +374,7 @@ def main(args):
     if args.username is None and args.password is None and not args.url_only:
         args.username, _, args.password = netrc.netrc().authenticators(DEFAULT_EDL_ENDPOINT)
 
-    logger.info(f"Determining Ionosphere file for input SAFE file {args.input_safe_file}")
-
-    # Parse the relevant info from the input SAFE filename
-    safe_start_date = parse_start_date_from_safe(args.input_safe_file)
-
-    logger.info(f"Parsed start date {safe_start_date} from SAFE filename")
-
-    # Convert start date to Year and Day of Year (Julian date)
-    year, doy = safe_start_date_to_julian_day(safe_start_date)
-
-    # Formulate the archive name and URL location based on the file type and
-    # the Julian date of the SLC archive
-    archive_name = f"{args.type}{doy}0.{year[2:]}i.Z"
-    request_url = join(args.download_endpoint, year, doy, archive_name)
+    archive_name, request_url = get_ionosphere_archive_url(args)
 
     # If user request the URL only, print it to standard out and the log
     if args.url_only:
@@ -22,6 +22,9 @@ import lxml.etree as ET
 
 from commons.logger import logger
 from commons.logger import LogLevels
+from tools.orbit_catalog import OrbitCatalog
+from util.http_util import get_session
+from util.orbit_cache_util import ORBIT_FILE_REGEX
 
 DEFAULT_QUERY_ENDPOINT = 'https://scihub.copernicus.eu/gnss/search'
 """Default URL endpoint for SciHub query REST service"""
@@ -101,6 +104,13 @@ def get_parser():
                              "RESORB it is the number of hours. If not specified, "
                              f"defaults to {DEFAULT_POE_TIME_RANGE} day(s) for POEORB, "
                              f"or {DEFAULT_RES_TIME_RANGE} hour(s) for RESORB.")
+    parser.add_argument("--catalog", type=str, action='store',
+                        default=None, metavar='PATH',
+                        help="Specify the path to an Orbit catalog harvested with "
+                             "harvest_orbit_catalog.py. The Orbit file is selected "
+                             "from the catalog, and the query service is only "
+                             "queried if no cataloged Orbit file covers the SAFE "
+                             "time range (e.g. for very recent data).")
     parser.add_argument("--log-level",
                         type=lambda log_level: LogLevels[log_level].value,
                         choices=LogLevels.list(),
@@ -267,7 +277,7 @@ def construct_orbit_file_query(mission_id, orbit_type, safe_start_time, safe_sto
     return query
 
 
-def query_orbit_file_service(endpoint_url, query, username, password):
+def query_orbit_file_service(endpoint_url, query, username, password, start=None, rows=None):
     """
     Submits a request to the Orbit file query REST service, and returns the
     XML-formatted response.
@@ -284,6 +294,11 @@ def query_orbit_file_service(endpoint_url, query, username, password):
         The username to authenticate the request with.
     password : str
         The password to authenticate the request with.
+    start : int, optional
+        The offset of the first result to return, for paging through results.
+    rows : int, optional
+        The number of results to return. The service default is used if not
+        provided.
 
     Returns
     -------
@@ -299,8 +314,14 @@ def query_orbit_file_service(endpoint_url, query, username, password):
     # Query service expects the query payload assigned to a value named "q"
     payload = {'q': query}
 
+    if start is not None:
+        payload['start'] = start
+
+    if rows is not None:
+        payload['rows'] = rows
+
     # Make the HTTP GET request on the endpoint URL with the provided credentials
-    response = requests.get(endpoint_url, params=payload, auth=(username, password))
+    response = get_session().get(endpoint_url, params=payload, auth=(username, password))
 
     logger.debug(f'response.url: {response.url}')
     logger.debug(f'response.status_code: {response.status_code}')
@@ -383,49 +404,27 @@ def parse_orbit_file_query_xml(query_xml):
 
     return entry_elems, tree.nsmap
 
-def select_orbit_file(entry_elems, namespace_map, safe_start_time, safe_stop_time):
+
+def parse_orbit_file_entries(entry_elems, namespace_map):
     """
-    Iterates over the results of an orbit file query, searching for the first
-    valid orbit file to download. A valid orbit file is one whose validity
-    time range fully envelops the validity time range of the corresponding
-    SLC SAFE archive.
+    Parses the file name and request ID of each Orbit file from the entry
+    elements of a query response. Entries without a file name are skipped.
 
     Parameters
     ----------
     entry_elems : list of etree.Element
         The parsed XML results of the orbit file query.
     namespace_map : dict
-        The namespace map parsed from the query result XML. Used to find
-        sub-elements within the provided element tree.
-    safe_start_time : str
-        The start time parsed from the SAFE file name in YYYYmmddTHHMMSS format.
-    safe_stop_time : str
-        The stop time parsed from the SAFE file name in YYYYmmddTHHMMSS format.
+        The namespace map parsed from the query result XML.
 
-    Raises
+    Yields
     ------
-    RuntimeError
-        If no suitable orbit file can be found within the provided list of entries.
-
-    Returns
-    -------
     orbit_file_name : str
-        Name of the selected orbit file.
+        Name of the orbit file.
     orbit_file_request_id : str
-        Request ID used to perform the actual download request of the selected
-        orbit file.
+        Request ID used to perform the download request of the orbit file.
 
     """
-    orbit_regex_pattern = (
-        r'(?P<mission_id>S1A|S1B)_(?P<file_class>OPER)_(?P<category>AUX)_'
-        r'(?P<semantic_desc>POEORB|RESORB)_(?P<site>OPOD)_'
-        r'(?P<creation_ts>\d{8}T\d{6})_V(?P<valid_start_ts>\d{8}T\d{6})_'
-        r'(?P<valid_stop_ts>\d{8}T\d{6})[.](?P<format>EOF)$'
-    )
-    orbit_regex = re.compile(orbit_regex_pattern)
-
-    # Parse each result from the query, and look for a suitable orbit file
-    # candidate among the results
     for entry_elem in entry_elems:
         # Get the request ID from the entry element, this is the primary piece of
         # info needed by the download service to acquire the Orbit file
@@ -451,8 +450,47 @@ def select_orbit_file(entry_elems, namespace_map, safe_start_time, safe_stop_tim
             )
             continue
 
+        yield orbit_file_name, orbit_file_request_id
+
+
+def select_orbit_file(entry_elems, namespace_map, safe_start_time, safe_stop_time):
+    """
+    Iterates over the results of an orbit file query, searching for the first
+    valid orbit file to download. A valid orbit file is one whose validity
+    time range fully envelops the validity time range of the corresponding
+    SLC SAFE archive.
+
+    Parameters
+    ----------
+    entry_elems : list of etree.Element
+        The parsed XML results of the orbit file query.
+    namespace_map : dict
+        The namespace map parsed from the query result XML. Used to find
+        sub-elements within the provided element tree.
+    safe_start_time : str
+        The start time parsed from the SAFE file name in YYYYmmddTHHMMSS format.
+    safe_stop_time : str
+        The stop time parsed from the SAFE file name in YYYYmmddTHHMMSS format.
+
+    Raises
+    ------
+    RuntimeError
+        If no suitable orbit file can be found within the provided list of entries.
+
+    Returns
+    -------
+    orbit_file_name : str
+        Name of the selected orbit file.
+    orbit_file_request_id : str
+        Request ID used to perform the actual download request of the selected
+        orbit file.
+
+    """
+    # Parse each result from the query, and look for a suitable orbit file
+    # candidate among the results
+    for orbit_file_name, orbit_file_request_id in parse_orbit_file_entries(entry_elems, namespace_map):
         # Parse the validity time range from the orbit file name
-        match = orbit_regex.match(orbit_file_name)
+        match = ORBIT_FILE_REGEX.match(orbit_file_name)
 
         if not match:
             logger.warning(
@@ -482,6 +520,11 @@ def select_orbit_file(entry_elems, namespace_map, safe_start_time, safe_stop_tim
         )
 
 
+def construct_orbit_file_request_url(download_endpoint, orbit_file_request_id):
+    """Constructs the URL used to download an Orbit file from its request ID"""
+    return os.path.join(download_endpoint, f"Products('{orbit_file_request_id}')/$value")
+
+
 def download_orbit_file(request_url, output_directory, orbit_file_name, username, password):
     """
     Downloads an Orbit file using the provided request URL, which should contain
@@ -518,7 +561,7 @@ def download_orbit_file(request_url, output_directory, orbit_file_name, username
 
     """
     # Make the HTTP GET request to obtain the Orbit file contents
-    response = requests.get(request_url, auth=(username, password))
+    response = get_session().get(request_url, auth=(username, password))
 
     logger.debug(f'r.url: {response.url}')
     logger.debug(f'r.status_code: {response.status_code}')
@@ -542,20 +585,30 @@ def download_orbit_file(request_url, output_directory, orbit_file_name, username
     return output_orbit_file_path
 
 
-def main(args):
+def query_orbit_file(args):
     """
-    Main script to execute Orbit file staging.
+    Queries for, and selects, the Orbit file that covers the time range of
+    the input SAFE file. Only the SAFE file name is used, so this may be
+    called before the SAFE archive itself is available.
 
     Parameters
     ----------
     args: argparse.Namespace
         Arguments parsed from the command-line.
 
-    """
-    # Set the logging level
-    if args.log_level:
-        LogLevels.set_level(args.log_level)
+    Returns
+    -------
+    orbit_file_name : str
+        The file name of the selected Orbit file.
+    request_url : str
+        The URL used to download the selected Orbit file.
+
+    Raises
+    ------
+    NoQueryResultsException
+        If the query returned no Orbit files of the requested type.
 
+    """
     logger.info(f"Determining Orbit file for input SAFE file {args.input_safe_file}")
 
     # Parse the relevant info from the input SAFE filename
@@ -565,6 +618,21 @@ def main(args):
 
     logger.info(f"Parsed time range {safe_start_time} - {safe_stop_time} from SAFE filename")
 
+    # Look up the Orbit file from the local catalog, if one was provided
+    if args.catalog:
+        cataloged_orbit_file = OrbitCatalog(args.catalog).find_covering(
+            mission_id, args.orbit_type, safe_start_time, safe_stop_time
+        )
+
+        if cataloged_orbit_file:
+            orbit_file_name, orbit_file_request_id = cataloged_orbit_file
+
+            logger.info(f"Selected Orbit file {orbit_file_name} from catalog {args.catalog}")
+
+            return orbit_file_name, construct_orbit_file_request_url(args.download_endpoint, orbit_file_request_id)
+
+        logger.info(f"No Orbit file in catalog {args.catalog} covers the SAFE time range")
+
     # Construct the query based on the time range parsed from the input file
     query = construct_orbit_file_query(
         mission_id, args.orbit_type, safe_start_time, safe_stop_time, args.query_time_range
@@ -583,15 +651,37 @@ def main(args):
 
     entry_elems, namespace_map = parse_orbit_file_query_xml(xml_response)
 
+    # Catalog the queried Orbit files, so later lookups for the same time range
+    # don't need to query the service again
+    if args.catalog:
+        OrbitCatalog(args.catalog).add(parse_orbit_file_entries(entry_elems, namespace_map))
+
     # Select an appropriate orbit file from the list returned from the query
     orbit_file_name, orbit_file_request_id = select_orbit_file(
         entry_elems, namespace_map, safe_start_time, safe_stop_time
     )
 
     # Construct the URL used to download the Orbit file
-    request_url = os.path.join(
-        args.download_endpoint, f"Products('{orbit_file_request_id}')/$value"
-    )
+    request_url = construct_orbit_file_request_url(args.download_endpoint, orbit_file_request_id)
+
+    return orbit_file_name, request_url
+
+
+def main(args):
+    """
+    Main script to execute Orbit file staging.
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        Arguments parsed from the command-line.
+
+    """
+    # Set the logging level
+    if args.log_level:
+        LogLevels.set_level(args.log_level)
+
+    orbit_file_name, request_url = query_orbit_file(args)
 
     # If user request the URL only, print it to standard out and the log
     if args.url_only:
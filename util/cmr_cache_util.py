@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+"""Default number of seconds a cached CMR search remains valid"""
+
+DEFAULT_MAX_SIZE_BYTES = 2 * 1024 ** 3
+"""Default cap on the total size of the cache directory, beyond which the least recently used searches are evicted"""
+
+_UNCACHED_PARAMS = frozenset({"token"})
+"""Request parameters that don't affect the search results (e.g. credentials) and are excluded from cache keys"""
+
+
+class CmrResponseCache:
+    """
+    On-disk cache of CMR search results.
+
+    Each entry holds the complete, paged results of a single search as gzip compressed JSON lines, one line per page.
+    Entries are keyed by the request URL and the normalized request parameters. Since CMR-Search-After values are
+    only valid for the search they were issued by, a search is only cached once all of its pages have been retrieved.
+
+    Entries older than `ttl_seconds` are ignored. Once the cache exceeds `max_size_bytes`, the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, cache_dir, ttl_seconds=DEFAULT_TTL_SECONDS, max_size_bytes=DEFAULT_MAX_SIZE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def to_key(url: str, params) -> str:
+        """
+        Returns the cache key of a search.
+
+        :param url: the search URL.
+        :param params: the search parameters, either as a dict or as an url-encoded (e.g. request body) string.
+        """
+        if isinstance(params, str):
+            params = parse_qsl(params, keep_blank_values=True)
+        elif isinstance(params, dict):
+            params = params.items()
+
+        normalized_params = sorted((str(k), str(v)) for k, v in params if k not in _UNCACHED_PARAMS)
+        return hashlib.sha256(json.dumps([url, normalized_params]).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Iterator[list]]:
+        """Returns an iterator over the cached pages of the search, or None if the search is not cached (or expired)."""
+        path = self._to_path(key)
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+        if time.time() - mtime > self.ttl_seconds:
+            logger.debug(f"Cached CMR search expired. {key=}")
+            path.unlink(missing_ok=True)
+            return None
+
+        fp = gzip.open(path, "rt")  # opened eagerly, so that the entry may be evicted while being read
+        os.utime(path, times=(time.time(), mtime))  # record the access for LRU eviction, retaining the TTL
+        logger.debug(f"Using cached CMR search. {key=}")
+        return self._read_pages(fp)
+
+    def put(self, key: str, pages: Iterable[list]):
+        """Caches all pages of a search."""
+        writer = self.writer(key)
+        try:
+            for page in pages:
+                writer.append(page)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def writer(self, key: str) -> "CmrResponseCacheWriter":
+        """Returns a writer for caching the pages of a search as they arrive."""
+        return CmrResponseCacheWriter(self, key)
+
+    def evict(self):
+        """Removes expired entries, then the least recently used entries until the cache fits `max_size_bytes`."""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".jsonl.gz"):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.ttl_seconds:
+                Path(entry.path).unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            total_size -= size
+            logger.debug(f"Evicted cached CMR search. {path=}")
+
+    def _to_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.jsonl.gz"
+
+    @staticmethod
+    def _read_pages(fp) -> Iterator[list]:
+        with fp:
+            for line in fp:
+                yield json.loads(line)
+
+
+class CmrResponseCacheWriter:
+    """
+    Incrementally writes the pages of a search to a temporary file. The search is only added to the cache on
+    `commit()`, so an interrupted search is never mistaken for a complete one.
+    """
+
+    def __init__(self, cache: CmrResponseCache, key: str):
+        self.cache = cache
+        self.key = key
+
+        self._tmp_fp = tempfile.NamedTemporaryFile(dir=cache.cache_dir, prefix=".", suffix=".tmp", delete=False)
+        self._gzip_fp = gzip.open(self._tmp_fp, "wt")
+
+    def append(self, page: list):
+        self._gzip_fp.write(json.dumps(page))
+        self._gzip_fp.write("\n")
+
+    def commit(self):
+        self._close()
+        os.replace(self._tmp_fp.name, self.cache._to_path(self.key))
+        self.cache.evict()
+
+    def abort(self):
+        self._close()
+        Path(self._tmp_fp.name).unlink(missing_ok=True)
+
+    def _close(self):
+        self._gzip_fp.close()
+        self._tmp_fp.close()
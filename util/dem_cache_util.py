@@ -0,0 +1,182 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import boto3
+import botocore.exceptions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE_BYTES = 10 * 1024 ** 3
+"""Default cap on the total size of the cache directory, beyond which the least recently used DEMs are evicted"""
+
+MANIFEST_NAME = "manifest.json"
+"""Name of the S3 object listing the DEM files of a mirrored entry"""
+
+
+def to_dem_cache_key(tile_code: Optional[str], bbox: Optional[list], margin, dem_bucket: str,
+                     dem_version: Optional[str]) -> str:
+    """
+    Returns the cache key of a staged DEM, a digest of the region it was staged for and of the global DEM it was
+    cropped from. As with `stage_dem.determine_polygon`, the bounding box takes precedence over the MGRS tile code.
+
+    :param tile_code: the MGRS tile code of the region.
+    :param bbox: the bounding box (WSEN, decimal degrees) of the region.
+    :param margin: the margin (km) added to the region.
+    :param dem_bucket: the S3 bucket containing the global DEM.
+    :param dem_version: the version (e.g. the S3 ETag) of the global DEM VRT, so that an updated DEM is staged anew.
+    """
+    region = {"bbox": [float(coordinate) for coordinate in bbox]} if bbox else {"tile_code": tile_code}
+    key = json.dumps({**region, "margin": margin, "dem_bucket": dem_bucket, "dem_version": dem_version},
+                     sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class DemCache:
+    """
+    On-disk cache of staged (cropped) DEM tiles, optionally mirrored to an S3 prefix.
+
+    Many jobs stage the DEM of the same MGRS tile with the same margin. Each cache entry is a directory, named after
+    its cache key (see `to_dem_cache_key`), of the GTiff files cropped from the global DEM for a region. On a hit, the
+    files are copied into place, without reading the global DEM.
+
+    Filling the cache is atomic. Concurrent jobs sharing the cache directory wait on a per-entry lock while one of them
+    fills the cache, so each DEM is only cropped once. Once the cache exceeds `max_size_bytes`, the least recently used
+    entries that aren't in use are evicted. The S3 mirror is never evicted from.
+    """
+
+    def __init__(self, cache_dir, s3_url=None, max_size_bytes=DEFAULT_MAX_SIZE_BYTES):
+        """
+        :param cache_dir: the local cache directory.
+        :param s3_url: optional S3 URL (s3://bucket/prefix) of the mirror.
+        :param max_size_bytes: the cap on the total size of the cache directory.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.s3_url = s3_url
+        self.max_size_bytes = max_size_bytes
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def stage(self, key: str, fill: Callable[[Path], list[str]], file_prefix: str) -> list[str]:
+        """
+        Copies the cached DEM files of an entry to `<file_prefix>_<index>.tif`, returning their paths. The entry is
+        filled first if it isn't cached, from the S3 mirror or using the given function. Any exception raised by the
+        function is propagated.
+
+        :param key: the cache key of the entry.
+        :param fill: function cropping the DEM files into the given (temporary) directory, returning their paths.
+        :param file_prefix: the path prefix of the copies.
+        """
+        entry_dir = self.cache_dir / key
+        with self._lock(key):
+            if entry_dir.is_dir():
+                logger.info(f"Using cached DEM. {entry_dir=!s}")
+                os.utime(entry_dir)  # record the access for LRU eviction
+            else:
+                with tempfile.TemporaryDirectory(dir=self.cache_dir, prefix=".") as tmp_dir:
+                    fill_dir = Path(tmp_dir) / key
+                    fill_dir.mkdir()
+                    if not (self.s3_url and self._download_from_s3(key, fill_dir)):
+                        for idx, dem_filepath in enumerate(fill(fill_dir)):
+                            os.replace(dem_filepath, fill_dir / f"dem_{idx}.tif")
+                        if self.s3_url:
+                            self._upload_to_s3(key, fill_dir)
+                    os.replace(fill_dir, entry_dir)
+
+            dem_list = []
+            for idx, cached_dem_filepath in enumerate(self._list_entry(entry_dir)):
+                output_path = f"{file_prefix}_{idx}.tif"
+                shutil.copyfile(cached_dem_filepath, output_path)
+                dem_list.append(output_path)
+
+        self.evict()
+        return dem_list
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits `max_size_bytes`."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            size = sum(dem_file.stat().st_size for dem_file in os.scandir(entry.path))
+            entries.append((entry.stat().st_mtime, size, entry.name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            with self._try_lock(key) as locked:
+                if not locked:
+                    # in use by another job
+                    continue
+                shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+            total_size -= size
+            logger.debug(f"Evicted cached DEM. {key=}")
+
+    @staticmethod
+    def _list_entry(entry_dir: Path) -> list[Path]:
+        return sorted(entry_dir.glob("dem_*.tif"), key=lambda path: int(path.stem.split("_")[-1]))
+
+    @contextmanager
+    def _lock(self, key: str):
+        # lock files are left in place, as removing them would race with jobs waiting on them
+        with open(self.cache_dir / f".{key}.lock", "w") as lock_fp:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _try_lock(self, key: str):
+        with open(self.cache_dir / f".{key}.lock", "w") as lock_fp:
+            try:
+                fcntl.flock(lock_fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+    def _download_from_s3(self, key: str, output_dir: Path) -> bool:
+        # the manifest is uploaded last, so only complete entries are downloaded
+        bucket, prefix = self._to_s3_bucket_and_key(key)
+        s3 = boto3.client("s3")
+        try:
+            manifest = json.loads(s3.get_object(Bucket=bucket, Key=f"{prefix}/{MANIFEST_NAME}")["Body"].read())
+            for dem_file_name in manifest:
+                s3.download_file(bucket, f"{prefix}/{dem_file_name}", str(output_dir / dem_file_name))
+            logger.info(f"Downloaded DEM from S3 mirror. {bucket=}, {prefix=}")
+            return True
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+            logger.debug(f"DEM not available from S3 mirror. {bucket=}, {prefix=}, {e=}")
+            for partial_path in output_dir.iterdir():
+                partial_path.unlink()
+            return False
+
+    def _upload_to_s3(self, key: str, entry_dir: Path):
+        bucket, prefix = self._to_s3_bucket_and_key(key)
+        s3 = boto3.client("s3")
+        try:
+            dem_filepaths = self._list_entry(entry_dir)
+            for dem_filepath in dem_filepaths:
+                s3.upload_file(str(dem_filepath), bucket, f"{prefix}/{dem_filepath.name}")
+            s3.put_object(Bucket=bucket, Key=f"{prefix}/{MANIFEST_NAME}",
+                          Body=json.dumps([dem_filepath.name for dem_filepath in dem_filepaths]).encode())
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+            logger.warning(f"Failed to mirror DEM to S3. {self.s3_url=}, {e=}")
+
+    def _to_s3_bucket_and_key(self, key: str) -> tuple[str, str]:
+        parsed_url = urlparse(self.s3_url)
+        prefix = parsed_url.path.strip("/")
+        return parsed_url.netloc, f"{prefix}/{key}" if prefix else key
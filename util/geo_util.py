@@ -2,11 +2,12 @@
 
 import mgrs
 import numpy as np
+import shapely
 import shapely.ops
 import shapely.wkt
 
 from osgeo import osr
-from shapely.geometry import box, LinearRing, Point, Polygon
+from shapely.geometry import box, LinearRing, Polygon
 
 
 EARTH_APPROX_CIRCUMFERENCE = 40075017.
@@ -299,6 +300,45 @@ def point2epsg(lon, lat):
         raise ValueError(f'Could not determine projection for {lat},{lon}')
 
 
+def points2epsg(lons, lats):
+    """
+    Return the EPSG code of each of the provided lat/lon points. Vectorized
+    equivalent of point2epsg().
+
+    Parameters
+    ----------
+    lons: numpy.ndarray
+        Longitude coordinates of the points
+    lats: numpy.ndarray
+        Latitude coordinates of the points
+
+    Returns
+    -------
+    epsgs: numpy.ndarray
+        EPSG codes corresponding to the points lat/lon coordinates.
+
+    Raises
+    ------
+    ValueError
+        If the EPSG code cannot be determined from any of the provided lat/lons.
+
+    """
+    lons = np.where(lons >= 180.0, lons - 360.0, lons)
+
+    equator_indices = np.flatnonzero(lats == 0)
+    if len(equator_indices):
+        i = equator_indices[0]
+        raise ValueError(f'Could not determine projection for {lats[i]},{lons[i]}')
+
+    utm_zones = np.round((lons + 177) / 6.0).astype(int)
+
+    return np.select(
+        [lats >= 75.0, lats <= -75.0, lats > 0],
+        [3413, 3031, 32601 + utm_zones],
+        default=32701 + utm_zones
+    )
+
+
 def epsg_from_polygon(polys):
     """
     Determine EPSG code for each polygon in polys.
@@ -327,15 +367,16 @@ def epsg_from_polygon(polys):
         x = xx.flatten()
         y = yy.flatten()
 
-        # Query to determine the zone
-        zones = []
-        for lx, ly in zip(x, y):
-            # Create a point with grid coordinates
-            pp = Point(lx, ly)
+        # Select the grid points within the polygon. The interior of a
+        # rectangle (e.g. from an MGRS tile or bbox) is the open bounding box,
+        # otherwise test each point against the polygon
+        if p.equals(box(x_min, y_min, x_max, y_max)):
+            within = (x > x_min) & (x < x_max) & (y > y_min) & (y < y_max)
+        else:
+            within = shapely.contains_xy(p, x, y)
 
-            # If Point is in polys, compute EPSG
-            if pp.within(p):
-                zones.append(point2epsg(lx, ly))
+        # Query to determine the zone
+        zones = points2epsg(x[within], y[within])
 
         # Count different EPSGs
         vals, counts = np.unique(zones, return_counts=True)
@@ -0,0 +1,100 @@
+import logging
+import random
+from functools import cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 10
+"""Default number of per-host connection pools to keep. One per distinct host (CMR, EDL, DAAC, ...) is enough."""
+
+DEFAULT_POOL_MAXSIZE = 10
+"""Default number of keep-alive connections to keep per host. Should be at least the number of concurrent requests."""
+
+DEFAULT_MAX_RETRIES = 5
+"""Default number of retries for failed connections and retryable (429, 5xx) responses"""
+
+DEFAULT_BACKOFF_FACTOR = 1
+"""Default backoff factor, in seconds. The nth retry waits a random amount between 0 and backoff_factor * 2^(n-1)"""
+
+RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+
+class JitteredRetry(Retry):
+    """
+    urllib3 retry configuration with "full jitter" exponential backoff. This spreads retries from concurrent clients
+    out, rather than having them retry in lockstep.
+
+    See https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+    """
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+def mount_pooled_adapters(
+        session: requests.Session,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR
+) -> requests.Session:
+    """
+    Mounts HTTP adapters with keep-alive connection pooling and retries onto the given session.
+
+    Only idempotent requests (e.g. GET, HEAD) are retried. Retryable responses that exhaust their retries are returned
+    as-is, so callers should still `raise_for_status()`.
+
+    :return: the given session.
+    """
+    return _mount_adapter(session, _create_adapter(pool_connections, pool_maxsize, max_retries, backoff_factor))
+
+
+def create_session(
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR
+) -> requests.Session:
+    """Creates a new session with keep-alive connection pooling and retries. See `mount_pooled_adapters`."""
+    return mount_pooled_adapters(requests.Session(), pool_connections, pool_maxsize, max_retries, backoff_factor)
+
+
+def get_session(
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR
+) -> requests.Session:
+    """
+    Returns a new session mounted with the process-wide adapter for the given configuration, so that connections are
+    reused across calls. Only the connection pools are shared: cookies, auth and headers are not carried over between
+    sessions, i.e. across hosts and jobs. The session must not be closed, as that would close the shared pools.
+    """
+    return _mount_adapter(requests.Session(),
+                          _get_shared_adapter(pool_connections, pool_maxsize, max_retries, backoff_factor))
+
+
+@cache
+def _get_shared_adapter(pool_connections, pool_maxsize, max_retries, backoff_factor) -> HTTPAdapter:
+    logger.debug(f"Creating shared adapter. {pool_connections=}, {pool_maxsize=}, {max_retries=}, {backoff_factor=}")
+    return _create_adapter(pool_connections, pool_maxsize, max_retries, backoff_factor)
+
+
+def _create_adapter(pool_connections, pool_maxsize, max_retries, backoff_factor) -> HTTPAdapter:
+    retry = JitteredRetry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_FORCELIST,
+        raise_on_status=False
+    )
+    return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+
+def _mount_adapter(session: requests.Session, adapter: HTTPAdapter) -> requests.Session:
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -0,0 +1,137 @@
+import fcntl
+import logging
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlparse
+
+import boto3
+import botocore.exceptions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+"""Default number of seconds an Ionosphere file remains cached"""
+
+DEFAULT_MAX_SIZE_BYTES = 1024 ** 3
+"""Default cap on the total size of the cache directory, beyond which the least recently used files are evicted"""
+
+IONOSPHERE_FILE_REGEX = re.compile(r"(?P<type>jplg|jprg)(?P<doy>\d{3})0[.](?P<yy>\d{2})i$")
+"""Uncompressed Ionosphere (TEC) file names, e.g. jplg0010.23i"""
+
+
+class IonosphereFileCache:
+    """
+    On-disk cache of uncompressed Ionosphere Correction (TEC) files, optionally mirrored to an S3 prefix.
+
+    TEC files are daily, so every SLC acquired on the same day uses the same file. Files are keyed by their name, which
+    encodes the file type and the day.
+
+    Filling the cache is atomic. Concurrent jobs sharing the cache directory wait on a per-file lock while one of them
+    fills the cache, so each file is only downloaded once. Files older than `max_age_seconds` are ignored. Once the
+    cache exceeds `max_size_bytes`, the least recently used files are evicted. The S3 mirror is never evicted from.
+    """
+
+    def __init__(self, cache_dir, s3_url=None, max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+                 max_size_bytes=DEFAULT_MAX_SIZE_BYTES):
+        """
+        :param cache_dir: the local cache directory.
+        :param s3_url: optional S3 URL (s3://bucket/prefix) of the mirror.
+        :param max_age_seconds: the number of seconds a file remains cached.
+        :param max_size_bytes: the cap on the total size of the cache directory.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.s3_url = s3_url
+        self.max_age_seconds = max_age_seconds
+        self.max_size_bytes = max_size_bytes
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_or_fill(self, ionosphere_file_name: str, fill: Callable[[Path], Path]) -> Path:
+        """
+        Returns the path of the cached file, filling the cache first if the file isn't cached, from the S3 mirror or
+        using the given function. Any exception raised by the function (e.g. the file not being found) is propagated.
+
+        :param ionosphere_file_name: the name of the uncompressed file.
+        :param fill: function downloading the file into the given (temporary) directory, returning its path.
+        """
+        path = self.cache_dir / ionosphere_file_name
+        with self._lock(ionosphere_file_name):
+            if self._is_cached(path):
+                logger.info(f"Using cached Ionosphere file. {path=!s}")
+                os.utime(path, times=(time.time(), path.stat().st_mtime))  # record the access for LRU eviction
+                return path
+
+            with tempfile.TemporaryDirectory(dir=self.cache_dir, prefix=".") as tmp_dir:
+                if not (self.s3_url and self._download_from_s3(ionosphere_file_name, Path(tmp_dir))):
+                    filled_path = fill(Path(tmp_dir))
+                    os.replace(filled_path, Path(tmp_dir) / ionosphere_file_name)
+                    if self.s3_url:
+                        self._upload_to_s3(Path(tmp_dir) / ionosphere_file_name)
+                os.replace(Path(tmp_dir) / ionosphere_file_name, path)
+
+        self.evict()
+        return path
+
+    def evict(self):
+        """Removes expired files, then the least recently used files until the cache fits `max_size_bytes`."""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not IONOSPHERE_FILE_REGEX.match(entry.name):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age_seconds:
+                Path(entry.path).unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            total_size -= size
+            logger.debug(f"Evicted cached Ionosphere file. {path=}")
+
+    def _is_cached(self, path: Path) -> bool:
+        try:
+            return time.time() - path.stat().st_mtime <= self.max_age_seconds
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def _lock(self, ionosphere_file_name: str):
+        # lock files are left in place, as removing them would race with jobs waiting on them
+        with open(self.cache_dir / f".{ionosphere_file_name}.lock", "w") as lock_fp:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+    def _download_from_s3(self, ionosphere_file_name: str, output_dir: Path) -> bool:
+        bucket, key = self._to_s3_bucket_and_key(ionosphere_file_name)
+        try:
+            boto3.client("s3").download_file(bucket, key, str(output_dir / ionosphere_file_name))
+            logger.info(f"Downloaded Ionosphere file from S3 mirror. {bucket=}, {key=}")
+            return True
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+            logger.debug(f"Ionosphere file not available from S3 mirror. {bucket=}, {key=}, {e=}")
+            return False
+
+    def _upload_to_s3(self, path: Path):
+        bucket, key = self._to_s3_bucket_and_key(path.name)
+        try:
+            boto3.client("s3").upload_file(str(path), bucket, key)
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+            logger.warning(f"Failed to mirror Ionosphere file to S3. {self.s3_url=}, {e=}")
+
+    def _to_s3_bucket_and_key(self, ionosphere_file_name: str) -> tuple[str, str]:
+        parsed_url = urlparse(self.s3_url)
+        prefix = parsed_url.path.strip("/")
+        return parsed_url.netloc, f"{prefix}/{ionosphere_file_name}" if prefix else ionosphere_file_name
@@ -0,0 +1,259 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Optional
+from urllib.parse import urlparse
+
+import boto3
+import botocore.exceptions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+"""Default number of seconds an Orbit file remains cached"""
+
+DEFAULT_MAX_SIZE_BYTES = 2 * 1024 ** 3
+"""Default cap on the total size of the cache directory, beyond which the least recently used Orbit files are evicted"""
+
+ORBIT_FILE_REGEX = re.compile(
+    r"(?P<mission_id>S1A|S1B)_OPER_AUX_(?P<orbit_type>POEORB|RESORB)_OPOD_(?P<creation_ts>\d{8}T\d{6})_"
+    r"V(?P<valid_start_ts>\d{8}T\d{6})_(?P<valid_stop_ts>\d{8}T\d{6})[.]EOF$"
+)
+
+OrbitFile = namedtuple("OrbitFile", ["valid_start", "valid_stop", "creation", "name"])
+
+
+def parse_orbit_file_name(orbit_file_name: str) -> Optional[tuple[str, str, OrbitFile]]:
+    """Returns the mission ID, orbit type, and validity interval of an Orbit file, or None if the name doesn't match."""
+    match = ORBIT_FILE_REGEX.match(orbit_file_name)
+    if not match:
+        return None
+
+    def to_datetime(group):
+        return datetime.strptime(match.group(group), "%Y%m%dT%H%M%S")
+
+    orbit_file = OrbitFile(to_datetime("valid_start_ts"), to_datetime("valid_stop_ts"), to_datetime("creation_ts"),
+                           orbit_file_name)
+    return match.group("mission_id"), match.group("orbit_type"), orbit_file
+
+
+class OrbitFileIndex:
+    """
+    Interval index of Orbit files of a single mission and orbit type, answering which Orbit file covers a time range.
+    """
+
+    def __init__(self):
+        self._orbit_files: list[OrbitFile] = []  # sorted by validity start
+        self._max_validity = timedelta(0)
+
+    def add(self, orbit_file: OrbitFile):
+        i = bisect_left(self._orbit_files, orbit_file)
+        if i < len(self._orbit_files) and self._orbit_files[i] == orbit_file:
+            return
+        insort(self._orbit_files, orbit_file)
+        self._max_validity = max(self._max_validity, orbit_file.valid_stop - orbit_file.valid_start)
+
+    def remove(self, orbit_file_name: str):
+        self._orbit_files = [orbit_file for orbit_file in self._orbit_files if orbit_file.name != orbit_file_name]
+
+    def find_covering(self, start: datetime, stop: datetime) -> Optional[OrbitFile]:
+        """
+        Returns the most recently created Orbit file whose validity interval envelops the given time range (the same
+        criterion as `stage_orbit_file.select_orbit_file`), or None.
+        """
+        covering = None
+        # only Orbit files starting before the range may cover it, and only the last few of them may still be valid
+        i = bisect_left(self._orbit_files, (start,))
+        for orbit_file in reversed(self._orbit_files[:i]):
+            if orbit_file.valid_start + self._max_validity <= stop:
+                break
+            if orbit_file.valid_stop > stop and (covering is None or orbit_file.creation > covering.creation):
+                covering = orbit_file
+        return covering
+
+
+class OrbitFileCache:
+    """
+    On-disk cache of Orbit files, optionally mirrored to an S3 prefix.
+
+    Each POEORB file is valid for about 26 hours, so the SLCs acquired within a day are all covered by the same Orbit
+    file. Cached Orbit files are indexed by mission, orbit type and validity interval (parsed from their file names), so
+    that the Orbit file covering an SLC can be found without querying the Orbit file service.
+
+    The cache directory may be shared by concurrent jobs. Files are added atomically, and the index is refreshed from the
+    directory (and the S3 prefix) on a miss. Orbit files older than `max_age_seconds` are ignored. Once the cache
+    exceeds `max_size_bytes`, the least recently used Orbit files are evicted. The S3 mirror is never evicted from.
+    """
+
+    def __init__(self, cache_dir, s3_url=None, max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+                 max_size_bytes=DEFAULT_MAX_SIZE_BYTES):
+        """
+        :param cache_dir: the local cache directory.
+        :param s3_url: optional S3 URL (s3://bucket/prefix) of the mirror.
+        :param max_age_seconds: the number of seconds an Orbit file remains cached.
+        :param max_size_bytes: the cap on the total size of the cache directory.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.s3_url = s3_url
+        self.max_age_seconds = max_age_seconds
+        self.max_size_bytes = max_size_bytes
+
+        self._lock = threading.Lock()
+        self._local_indices: dict[tuple[str, str], OrbitFileIndex] = {}
+        self._s3_indices: Optional[dict[tuple[str, str], OrbitFileIndex]] = None
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._refresh_local_indices()
+
+    def get(self, mission_id: str, orbit_type: str, start: datetime, stop: datetime) -> Optional[Path]:
+        """Returns the path of a cached Orbit file covering the given time range, or None if none is cached."""
+        with self._lock:
+            orbit_file = self._find_local(mission_id, orbit_type, start, stop)
+            if not orbit_file:
+                # another job may have cached it since
+                self._refresh_local_indices()
+                orbit_file = self._find_local(mission_id, orbit_type, start, stop)
+            if not orbit_file and self.s3_url:
+                orbit_file = self._get_from_s3(mission_id, orbit_type, start, stop)
+            if not orbit_file:
+                return None
+
+            path = self.cache_dir / orbit_file.name
+            try:
+                os.utime(path, times=(time.time(), path.stat().st_mtime))  # record the access for LRU eviction
+            except FileNotFoundError:
+                # evicted by another job
+                self._local_indices[(mission_id, orbit_type)].remove(orbit_file.name)
+                return None
+            logger.info(f"Using cached Orbit file. {path=!s}")
+            return path
+
+    def put(self, orbit_filepath) -> Path:
+        """Adds a copy of the given Orbit file to the cache (and the S3 mirror), returning the path of the copy."""
+        orbit_filepath = Path(orbit_filepath)
+        parsed = parse_orbit_file_name(orbit_filepath.name)
+        if not parsed:
+            raise ValueError(f"Orbit file name does not conform to expected format. {orbit_filepath.name=}")
+        mission_id, orbit_type, orbit_file = parsed
+
+        with self._lock:
+            path = self._copy_into_cache(orbit_filepath, orbit_file.name)
+            self._local_indices.setdefault((mission_id, orbit_type), OrbitFileIndex()).add(orbit_file)
+
+            if self.s3_url:
+                bucket, key = self._to_s3_bucket_and_key(orbit_file.name)
+                try:
+                    self._get_s3_client().upload_file(str(path), bucket, key)
+                    if self._s3_indices is not None:
+                        self._s3_indices.setdefault((mission_id, orbit_type), OrbitFileIndex()).add(orbit_file)
+                except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+                    logger.warning(f"Failed to mirror Orbit file to S3. {self.s3_url=}, {e=}")
+
+            self._evict()
+        return path
+
+    def evict(self):
+        """Removes expired Orbit files, then the least recently used ones until the cache fits `max_size_bytes`."""
+        with self._lock:
+            self._evict()
+
+    def _find_local(self, mission_id, orbit_type, start, stop) -> Optional[OrbitFile]:
+        index = self._local_indices.get((mission_id, orbit_type))
+        return index.find_covering(start, stop) if index else None
+
+    def _refresh_local_indices(self):
+        self._local_indices = self._to_indices(
+            entry.name for entry in os.scandir(self.cache_dir)
+            if time.time() - entry.stat().st_mtime <= self.max_age_seconds
+        )
+
+    def _get_from_s3(self, mission_id, orbit_type, start, stop) -> Optional[OrbitFile]:
+        try:
+            if self._s3_indices is None:
+                self._s3_indices = self._to_indices(self._list_s3_orbit_file_names())
+
+            index = self._s3_indices.get((mission_id, orbit_type))
+            orbit_file = index.find_covering(start, stop) if index else None
+            if not orbit_file:
+                return None
+
+            bucket, key = self._to_s3_bucket_and_key(orbit_file.name)
+            with tempfile.TemporaryDirectory(dir=self.cache_dir, prefix=".") as tmp_dir:
+                tmp_path = Path(tmp_dir) / orbit_file.name
+                self._get_s3_client().download_file(bucket, key, str(tmp_path))
+                os.replace(tmp_path, self.cache_dir / orbit_file.name)
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+            logger.warning(f"Failed to get Orbit file from S3 mirror. {self.s3_url=}, {e=}")
+            return None
+
+        self._local_indices.setdefault((mission_id, orbit_type), OrbitFileIndex()).add(orbit_file)
+        self._evict()
+        return orbit_file
+
+    def _list_s3_orbit_file_names(self) -> Iterable[str]:
+        bucket, prefix = self._to_s3_bucket_and_key("")
+        for page in self._get_s3_client().get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield PurePosixPath(obj["Key"]).name
+
+    def _copy_into_cache(self, orbit_filepath: Path, orbit_file_name: str) -> Path:
+        # copied to a temporary file first, so that concurrent jobs never see a partial Orbit file
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=".", suffix=".tmp", delete=False) as tmp_fp:
+            with open(orbit_filepath, "rb") as fp:
+                shutil.copyfileobj(fp, tmp_fp)
+        path = self.cache_dir / orbit_file_name
+        os.replace(tmp_fp.name, path)
+        return path
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not ORBIT_FILE_REGEX.match(entry.name):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age_seconds:
+                self._remove(entry.name)
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry.name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            self._remove(name)
+            total_size -= size
+            logger.debug(f"Evicted cached Orbit file. {name=}")
+
+    def _remove(self, orbit_file_name: str):
+        (self.cache_dir / orbit_file_name).unlink(missing_ok=True)
+        mission_id, orbit_type, _ = parse_orbit_file_name(orbit_file_name)
+        index = self._local_indices.get((mission_id, orbit_type))
+        if index:
+            index.remove(orbit_file_name)
+
+    def _to_s3_bucket_and_key(self, orbit_file_name: str) -> tuple[str, str]:
+        parsed_url = urlparse(self.s3_url)
+        prefix = parsed_url.path.strip("/")
+        return parsed_url.netloc, f"{prefix}/{orbit_file_name}" if prefix else orbit_file_name
+
+    def _get_s3_client(self):
+        return boto3.client("s3")
+
+    @staticmethod
+    def _to_indices(orbit_file_names: Iterable[str]) -> dict[tuple[str, str], OrbitFileIndex]:
+        indices = {}
+        for orbit_file_name in orbit_file_names:
+            parsed = parse_orbit_file_name(orbit_file_name)
+            if parsed:
+                mission_id, orbit_type, orbit_file = parsed
+                indices.setdefault((mission_id, orbit_type), OrbitFileIndex()).add(orbit_file)
+        return indices